@@ -1,11 +1,162 @@
 
-from pymongo import MongoClient
+from time import perf_counter
+from threading import Lock, local
+
+from pymongo import MongoClient, IndexModel, ReplaceOne, UpdateOne, DeleteMany
 from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo.monitoring import ConnectionPoolListener
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
 
+from paper_trading.api.storage import BaseDBService
+from paper_trading.utility.setting import SETTINGS
 from paper_trading.utility.model import DBData
 
 
-class MongoDBService():
+class PoolWaitListener(ConnectionPoolListener):
+    """连接池监听，统计从连接池获取连接的等待时间"""
+
+    def __init__(self):
+        self._local = local()
+        self._lock = Lock()
+        self.checkouts = 0          # 获取连接次数
+        self.failures = 0           # 获取连接失败次数
+        self.wait_total = 0         # 总等待时间（秒）
+        self.wait_max = 0           # 最长等待时间（秒）
+
+    def connection_check_out_started(self, event):
+        self._local.start = perf_counter()
+
+    def connection_checked_out(self, event):
+        wait = perf_counter() - getattr(self._local, "start", perf_counter())
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.failures += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+    def get_stats(self):
+        """连接等待统计"""
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "failures": self.failures,
+                "wait_total": self.wait_total,
+                "wait_mean": self.wait_total / self.checkouts if self.checkouts else 0,
+                "wait_max": self.wait_max
+            }
+
+
+class MongoConnectionManager():
+    """
+    MongoDB连接管理
+    同一进程中连接同一地址的数据服务共享一个MongoClient及其连接池，
+    异步写入共享一个motor客户端，motor客户端绑定第一次写入的事件循环；
+    连接池大小、写入确认级别及压缩方式由SETTINGS配置
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._clients = dict()          # {(地址, 端口, 是否异步): [客户端, 连接池监听, 引用数]}
+
+    def get_client(self, host: str, port: int, is_async: bool = False):
+        """获取共享的MongoClient，is_async为True时获取共享的motor客户端"""
+        key = (host, port, is_async)
+        with self._lock:
+            item = self._clients.get(key)
+            if item is None:
+                listener = PoolWaitListener()
+                if is_async:
+                    client = AsyncIOMotorClient(host, port, event_listeners=[listener],
+                                                **get_client_options())
+                else:
+                    client = MongoClient(host, port, event_listeners=[listener],
+                                         **get_client_options())
+                    try:
+                        # 调用server_info查询服务器状态，防止服务器异常并未连接成功
+                        client.server_info()
+                    except Exception:
+                        client.close()
+                        raise
+                item = self._clients[key] = [client, listener, 0]
+
+            item[2] += 1
+            return item[0]
+
+    def release(self, host: str, port: int, is_async: bool = False):
+        """释放客户端，没有数据服务使用时关闭连接池"""
+        key = (host, port, is_async)
+        with self._lock:
+            item = self._clients.get(key)
+            if item:
+                item[2] -= 1
+                if item[2] <= 0:
+                    item[0].close()
+                    del self._clients[key]
+
+    def get_stats(self):
+        """各连接池的连接等待统计"""
+        with self._lock:
+            items = list(self._clients.items())
+
+        stats = dict()
+        for (host, port, is_async), (client, listener, refs) in items:
+            data = listener.get_stats()
+            data["refs"] = refs
+            stats[f"{host}:{port}/async" if is_async else f"{host}:{port}"] = data
+        return stats
+
+
+def get_client_options():
+    """MongoClient连接参数"""
+    options = {
+        "connectTimeoutMS": 500,
+        "maxPoolSize": SETTINGS.get("MONGO_POOL_SIZE", 100),
+        "minPoolSize": SETTINGS.get("MONGO_MIN_POOL_SIZE", 0),
+        "w": SETTINGS.get("MONGO_WRITE_CONCERN", 1),
+    }
+    if SETTINGS.get("MONGO_WAIT_QUEUE_TIMEOUT"):
+        options["waitQueueTimeoutMS"] = SETTINGS["MONGO_WAIT_QUEUE_TIMEOUT"]
+    if SETTINGS.get("MONGO_COMPRESSORS"):
+        options["compressors"] = SETTINGS["MONGO_COMPRESSORS"]
+    return options
+
+
+# 进程内共享的连接管理
+connection_manager = MongoConnectionManager()
+
+
+class MongoDBService(BaseDBService):
     """MONGODB数据库服务类"""
 
     def __init__(self, host, port):
@@ -16,18 +167,10 @@ class MongoDBService():
         self.port = port
 
     def connect_db(self):
-        """连接数据库"""
+        """连接数据库，使用进程内共享的连接池"""
         try:
             if not self.db_client:
-                # 读取MongoDB的设置
-                # 设置MongoDB操作的超时时间为0.5秒
-                self.db_client = MongoClient(
-                    self.host,
-                    self.port,
-                    connectTimeoutMS=500)
-
-                # 调用server_info查询服务器状态，防止服务器异常并未连接成功
-                self.db_client.server_info()
+                self.db_client = connection_manager.get_client(self.host, self.port)
                 self.connected = True
 
             return True
@@ -40,19 +183,38 @@ class MongoDBService():
             db = self.db_client[pt_db.db_name]
             cl = db[pt_db.db_cl]
             flt = pt_db.raw_data['flt']
-            result = cl.find_one(flt)
+            projection = pt_db.raw_data.get('projection')
+            result = cl.find_one(flt, projection)
 
             return result
         except:
             raise OperationFailure("MongoDB数据库查询数据失败")
 
     def on_select(self, pt_db: DBData):
-        """数据库查询操作"""
+        """
+        数据库查询操作
+        返回游标，数据在遍历时按批次从数据库读取；
+        raw_data中可选projection（返回字段）、batch_size（每批次读取条数）、
+        sort（排序，(字段, 排序方向)的列表）及limit（最多返回条数）
+        """
         try:
             db = self.db_client[pt_db.db_name]
             cl = db[pt_db.db_cl]
             flt = pt_db.raw_data['flt']
-            result = cl.find(flt)
+            projection = pt_db.raw_data.get('projection')
+            result = cl.find(flt, projection)
+
+            batch_size = pt_db.raw_data.get('batch_size')
+            if batch_size:
+                result = result.batch_size(batch_size)
+
+            sort = pt_db.raw_data.get('sort')
+            if sort:
+                result = result.sort(sort)
+
+            limit = pt_db.raw_data.get('limit')
+            if limit:
+                result = result.limit(limit)
 
             return result
         except:
@@ -106,6 +268,22 @@ class MongoDBService():
         except:
             raise OperationFailure("MongoDB数据库更新数据失败")
 
+    def on_bulk_write(self, pt_db: DBData):
+        """
+        数据库批量写入操作
+        raw_data['data']为操作列表：(操作类型, 条件, 数据)，操作类型为replace、update、delete，
+        replace不存在时插入；raw_data['ordered']为False时无序执行
+        """
+        try:
+            db = self.db_client[pt_db.db_name]
+            cl = db[pt_db.db_cl]
+            requests = make_bulk_requests(pt_db.raw_data['data'])
+            if requests:
+                cl.bulk_write(requests, ordered=pt_db.raw_data.get('ordered', True))
+            return True
+        except:
+            raise OperationFailure("MongoDB数据库批量写入数据失败")
+
     def on_delete(self, pt_db: DBData):
         """数据库删除操作"""
         try:
@@ -118,6 +296,20 @@ class MongoDBService():
         except:
             raise OperationFailure("MongoDB数据库删除数据失败")
 
+    def on_index_creat(self, pt_db: DBData):
+        """
+        创建索引，已存在的索引不会重复创建
+        raw_data['index']为索引列表，每个索引为(字段, 排序方向)的列表
+        """
+        try:
+            db = self.db_client[pt_db.db_name]
+            cl = db[pt_db.db_cl]
+            indexes = [IndexModel(keys) for keys in pt_db.raw_data['index']]
+            cl.create_indexes(indexes)
+            return True
+        except:
+            raise OperationFailure("MongoDB数据库创建索引失败")
+
     def on_group(self, pt_db: DBData):
         """分组查询"""
         try:
@@ -156,5 +348,101 @@ class MongoDBService():
         self.connected = False
 
         if self.db_client:
-            self.db_client.close()
+            connection_manager.release(self.host, self.port)
+        self.db_client = None
+
+
+def make_bulk_requests(ops: list):
+    """批量写入的操作列表转换为pymongo的写入请求，replace不存在时插入"""
+    requests = []
+    for op, flt, data in ops:
+        if op == 'replace':
+            requests.append(ReplaceOne(flt, data, upsert=True))
+        elif op == 'update':
+            requests.append(UpdateOne(flt, data))
+        elif op == 'delete':
+            requests.append(DeleteMany(flt))
+    return requests
+
+
+class AsyncMongoWriter():
+    """
+    MONGODB异步写入服务，基于motor
+    只提供写入操作，供异步持久化使用，写入语义与MongoDBService一致；
+    客户端在第一次写入时从连接管理获取，与其他异步写入共享连接池
+    """
+
+    def __init__(self, host, port):
+        """构造函数"""
         self.db_client = None
+        self.host = host
+        self.port = port
+
+    @staticmethod
+    def available():
+        """是否已安装motor"""
+        return AsyncIOMotorClient is not None
+
+    def _get_cl(self, pt_db: DBData):
+        """获取集合"""
+        if not self.db_client:
+            self.db_client = connection_manager.get_client(self.host, self.port, True)
+        return self.db_client[pt_db.db_name][pt_db.db_cl]
+
+    async def on_insert(self, pt_db: DBData):
+        """数据库插入数据操作"""
+        try:
+            await self._get_cl(pt_db).insert_one(pt_db.raw_data['data'].__dict__)
+            return True
+        except:
+            raise OperationFailure("MongoDB数据库插入数据失败")
+
+    async def on_insert_many(self, pt_db: DBData):
+        """数据库插入数据操作"""
+        try:
+            await self._get_cl(pt_db).insert_many(pt_db.raw_data['data'])
+            return True
+        except:
+            raise OperationFailure("MongoDB数据库插入数据失败")
+
+    async def on_replace_one(self, pt_db: DBData):
+        """数据库replace操作"""
+        try:
+            await self._get_cl(pt_db).replace_one(pt_db.raw_data['flt'],
+                                                  pt_db.raw_data['data'].__dict__,
+                                                  True)
+            return True
+        except:
+            raise OperationFailure("MongoDB数据库replace数据失败")
+
+    async def on_update(self, pt_db: DBData):
+        """数据库更新操作"""
+        try:
+            await self._get_cl(pt_db).update_one(pt_db.raw_data['flt'], pt_db.raw_data['set'])
+            return True
+        except:
+            raise OperationFailure("MongoDB数据库更新数据失败")
+
+    async def on_bulk_write(self, pt_db: DBData):
+        """数据库批量写入操作"""
+        try:
+            requests = make_bulk_requests(pt_db.raw_data['data'])
+            if requests:
+                await self._get_cl(pt_db).bulk_write(requests,
+                                                     ordered=pt_db.raw_data.get('ordered', True))
+            return True
+        except:
+            raise OperationFailure("MongoDB数据库批量写入数据失败")
+
+    async def on_delete(self, pt_db: DBData):
+        """数据库删除操作"""
+        try:
+            return await self._get_cl(pt_db).delete_many(pt_db.raw_data['flt'])
+        except:
+            raise OperationFailure("MongoDB数据库删除数据失败")
+
+    def close(self):
+        """释放客户端"""
+        if self.db_client:
+            connection_manager.release(self.host, self.port, True)
+            self.db_client = None
@@ -0,0 +1,327 @@
+import os
+import copy
+import gzip
+import pickle
+from threading import RLock
+
+from paper_trading.api.storage import (
+    BaseDBService,
+    match_filter,
+    is_operator,
+    apply_update,
+    apply_projection,
+    group_docs,
+    sort_docs
+)
+from paper_trading.utility.model import DBData
+
+
+class MemoryCollection():
+    """
+    内存数据集合
+    数据按_id保存在字典中，索引为{索引字段: {字段值: _id集合}}，
+    查询条件对索引的所有字段都是等值条件时通过索引定位数据
+    """
+
+    def __init__(self):
+        self.docs = dict()          # 数据：{_id: 数据}
+        self.next_id = 1            # 下一条数据的_id
+        self.indexes = dict()       # 索引：{索引字段: {字段值: _id集合}}
+
+    def insert(self, data: dict):
+        """插入数据"""
+        doc = {k: copy.copy(v) for k, v in data.items() if k != '_id'}
+        _id = self.next_id
+        self.next_id += 1
+        self.docs[_id] = doc
+        self._index_add(_id, doc)
+        return _id
+
+    def find(self, flt: dict, limit: int = 0):
+        """查询符合条件的数据，逐条返回(_id, 数据)"""
+        count = 0
+        for _id in self._candidates(flt):
+            doc = self.docs[_id]
+            if match_filter(doc, flt):
+                yield _id, doc
+                count += 1
+                if limit and count >= limit:
+                    return
+
+    def replace(self, _id: int, data: dict):
+        """替换数据"""
+        self._index_remove(_id, self.docs[_id])
+        doc = {k: copy.copy(v) for k, v in data.items() if k != '_id'}
+        self.docs[_id] = doc
+        self._index_add(_id, doc)
+
+    def update(self, _id: int, update: dict):
+        """更新数据"""
+        doc = self.docs[_id]
+        self._index_remove(_id, doc)
+        apply_update(doc, update)
+        self._index_add(_id, doc)
+
+    def delete(self, _id: int):
+        """删除数据"""
+        self._index_remove(_id, self.docs.pop(_id))
+
+    def creat_index(self, fields: tuple):
+        """创建索引"""
+        if fields not in self.indexes:
+            self.indexes[fields] = dict()
+            for _id, doc in self.docs.items():
+                self._index_add(_id, doc, fields)
+
+    def _candidates(self, flt: dict):
+        """根据索引获取可能符合条件的_id，无可用索引时返回所有_id"""
+        best = None
+        for fields in self.indexes:
+            if all(f in flt and not is_operator(flt[f]) and is_hashable(flt[f]) for f in fields):
+                if best is None or len(fields) > len(best):
+                    best = fields
+
+        if best is None:
+            return list(self.docs)
+
+        key = tuple(flt[f] for f in best)
+        return sorted(self.indexes[best].get(key, ()))
+
+    def _index_add(self, _id: int, doc: dict, fields: tuple = None):
+        """数据加入索引"""
+        for f in ([fields] if fields else self.indexes):
+            key = tuple(doc.get(field) for field in f)
+            if is_hashable(key):
+                self.indexes[f].setdefault(key, set()).add(_id)
+
+    def _index_remove(self, _id: int, doc: dict):
+        """数据移出索引"""
+        for f, index in self.indexes.items():
+            key = tuple(doc.get(field) for field in f)
+            if is_hashable(key):
+                ids = index.get(key)
+                if ids:
+                    ids.discard(_id)
+                    if not ids:
+                        del index[key]
+
+
+class MemoryDBService(BaseDBService):
+    """
+    内存数据服务类
+    所有数据保存在进程内存中，不产生任何网络或磁盘读写，适合回测使用。
+    设置保存文件路径时，连接时读取上次保存的数据，关闭时将数据压缩保存到文件。
+    """
+
+    def __init__(self, path: str = ""):
+        """构造函数"""
+        self.path = path                # 数据保存文件路径，为空时不保存
+        self.connected = False          # 数据库连接状态
+
+        self._dbs = dict()              # 数据：{数据库名称: {集合名称: 集合}}
+        self._lock = RLock()
+
+    def connect_db(self):
+        """连接数据库"""
+        if not self.connected and self.path and os.path.exists(self.path):
+            self.load(self.path)
+        self.connected = True
+        return True
+
+    def _get_cl(self, pt_db: DBData, creat: bool = False):
+        """获取集合，集合不存在且creat为False时返回None"""
+        db = self._dbs.get(pt_db.db_name)
+        if db is None:
+            if not creat:
+                return None
+            db = self._dbs[pt_db.db_name] = dict()
+
+        cl = db.get(pt_db.db_cl)
+        if cl is None and creat:
+            cl = db[pt_db.db_cl] = MemoryCollection()
+        return cl
+
+    def on_query_one(self, pt_db: DBData):
+        """数据库查询操作"""
+        with self._lock:
+            cl = self._get_cl(pt_db)
+            if cl:
+                for _id, doc in cl.find(pt_db.raw_data['flt'], limit=1):
+                    return to_result(_id, doc, pt_db.raw_data.get('projection'))
+            return None
+
+    def on_select(self, pt_db: DBData):
+        """数据库查询操作，查询时复制结果，遍历期间数据变更不影响结果"""
+        projection = pt_db.raw_data.get('projection')
+        sort = pt_db.raw_data.get('sort')
+        limit = pt_db.raw_data.get('limit', 0)
+        with self._lock:
+            cl = self._get_cl(pt_db)
+            if not cl:
+                return []
+
+            if sort:
+                docs = sort_docs((dict(doc, _id=_id) for _id, doc in cl.find(pt_db.raw_data['flt'])), sort)
+                rows = [(doc.pop('_id'), doc) for doc in docs[:limit or None]]
+            else:
+                rows = cl.find(pt_db.raw_data['flt'], limit)
+            return [to_result(_id, doc, projection) for _id, doc in rows]
+
+    def on_insert(self, pt_db: DBData):
+        """数据库插入数据操作"""
+        with self._lock:
+            self._get_cl(pt_db, True).insert(pt_db.raw_data['data'].__dict__)
+        return True
+
+    def on_insert_many(self, pt_db: DBData):
+        """数据库插入数据操作"""
+        with self._lock:
+            cl = self._get_cl(pt_db, True)
+            for data in pt_db.raw_data['data']:
+                cl.insert(data)
+        return True
+
+    def on_replace_one(self, pt_db: DBData):
+        """数据库插入数据操作"""
+        with self._lock:
+            cl = self._get_cl(pt_db, True)
+            replace(cl, pt_db.raw_data['flt'], pt_db.raw_data['data'].__dict__)
+        return True
+
+    def on_update(self, pt_db: DBData):
+        """数据库更新操作"""
+        with self._lock:
+            cl = self._get_cl(pt_db)
+            if cl:
+                update(cl, pt_db.raw_data['flt'], pt_db.raw_data['set'])
+        return True
+
+    def on_bulk_write(self, pt_db: DBData):
+        """数据库批量写入操作，replace不存在时插入"""
+        with self._lock:
+            cl = self._get_cl(pt_db, True)
+            for op, flt, data in pt_db.raw_data['data']:
+                if op == 'replace':
+                    replace(cl, flt, data)
+                elif op == 'update':
+                    update(cl, flt, data)
+                elif op == 'delete':
+                    delete(cl, flt)
+        return True
+
+    def on_delete(self, pt_db: DBData):
+        """数据库删除操作"""
+        with self._lock:
+            cl = self._get_cl(pt_db)
+            if cl:
+                return delete(cl, pt_db.raw_data['flt'])
+            return 0
+
+    def on_index_creat(self, pt_db: DBData):
+        """创建索引，raw_data['index']为索引列表，每个索引为(字段, 排序方向)的列表"""
+        with self._lock:
+            cl = self._get_cl(pt_db, True)
+            for keys in pt_db.raw_data['index']:
+                cl.creat_index(tuple(field for field, direction in keys))
+        return True
+
+    def on_group(self, pt_db: DBData):
+        """分组查询"""
+        with self._lock:
+            cl = self._get_cl(pt_db)
+            if not cl:
+                return []
+            flt = pt_db.raw_data['flt']
+            docs = (doc for _id, doc in cl.find(flt.get('$match', flt)))
+            return group_docs(docs, pt_db.raw_data['group'])
+
+    def on_collections_query(self, pt_db: DBData):
+        """获取集合列表"""
+        with self._lock:
+            return list(self._dbs.get(pt_db.db_name, {}))
+
+    def on_collection_delete(self, pt_db: DBData):
+        """数据库集合删除"""
+        with self._lock:
+            self._dbs.get(pt_db.db_name, {}).pop(pt_db.db_cl, None)
+        return True
+
+    def dump(self, path: str):
+        """将所有数据压缩保存到文件，先写入临时文件再替换，避免保存中断损坏原文件"""
+        with self._lock:
+            data = {
+                db_name: {
+                    cl_name: (cl.next_id, cl.docs, list(cl.indexes))
+                    for cl_name, cl in db.items()
+                }
+                for db_name, db in self._dbs.items()
+            }
+            raw = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wb", compresslevel=1) as f:
+            f.write(raw)
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        """从文件读取数据，并重建索引"""
+        with gzip.open(path, "rb") as f:
+            data = pickle.loads(f.read())
+
+        dbs = dict()
+        for db_name, cls in data.items():
+            db = dbs[db_name] = dict()
+            for cl_name, (next_id, docs, indexes) in cls.items():
+                cl = db[cl_name] = MemoryCollection()
+                cl.next_id = next_id
+                cl.docs = docs
+                for fields in indexes:
+                    cl.creat_index(fields)
+
+        with self._lock:
+            self._dbs = dbs
+
+    def close(self):
+        """数据服务关闭，设置了保存文件时保存数据，内存中的数据保留"""
+        if self.path:
+            self.dump(self.path)
+        self.connected = False
+
+
+def to_result(_id: int, doc: dict, projection: dict = None):
+    """复制数据作为查询结果"""
+    result = copy.deepcopy(doc)
+    result['_id'] = _id
+    return apply_projection(result, projection)
+
+
+def replace(cl: MemoryCollection, flt: dict, data: dict):
+    """替换第一条符合条件的数据，不存在时插入"""
+    for _id, doc in cl.find(flt, limit=1):
+        cl.replace(_id, data)
+        return
+    cl.insert(data)
+
+
+def update(cl: MemoryCollection, flt: dict, set_: dict):
+    """更新第一条符合条件的数据"""
+    for _id, doc in cl.find(flt, limit=1):
+        cl.update(_id, set_)
+        return
+
+
+def delete(cl: MemoryCollection, flt: dict):
+    """删除所有符合条件的数据"""
+    ids = [_id for _id, doc in cl.find(flt)]
+    for _id in ids:
+        cl.delete(_id)
+    return len(ids)
+
+
+def is_hashable(value):
+    """是否可以作为索引的键"""
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
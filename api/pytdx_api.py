@@ -8,6 +8,9 @@ exchange_map = {}
 exchange_map['SH'] = 1
 exchange_map['SZ'] = 0
 
+# 每次请求最多查询的证券数量（pytdx协议限制）
+MAX_QUOTES = 80
+
 
 class PYTDXService():
     """pytdx数据服务类"""
@@ -40,6 +43,31 @@ class PYTDXService():
         except Exception:
             raise ValueError("股票数据获取失败")
 
+    def get_realtime_quotes(self, symbols: list):
+        """
+        批量获取股票实时行情，每次请求最多查询MAX_QUOTES只股票
+        :param symbols: 证券代码列表，格式：000001.SZ
+        :return: {证券代码: 行情字典}，没有返回行情的证券不在结果中
+        """
+        try:
+            symbols = list(dict.fromkeys(symbols))
+            codes = {}
+            for symbol in symbols:
+                code, exchange = symbol.split('.')
+                codes[(exchange_map[exchange], code)] = symbol
+
+            quotes = {}
+            params = list(codes)
+            for i in range(0, len(params), MAX_QUOTES):
+                data = self.hq_api.get_security_quotes(params[i:i + MAX_QUOTES]) or []
+                for quote in data:
+                    symbol = codes.get((quote['market'], quote['code']))
+                    if symbol:
+                        quotes[symbol] = quote
+            return quotes
+        except Exception:
+            raise ValueError("股票数据获取失败")
+
     def get_history_transaction_data(self, symbol, date):
         """
         查询历史分笔数据
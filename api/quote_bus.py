@@ -0,0 +1,279 @@
+import os
+import struct
+from time import time
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python 3.8以下没有共享内存模块，不能开启行情总线
+    shared_memory = None
+
+# 共享内存标识
+MAGIC = b"PTQB"
+
+# 头部：标识、环形队列容量、最大证券数量、已登记证券数量、最新记录序号、写入进程ID
+HEADER = struct.Struct("<4sIIIQI")
+COUNT = struct.Struct("<I")
+COUNT_OFFSET = 12
+SEQ = struct.Struct("<Q")
+SEQ_OFFSET = 16
+PID = struct.Struct("<I")
+PID_OFFSET = 24
+
+# 读取最新行情时的最大重试次数，写入方在写入过程中退出时记录序号一直为奇数
+READ_RETRIES = 1000
+
+# 证券代码表
+SYMBOL = struct.Struct("<16s")
+
+# 行情记录：序号、证券编号、最新价、买一价、卖一价、买一量、卖一量、成交量、时间戳
+RECORD = struct.Struct("<QIdddqqqd")
+
+# 行情记录字段
+FIELDS = ("last", "bid1", "ask1", "bid_vol1", "ask_vol1", "volume", "timestamp")
+
+
+class QuoteBus():
+    """
+    共享内存行情总线
+    由交易市场进程写入行情，同一主机上的其他进程（web服务、策略、报表等）直接读取共享内存，
+    不需要各自连接行情源。
+
+    共享内存由头部、证券代码表、各证券最新行情表及行情记录环形队列组成，记录为固定长度的二进制结构：
+    1、最新行情表每个证券一条记录，记录序号为奇数时表示正在写入，读取前后序号一致才有效；
+    2、环形队列按写入顺序保存行情记录，记录序号即全局序号，读取方记录上次读到的序号即可增量读取。
+
+    只允许一个进程写入，头部记录写入进程ID：共享内存已存在时，只有写入进程已退出才释放重建，
+    否则创建失败。
+    """
+
+    def __init__(
+            self,
+            name: str,
+            create: bool = False,
+            capacity: int = 4096,
+            max_symbols: int = 8192
+    ):
+        self.name = name                    # 共享内存名称
+        self.create = create                # 是否为写入方
+        self._symbols = dict()              # 证券代码与编号的字典
+        self._symbol_list = list()          # 证券代码列表
+        self._seq = 0                       # 最新记录序号
+
+        if shared_memory is None:
+            raise ImportError("共享内存行情总线需要Python 3.8及以上版本")
+
+        if create:
+            size = self.get_size(capacity, max_symbols)
+            try:
+                self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+            except FileExistsError:
+                # 上次运行未正常释放的共享内存
+                reclaim_shared_memory(name)
+                self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+            self.buf = self._shm.buf
+            HEADER.pack_into(self.buf, 0, MAGIC, capacity, max_symbols, 0, 0, os.getpid())
+        else:
+            self._shm = attach_shared_memory(name)
+            self.buf = self._shm.buf
+            magic, capacity, max_symbols, count, seq, pid = HEADER.unpack_from(self.buf, 0)
+            if magic != MAGIC:
+                self.close()
+                raise ValueError("共享内存不是行情总线")
+
+        self.capacity = capacity            # 环形队列容量
+        self.max_symbols = max_symbols      # 最大证券数量
+
+        self._latest_offset = HEADER.size + max_symbols * SYMBOL.size
+        self._ring_offset = self._latest_offset + max_symbols * RECORD.size
+
+    @staticmethod
+    def get_size(capacity: int, max_symbols: int):
+        """共享内存大小"""
+        return HEADER.size + max_symbols * (SYMBOL.size + RECORD.size) + capacity * RECORD.size
+
+    def publish(
+            self,
+            symbol: str,
+            last: float,
+            bid1: float,
+            ask1: float,
+            bid_vol1: int = 0,
+            ask_vol1: int = 0,
+            volume: int = 0,
+            timestamp: float = None
+    ):
+        """发布一条行情"""
+        symbol_id = self.__register_symbol(symbol)
+        if symbol_id is None:
+            return False
+
+        buf = self.buf
+        timestamp = timestamp or time()
+        seq = self._seq + 1
+
+        # 写入环形队列，写入过程中序号置0
+        offset = self._ring_offset + ((seq - 1) % self.capacity) * RECORD.size
+        RECORD.pack_into(buf, offset, 0, symbol_id, last, bid1, ask1,
+                         bid_vol1, ask_vol1, volume, timestamp)
+        SEQ.pack_into(buf, offset, seq)
+
+        # 写入最新行情表，写入过程中序号为奇数
+        offset = self._latest_offset + symbol_id * RECORD.size
+        lock = SEQ.unpack_from(buf, offset)[0]
+        RECORD.pack_into(buf, offset, lock + 1, symbol_id, last, bid1, ask1,
+                         bid_vol1, ask_vol1, volume, timestamp)
+        SEQ.pack_into(buf, offset, lock + 2)
+
+        self._seq = seq
+        SEQ.pack_into(buf, SEQ_OFFSET, seq)
+        return True
+
+    def __register_symbol(self, symbol: str):
+        """获取证券编号，新证券登记到证券代码表"""
+        symbol_id = self._symbols.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self._symbol_list)
+            if symbol_id >= self.max_symbols:
+                return None
+
+            SYMBOL.pack_into(self.buf, HEADER.size + symbol_id * SYMBOL.size, symbol.encode())
+            self._symbols[symbol] = symbol_id
+            self._symbol_list.append(symbol)
+            COUNT.pack_into(self.buf, COUNT_OFFSET, symbol_id + 1)
+
+        return symbol_id
+
+    def __refresh_symbols(self):
+        """读取写入方新登记的证券"""
+        count = COUNT.unpack_from(self.buf, COUNT_OFFSET)[0]
+        for symbol_id in range(len(self._symbol_list), count):
+            raw = SYMBOL.unpack_from(self.buf, HEADER.size + symbol_id * SYMBOL.size)[0]
+            symbol = raw.rstrip(b"\0").decode()
+            self._symbols[symbol] = symbol_id
+            self._symbol_list.append(symbol)
+
+    def get_symbol_id(self, symbol: str):
+        """查询证券编号"""
+        symbol_id = self._symbols.get(symbol)
+        if symbol_id is None:
+            self.__refresh_symbols()
+            symbol_id = self._symbols.get(symbol)
+        return symbol_id
+
+    def get_quote(self, symbol: str, retries: int = READ_RETRIES):
+        """
+        查询证券最新行情
+        :param symbol: 证券代码
+        :param retries: 记录正在写入时的最大重试次数
+        :return: 行情字典，无行情或重试次数用完仍未读到完整记录时返回None
+        """
+        symbol_id = self.get_symbol_id(symbol)
+        if symbol_id is None:
+            return None
+
+        offset = self._latest_offset + symbol_id * RECORD.size
+        for i in range(retries + 1):
+            record = RECORD.unpack_from(self.buf, offset)
+            lock = record[0]
+            if not lock:
+                return None
+
+            # 写入过程中或读取期间被改写的记录需要重新读取
+            if lock % 2 == 0 and SEQ.unpack_from(self.buf, offset)[0] == lock:
+                return self.__to_dict(record)
+
+        return None
+
+    def read(self, start_seq: int = 0):
+        """
+        增量读取行情记录
+        读取方落后超过环形队列容量时，已被覆盖的记录将被跳过
+        :param start_seq: 上次读取到的记录序号
+        :return: (序号大于start_seq的行情列表, 最新记录序号)
+        """
+        end_seq = SEQ.unpack_from(self.buf, SEQ_OFFSET)[0]
+        quotes = list()
+
+        for seq in range(max(start_seq, end_seq - self.capacity) + 1, end_seq + 1):
+            offset = self._ring_offset + ((seq - 1) % self.capacity) * RECORD.size
+            record = RECORD.unpack_from(self.buf, offset)
+            if record[0] == seq and SEQ.unpack_from(self.buf, offset)[0] == seq:
+                quote = self.__to_dict(record)
+                quote['seq'] = seq
+                quotes.append(quote)
+
+        return quotes, end_seq
+
+    def __to_dict(self, record: tuple):
+        """行情记录转换为字典"""
+        symbol_id = record[1]
+        if symbol_id >= len(self._symbol_list):
+            self.__refresh_symbols()
+
+        quote = dict(zip(FIELDS, record[2:]))
+        quote['symbol'] = self._symbol_list[symbol_id]
+        return quote
+
+    def close(self, unlink: bool = False):
+        """关闭行情总线，写入方关闭时可以释放共享内存"""
+        self.buf = None
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+def reclaim_shared_memory(name: str):
+    """
+    释放已退出的写入进程遗留的共享内存
+    共享内存不是行情总线，或写入进程仍在运行（无法确认时视为运行）时抛出FileExistsError
+    """
+    old = attach_shared_memory(name)
+    try:
+        magic = HEADER.unpack_from(old.buf, 0)[0] if old.size >= HEADER.size else None
+        pid = PID.unpack_from(old.buf, PID_OFFSET)[0] if magic == MAGIC else 0
+    finally:
+        old.close()
+
+    if magic != MAGIC:
+        raise FileExistsError(f"共享内存{name}已存在且不是行情总线")
+    if is_process_alive(pid):
+        raise FileExistsError(f"行情总线{name}正在被进程{pid}写入")
+
+    old = shared_memory.SharedMemory(name)
+    old.close()
+    old.unlink()
+
+
+def is_process_alive(pid: int):
+    """进程是否在运行，无法确认时视为运行"""
+    # Windows的共享内存在所有进程关闭后自动释放，已存在说明仍有进程在使用
+    if not pid or os.name == "nt" or pid == os.getpid():
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def attach_shared_memory(name: str):
+    """
+    连接已存在的共享内存
+    读取方不登记到resource_tracker，避免读取进程退出时释放写入方的共享内存
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        from multiprocessing import resource_tracker
+
+        shm = shared_memory.SharedMemory(name)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
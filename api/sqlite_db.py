@@ -0,0 +1,400 @@
+import re
+import json
+import sqlite3
+from threading import local, Lock
+from contextlib import contextmanager
+
+from paper_trading.api.storage import (
+    BaseDBService,
+    match_filter,
+    is_operator,
+    apply_update,
+    apply_projection,
+    group_docs
+)
+from paper_trading.utility.model import DBData
+
+# 字段名称校验，只有符合规则的字段才转换为SQL查询条件
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# 可以转换为SQL的比较运算符
+SQL_OPS = {'$gt': ">", '$gte': ">=", '$lt': "<", '$lte': "<=", '$ne': "!="}
+
+# 集合表名的分隔符：数据库名称.集合名称
+SEPARATOR = "."
+
+
+class SQLiteDBService(BaseDBService):
+    """
+    SQLite数据库服务类
+    嵌入式存储，适合单机部署及本地测试，不需要MongoDB服务。
+    每个数据库的集合对应一张表，数据以json保存，索引建立在json字段的表达式上；
+    使用WAL模式，每个线程使用各自的连接，读取不阻塞写入，多条写入在一个事务中完成。
+    """
+
+    def __init__(self, path: str, timeout: float = 5):
+        """构造函数"""
+        self.path = path                # 数据库文件路径
+        self.timeout = timeout          # 等待写锁的超时时间（秒）
+        self.connected = False          # 数据库连接状态
+
+        self._local = local()
+        self._conns = []                # 所有线程的连接
+        self._tables = set()            # 已创建的表
+        self._lock = Lock()
+
+    def connect_db(self):
+        """连接数据库"""
+        try:
+            conn = self._get_conn()
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.connected = True
+            return True
+        except:
+            raise sqlite3.OperationalError("SQLite数据库连接失败")
+
+    def _get_conn(self):
+        """获取当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path,
+                                   timeout=self.timeout,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """写事务，开始时即获取写锁，保证先读后写的操作不被其他线程打断"""
+        conn = self._get_conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _table(pt_db: DBData):
+        """集合对应的表名"""
+        name = f"{pt_db.db_name}{SEPARATOR}{pt_db.db_cl}"
+        return '"' + name.replace('"', '""') + '"'
+
+    def _exists(self, conn, table: str):
+        """表是否存在"""
+        if table in self._tables:
+            return True
+        row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                           (table[1:-1].replace('""', '"'),)).fetchone()
+        if row:
+            self._tables.add(table)
+        return bool(row)
+
+    def _creat_table(self, conn, table: str):
+        """创建集合对应的表"""
+        if table not in self._tables:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                         f"(_id INTEGER PRIMARY KEY AUTOINCREMENT, doc TEXT NOT NULL)")
+            self._tables.add(table)
+
+    def _find(self, conn, table: str, flt: dict, limit: int = 0, batch_size: int = 0, sort: list = None):
+        """查询符合条件的数据，逐条返回(_id, 数据)"""
+        if not self._exists(conn, table):
+            return
+
+        where, params, exact = to_sql(flt)
+        sql = f"SELECT _id, doc FROM {table}"
+        if where:
+            sql += " WHERE " + where
+        order = [f"{field_expr(field)} {'DESC' if direction < 0 else 'ASC'}"
+                 for field, direction in sort or [] if FIELD_NAME.match(field)]
+        sql += " ORDER BY " + ", ".join(order + ["_id"])
+        if limit and exact:
+            sql += f" LIMIT {int(limit)}"
+
+        cursor = conn.execute(sql, params)
+        count = 0
+        while True:
+            rows = cursor.fetchmany(batch_size or 1000)
+            if not rows:
+                break
+            for _id, raw in rows:
+                doc = json.loads(raw)
+                if exact or match_filter(doc, flt):
+                    yield _id, doc
+                    count += 1
+                    if limit and count >= limit:
+                        return
+
+    def on_query_one(self, pt_db: DBData):
+        """数据库查询操作"""
+        try:
+            conn = self._get_conn()
+            table = self._table(pt_db)
+            for _id, doc in self._find(conn, table, pt_db.raw_data['flt'], limit=1):
+                doc['_id'] = _id
+                return apply_projection(doc, pt_db.raw_data.get('projection'))
+            return None
+        except:
+            raise sqlite3.OperationalError("SQLite数据库查询数据失败")
+
+    def on_select(self, pt_db: DBData):
+        """
+        数据库查询操作
+        返回生成器，数据在遍历时按批次从数据库读取
+        """
+        try:
+            conn = self._get_conn()
+            table = self._table(pt_db)
+            rows = self._find(conn, table,
+                              pt_db.raw_data['flt'],
+                              limit=pt_db.raw_data.get('limit', 0),
+                              batch_size=pt_db.raw_data.get('batch_size', 0),
+                              sort=pt_db.raw_data.get('sort'))
+            return self._iter_docs(rows, pt_db.raw_data.get('projection'))
+        except:
+            raise sqlite3.OperationalError("SQLite数据库查询数据失败")
+
+    @staticmethod
+    def _iter_docs(rows, projection: dict = None):
+        """按返回字段逐条输出数据"""
+        for _id, doc in rows:
+            doc['_id'] = _id
+            yield apply_projection(doc, projection)
+
+    def on_insert(self, pt_db: DBData):
+        """数据库插入数据操作"""
+        try:
+            table = self._table(pt_db)
+            with self._transaction() as conn:
+                self._creat_table(conn, table)
+                conn.execute(f"INSERT INTO {table} (doc) VALUES (?)",
+                             (dumps(pt_db.raw_data['data'].__dict__),))
+            return True
+        except:
+            raise sqlite3.OperationalError("SQLite数据库插入数据失败")
+
+    def on_insert_many(self, pt_db: DBData):
+        """数据库插入数据操作"""
+        try:
+            table = self._table(pt_db)
+            with self._transaction() as conn:
+                self._creat_table(conn, table)
+                conn.executemany(f"INSERT INTO {table} (doc) VALUES (?)",
+                                 [(dumps(d),) for d in pt_db.raw_data['data']])
+            return True
+        except:
+            raise sqlite3.OperationalError("SQLite数据库插入数据失败")
+
+    def on_replace_one(self, pt_db: DBData):
+        """数据库插入数据操作"""
+        try:
+            table = self._table(pt_db)
+            with self._transaction() as conn:
+                self._creat_table(conn, table)
+                self._replace(conn, table, pt_db.raw_data['flt'], pt_db.raw_data['data'].__dict__)
+            return True
+        except:
+            raise sqlite3.OperationalError("SQLite数据库replace数据失败")
+
+    def on_update(self, pt_db: DBData):
+        """数据库更新操作"""
+        try:
+            table = self._table(pt_db)
+            with self._transaction() as conn:
+                self._update(conn, table, pt_db.raw_data['flt'], pt_db.raw_data['set'])
+            return True
+        except:
+            raise sqlite3.OperationalError("SQLite数据库更新数据失败")
+
+    def on_bulk_write(self, pt_db: DBData):
+        """
+        数据库批量写入操作
+        所有操作在一个事务中完成，replace不存在时插入
+        """
+        try:
+            table = self._table(pt_db)
+            with self._transaction() as conn:
+                self._creat_table(conn, table)
+                for op, flt, data in pt_db.raw_data['data']:
+                    if op == 'replace':
+                        self._replace(conn, table, flt, data)
+                    elif op == 'update':
+                        self._update(conn, table, flt, data)
+                    elif op == 'delete':
+                        self._delete(conn, table, flt)
+            return True
+        except:
+            raise sqlite3.OperationalError("SQLite数据库批量写入数据失败")
+
+    def _replace(self, conn, table: str, flt: dict, data: dict):
+        """替换第一条符合条件的数据，不存在时插入"""
+        for _id, doc in self._find(conn, table, flt, limit=1):
+            conn.execute(f"UPDATE {table} SET doc=? WHERE _id=?", (dumps(data), _id))
+            return
+        conn.execute(f"INSERT INTO {table} (doc) VALUES (?)", (dumps(data),))
+
+    def _update(self, conn, table: str, flt: dict, update: dict):
+        """更新第一条符合条件的数据"""
+        for _id, doc in self._find(conn, table, flt, limit=1):
+            conn.execute(f"UPDATE {table} SET doc=? WHERE _id=?",
+                         (dumps(apply_update(doc, update)), _id))
+
+    def _delete(self, conn, table: str, flt: dict):
+        """删除所有符合条件的数据"""
+        ids = [(_id,) for _id, doc in self._find(conn, table, flt)]
+        conn.executemany(f"DELETE FROM {table} WHERE _id=?", ids)
+        return len(ids)
+
+    def on_delete(self, pt_db: DBData):
+        """数据库删除操作"""
+        try:
+            table = self._table(pt_db)
+            with self._transaction() as conn:
+                return self._delete(conn, table, pt_db.raw_data['flt'])
+        except:
+            raise sqlite3.OperationalError("SQLite数据库删除数据失败")
+
+    def on_index_creat(self, pt_db: DBData):
+        """
+        创建索引，已存在的索引不会重复创建
+        raw_data['index']为索引列表，每个索引为(字段, 排序方向)的列表
+        """
+        try:
+            table = self._table(pt_db)
+            name = f"{pt_db.db_name}{SEPARATOR}{pt_db.db_cl}"
+            with self._transaction() as conn:
+                self._creat_table(conn, table)
+                for keys in pt_db.raw_data['index']:
+                    fields = [field for field, direction in keys]
+                    index = '"' + (name + "_" + "_".join(fields)).replace('"', '""') + '"'
+                    columns = ", ".join(field_expr(field) for field in fields)
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})")
+            return True
+        except:
+            raise sqlite3.OperationalError("SQLite数据库创建索引失败")
+
+    def on_group(self, pt_db: DBData):
+        """分组查询"""
+        try:
+            conn = self._get_conn()
+            table = self._table(pt_db)
+            flt = pt_db.raw_data['flt']
+            docs = (doc for _id, doc in self._find(conn, table, flt.get('$match', flt)))
+            return group_docs(docs, pt_db.raw_data['group'])
+        except:
+            raise sqlite3.OperationalError("SQLite数据库分组查询数据失败")
+
+    def on_collections_query(self, pt_db: DBData):
+        """获取集合列表"""
+        try:
+            conn = self._get_conn()
+            prefix = f"{pt_db.db_name}{SEPARATOR}"
+            rows = conn.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                                "AND substr(name, 1, ?)=?", (len(prefix), prefix)).fetchall()
+            return [name[len(prefix):] for name, in rows]
+        except:
+            raise sqlite3.OperationalError("SQLite数据库查询所有集合名称失败")
+
+    def on_collection_delete(self, pt_db: DBData):
+        """数据库集合删除"""
+        try:
+            table = self._table(pt_db)
+            conn = self._get_conn()
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._tables.discard(table)
+            return True
+        except:
+            raise sqlite3.OperationalError("SQLite数据库集合删除失败")
+
+    def close(self):
+        """数据服务关闭"""
+        self.connected = False
+
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+        self._local = local()
+
+
+def field_expr(field: str):
+    """字段对应的SQL表达式"""
+    if field == '_id':
+        return "_id"
+    return f"json_extract(doc, '$.{field}')"
+
+
+def to_sql(flt: dict):
+    """
+    查询条件转换为SQL
+    无法转换的条件（嵌套字段、$or等）需在读取后再次筛选
+    :return: (where语句, 参数, 是否完全转换)
+    """
+    clauses = []
+    params = []
+    exact = True
+
+    for field, cond in flt.items():
+        if field in ('$and', '$or') and isinstance(cond, list) and cond:
+            parts = [to_sql(f) for f in cond]
+            if all(part_exact for part_where, part_params, part_exact in parts):
+                joiner = " AND " if field == '$and' else " OR "
+                clauses.append("(" + joiner.join(f"({w})" if w else "1" for w, p, e in parts) + ")")
+                for w, p, e in parts:
+                    params.extend(p)
+            else:
+                # AND中能转换的条件仍用于缩小查询范围
+                if field == '$and':
+                    for w, p, e in parts:
+                        if w:
+                            clauses.append(f"({w})")
+                            params.extend(p)
+                exact = False
+            continue
+
+        if not FIELD_NAME.match(field):
+            exact = False
+            continue
+
+        expr = field_expr(field)
+        if is_operator(cond):
+            for op, value in cond.items():
+                if op == '$ne' and value is None:
+                    # 字段存在且不为null
+                    clauses.append(f"{expr} IS NOT NULL")
+                elif op in SQL_OPS and is_scalar(value):
+                    if op == '$ne':
+                        clauses.append(f"({expr} IS NULL OR {expr} != ?)")
+                    else:
+                        clauses.append(f"{expr} {SQL_OPS[op]} ?")
+                    params.append(value)
+                elif op == '$in' and value and all(is_scalar(v) for v in value):
+                    clauses.append(f"{expr} IN ({', '.join('?' * len(value))})")
+                    params.extend(value)
+                else:
+                    exact = False
+        elif is_scalar(cond) and cond is not None:
+            clauses.append(f"{expr} = ?")
+            params.append(cond)
+        else:
+            exact = False
+
+    return " AND ".join(clauses), params, exact
+
+
+def is_scalar(value):
+    """是否为可以直接比较的数值或字符串"""
+    return isinstance(value, (str, int, float)) or value is None
+
+
+def dumps(data: dict):
+    """数据转换为json，不保存_id"""
+    doc = {k: v for k, v in data.items() if k != '_id'}
+    return json.dumps(doc, ensure_ascii=False, default=str)
@@ -0,0 +1,217 @@
+from abc import ABC, abstractmethod
+
+from paper_trading.utility.model import DBData
+
+# 查询条件中的比较运算符
+COMPARE_OPS = {
+    '$gt': lambda a, b: a is not None and a > b,
+    '$gte': lambda a, b: a is not None and a >= b,
+    '$lt': lambda a, b: a is not None and a < b,
+    '$lte': lambda a, b: a is not None and a <= b,
+    '$ne': lambda a, b: a != b,
+    '$in': lambda a, b: a in b,
+    '$nin': lambda a, b: a not in b,
+}
+
+
+class BaseDBService(ABC):
+    """
+    数据存储服务基类
+    db_model中的数据操作均通过以下方法完成，参数为DBData，raw_data中的键值与MongoDB的用法一致：
+    flt（查询条件）、set（更新操作）、data（数据）、projection（返回字段）、batch_size、index、group
+    """
+
+    @abstractmethod
+    def connect_db(self):
+        """连接数据库"""
+        pass
+
+    @abstractmethod
+    def on_query_one(self, pt_db: DBData):
+        """查询一条数据，无数据返回None"""
+        pass
+
+    @abstractmethod
+    def on_select(self, pt_db: DBData):
+        """查询数据，返回可遍历的结果"""
+        pass
+
+    @abstractmethod
+    def on_insert(self, pt_db: DBData):
+        """插入一条数据，raw_data['data']为数据对象"""
+        pass
+
+    @abstractmethod
+    def on_insert_many(self, pt_db: DBData):
+        """插入多条数据，raw_data['data']为字典列表"""
+        pass
+
+    @abstractmethod
+    def on_replace_one(self, pt_db: DBData):
+        """替换一条数据，不存在时插入"""
+        pass
+
+    @abstractmethod
+    def on_update(self, pt_db: DBData):
+        """更新一条数据"""
+        pass
+
+    @abstractmethod
+    def on_bulk_write(self, pt_db: DBData):
+        """批量写入，raw_data['data']为操作列表：(操作类型, 条件, 数据)"""
+        pass
+
+    @abstractmethod
+    def on_delete(self, pt_db: DBData):
+        """删除所有符合条件的数据"""
+        pass
+
+    @abstractmethod
+    def on_index_creat(self, pt_db: DBData):
+        """创建索引"""
+        pass
+
+    @abstractmethod
+    def on_group(self, pt_db: DBData):
+        """分组查询"""
+        pass
+
+    @abstractmethod
+    def on_collections_query(self, pt_db: DBData):
+        """获取集合列表"""
+        pass
+
+    @abstractmethod
+    def on_collection_delete(self, pt_db: DBData):
+        """删除集合"""
+        pass
+
+    @abstractmethod
+    def close(self):
+        """关闭数据服务"""
+        pass
+
+
+def match_filter(doc: dict, flt: dict):
+    """判断数据是否符合查询条件"""
+    for field, cond in flt.items():
+        if field == '$and':
+            if not all(match_filter(doc, f) for f in cond):
+                return False
+        elif field == '$or':
+            if not any(match_filter(doc, f) for f in cond):
+                return False
+        elif is_operator(cond):
+            value = doc.get(field)
+            for op, target in cond.items():
+                if op == '$exists':
+                    if (field in doc) != bool(target):
+                        return False
+                elif op in COMPARE_OPS:
+                    try:
+                        if not COMPARE_OPS[op](value, target):
+                            return False
+                    except TypeError:
+                        return False
+                else:
+                    raise ValueError(f"不支持的查询条件：{op}")
+        elif doc.get(field) != cond:
+            return False
+    return True
+
+
+def is_operator(cond):
+    """查询条件是否为运算符表达式"""
+    return isinstance(cond, dict) and bool(cond) and all(k.startswith('$') for k in cond)
+
+
+def apply_update(doc: dict, update: dict):
+    """执行更新操作，支持$set、$inc、$unset"""
+    for op, fields in update.items():
+        if op == '$set':
+            doc.update(fields)
+        elif op == '$inc':
+            for field, value in fields.items():
+                doc[field] = doc.get(field, 0) + value
+        elif op == '$unset':
+            for field in fields:
+                doc.pop(field, None)
+        else:
+            raise ValueError(f"不支持的更新操作：{op}")
+    return doc
+
+
+def apply_projection(doc: dict, projection: dict = None):
+    """按返回字段筛选数据，_id默认返回"""
+    if not projection:
+        return doc
+
+    include = [f for f, v in projection.items() if v and f != '_id']
+    if include:
+        result = {f: doc[f] for f in include if f in doc}
+        if projection.get('_id', 1) and '_id' in doc:
+            result['_id'] = doc['_id']
+        return result
+
+    return {f: v for f, v in doc.items() if projection.get(f, 1)}
+
+
+def group_docs(docs, group: dict):
+    """
+    执行$group分组
+    分组键为'$字段'或None，支持$sum、$avg、$max、$min、$first、$last、$push
+    """
+    stage = group.get('$group', group)
+    key_expr = stage['_id']
+    groups = dict()
+
+    for doc in docs:
+        key = get_value(doc, key_expr)
+        groups.setdefault(key, []).append(doc)
+
+    result = []
+    for key, items in groups.items():
+        row = {'_id': key}
+        for name, acc in stage.items():
+            if name == '_id':
+                continue
+            (op, expr), = acc.items()
+            values = [get_value(d, expr) for d in items]
+            if op == '$sum':
+                row[name] = sum(v for v in values if isinstance(v, (int, float)))
+            elif op == '$avg':
+                nums = [v for v in values if isinstance(v, (int, float))]
+                row[name] = sum(nums) / len(nums) if nums else None
+            elif op == '$max':
+                row[name] = max(v for v in values if v is not None)
+            elif op == '$min':
+                row[name] = min(v for v in values if v is not None)
+            elif op == '$first':
+                row[name] = values[0]
+            elif op == '$last':
+                row[name] = values[-1]
+            elif op == '$push':
+                row[name] = values
+            else:
+                raise ValueError(f"不支持的分组运算：{op}")
+        result.append(row)
+
+    return result
+
+
+def sort_docs(docs, sort: list):
+    """
+    按排序条件排序，sort为(字段, 排序方向)的列表，1为升序，-1为降序
+    字段不存在的数据排在最前
+    """
+    docs = list(docs)
+    for field, direction in reversed(sort):
+        docs.sort(key=lambda d: (d.get(field) is not None, d.get(field)), reverse=direction < 0)
+    return docs
+
+
+def get_value(doc: dict, expr):
+    """获取表达式的值，'$字段'取数据中的字段，其余为常量"""
+    if isinstance(expr, str) and expr.startswith('$'):
+        return doc.get(expr[1:])
+    return expr
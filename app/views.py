@@ -1,8 +1,8 @@
 
 import json
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, Response, request, jsonify, render_template
 
-from paper_trading.api.db import MongoDBService
+from paper_trading.event.stats import stats_to_prometheus
 from paper_trading.trade.data_center import (
     get_stock_daily_qfq,
     get_stock_mtime
@@ -16,8 +16,9 @@ from paper_trading.trade.db_model import (
     on_account_delete,
     query_account_list,
     query_orders_by_symbol,
-    query_order_status,
-    query_order_one, query_orders)
+    iter_orders_history,
+    iter_orders_sorted,
+    query_orders_page)
 
 # 主引擎
 main_engine = None
@@ -51,8 +52,7 @@ def init_blue(app, engine):
     tdx = main_engine.creat_hq_api()
 
     # 连接测试行情数据库
-    test_db = MongoDBService('192.168.1.251', 27017)
-    test_db.connect_db()
+    test_db = main_engine.creat_hq_db()
 
 
 """web page"""
@@ -121,7 +121,11 @@ def account_creat():
     if request.form.get("info"):
         info = request.form["info"]
         info_dict = json.loads(info)
-        account = account_engine.creat(info_dict)
+        # 账户参数为列表时批量创建，返回账户信息列表
+        if isinstance(info_dict, list):
+            account = account_engine.creat_many(info_dict)
+        else:
+            account = account_engine.creat(info_dict)
         if account:
             rps['data'] = account
         else:
@@ -140,7 +144,15 @@ def account_delete():
     rps = {}
     rps['status'] = True
 
-    if request.form.get("token"):
+    if request.form.get("tokens"):
+        # 批量删除，返回删除成功的账户列表
+        tokens = json.loads(request.form["tokens"])
+        if isinstance(tokens, list):
+            rps['data'] = account_engine.delete_many(tokens)
+        else:
+            rps['status'] = False
+            rps['data'] = "请求参数错误"
+    elif request.form.get("token"):
         token = request.form["token"]
         if on_account_exist(token, db):
             account_engine.logout(token)
@@ -215,7 +227,14 @@ def position_query():
 
 @blue.route('/orders', methods=["POST"])
 def orders_query():
-    """查询所有订单"""
+    """
+    查询所有订单
+    可选参数：
+    limit：分页查询每页条数，返回{"status", "data", "next"}，next为下一页的游标，没有更多订单时为null
+    cursor：分页游标，从游标之后的订单开始查询
+    format：为ndjson时逐行输出订单，每行一条json，分页时下一页游标在响应头X-Next-Cursor中
+    分页及逐行输出时订单按订单日期及订单编号排序
+    """
     rps = {}
     rps['status'] = True
 
@@ -227,15 +246,42 @@ def orders_query():
             flt = {"order_date": {"$gte": start_date, "$lte": end_date}}
         else:
             flt = {}
+        cursor = request.form.get("cursor")
+        ndjson = request.form.get("format") == "ndjson"
         try:
-            data = query_orders(token, db, flt)
+            limit = int(request.form.get("limit") or 0)
+        except ValueError:
+            limit = -1
+        if limit < 0:
+            rps['status'] = False
+            rps['data'] = "请求参数错误"
+            return jsonify(rps)
+
+        try:
+            if limit:
+                orders, next_cursor = query_orders_page(token, db, flt, cursor, limit)
+                if ndjson:
+                    rsp = Response(stream_ndjson(orders), mimetype="application/x-ndjson")
+                    if next_cursor:
+                        rsp.headers["X-Next-Cursor"] = next_cursor
+                    return rsp
+                rps['data'] = orders
+                rps['next'] = next_cursor
+                return jsonify(rps)
+
+            if ndjson:
+                orders = iter_orders_sorted(token, db, flt, cursor)
+                first = next(orders, None)
+                return Response(stream_ndjson(orders, first), mimetype="application/x-ndjson")
+
+            # 逐条读取订单并分段输出，历史订单较多时不需要一次性加载到内存
+            orders = iter_orders_history(token, db, flt)
+            first = next(orders, None)
         except Exception as e:
-            status = False
-            data = "查询订单失败"
+            rps['status'] = False
+            rps['data'] = "查询订单失败"
         else:
-            status = True
-        rps['status'] = status
-        rps['data'] = data or []
+            return Response(stream_orders(first, orders), mimetype="application/json")
     else:
         rps['status'] = False
         rps['data'] = "请求参数错误"
@@ -243,6 +289,37 @@ def orders_query():
     return jsonify(rps)
 
 
+def stream_orders(first, orders):
+    """
+    以json数组的形式分段输出订单数据
+    status在订单数据之后输出，读取订单中途出错时status为false，error为错误信息
+    """
+    yield '{"data": ['
+    try:
+        if first is not None:
+            yield json.dumps(first, ensure_ascii=False)
+            for order in orders:
+                yield ', ' + json.dumps(order, ensure_ascii=False)
+    except Exception:
+        yield '], "status": false, "error": "查询订单失败"}'
+        return
+    yield '], "status": true}'
+
+
+def stream_ndjson(orders, first=None):
+    """
+    逐行输出订单数据，每行一条json
+    读取订单中途出错时以一行{"status": false, "data": "查询订单失败"}结束
+    """
+    try:
+        if first is not None:
+            yield json.dumps(first, ensure_ascii=False) + "\n"
+        for order in orders:
+            yield json.dumps(order, ensure_ascii=False) + "\n"
+    except Exception:
+        yield json.dumps({"status": False, "data": "查询订单失败"}, ensure_ascii=False) + "\n"
+
+
 @blue.route('/orders_today', methods=["POST"])
 def orders_today_query():
     """查询当日订单"""
@@ -300,8 +377,7 @@ def order_cancel():
         if request.form.get("order_id"):
             token = request.form["token"]
             order_id = request.form["order_id"]
-            result, order = query_order_one(
-                token, order_id, db)
+            result, order = account_engine.query_order_one(token, order_id)
             if not result:
                 rps['status'] = False
                 rps['data'] = "查询订单失败"
@@ -332,8 +408,7 @@ def get_status():
         if request.form.get("order_id"):
             token = request.form["token"]
             order_id = request.form["order_id"]
-            result, order_status = query_order_status(
-                token, order_id, db)
+            result, order_status = account_engine.query_order_status(token, order_id)
             if result:
                 rps['data'] = order_status
             else:
@@ -460,6 +535,29 @@ def test():
 
     return jsonify(rps)
 
+@blue.route('/event_stats', methods=['GET'])
+def event_stats():
+    """查询事件引擎运行统计"""
+    stats = main_engine.query_event_stats()
+
+    if request.args.get("format") == "prometheus":
+        return Response(stats_to_prometheus(stats), mimetype="text/plain")
+
+    rps = {}
+    rps['status'] = True
+    rps['data'] = stats
+
+    return jsonify(rps)
+
+@blue.route('/db_stats', methods=['GET'])
+def db_stats():
+    """查询数据库连接池统计"""
+    rps = {}
+    rps['status'] = True
+    rps['data'] = main_engine.query_db_stats()
+
+    return jsonify(rps)
+
 """data for web page"""
 
 
@@ -7,6 +7,9 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 class Config:
     DEBUG = False
     SECRET_KEY = os.environ.get('SECRET_KEY') or "j1as78a1gf6a4ea1f5d6a78e41fa56e"
+    # 数据存储后端：mongodb、sqlite，单机部署时可设置为sqlite，不需要MongoDB服务
+    DB_BACKEND = os.environ.get('PT_DB_BACKEND') or "mongodb"
+    SQLITE_PATH = os.environ.get('PT_SQLITE_PATH') or os.path.join(basedir, "paper_trading.db")
 
     @staticmethod
     def init_app(app):
@@ -1 +1,3 @@
-from .engine import Event, EventEngine, EVENT_TIMER
+from .engine import Event, EventEngine, EventQueue, PutPolicy, EVENT_TIMER
+from .async_engine import AsyncEventEngine
+from .timer import TimerHandle
@@ -0,0 +1,398 @@
+"""
+asyncio version of the event-driven framework.
+"""
+
+import asyncio
+import traceback
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+from time import monotonic, perf_counter, time
+from typing import Callable
+
+from .engine import (
+    EVENT_TIMER,
+    CoalesceType,
+    Event,
+    HandlerType,
+    PartitionType,
+    PutPolicy,
+    get_coalesce_skips
+)
+from .stats import EventStats
+from .timer import TimerHandle
+
+
+class AsyncEventEngine:
+    """
+    Event engine running on an asyncio event loop, which has the
+    same interface as EventEngine.
+
+    Handlers can be coroutine functions, which are awaited on the
+    loop, or plain functions, which are run by a thread pool
+    executor, so existing sync handlers work without change.
+    Size of the executor is executor_workers, independent of the
+    number of worker tasks.
+
+    Exception raised by a handler is printed and counted in stats,
+    other handlers and later events are still processed.
+
+    Events are dispatched by worker tasks instead of threads. Each
+    event is routed to one worker by the key returned from
+    partition_key, so events sharing a key are processed in order
+    while I/O of different keys overlaps.
+
+    Callbacks scheduled by call_later, call_at and call_every run
+    on the loop, timer event is generated only if any handler is
+    registered for EVENT_TIMER.
+
+    If loop is not given, the engine runs its own loop in a
+    background thread.
+    """
+
+    def __init__(
+        self,
+        interval: int = 1,
+        workers: int = 1,
+        partition_key: PartitionType = None,
+        batch_size: int = 100,
+        loop: asyncio.AbstractEventLoop = None,
+        executor: ThreadPoolExecutor = None,
+        executor_workers: int = None
+    ):
+        """
+        Timer event is generated every 1 second by default, if
+        interval not specified.
+
+        If executor is not given, a thread pool of executor_workers
+        threads is created, whose default size is decided by
+        ThreadPoolExecutor.
+        """
+        self._interval = interval
+        self._workers = max(1, workers)
+        self._partition_key = partition_key
+        self._batch_size = max(1, batch_size)
+        self._own_loop = loop is None
+        self._loop = loop or asyncio.new_event_loop()
+        self._executor = executor or ThreadPoolExecutor(executor_workers)
+        self._queues = []
+        self._put_times = []
+        self._pending = []
+        self._mutex = Lock()
+        self._active = False
+        self._thread = Thread(target=self._loop.run_forever)
+        self._tasks = []
+        self._handlers = {}
+        self._general_handlers = ()
+        self._coalesce_keys = defaultdict(dict)
+        self._policies = {}
+        self._stats = EventStats()
+        self._timer_event = None
+
+    async def _run(self, index: int):
+        """
+        Get events from queue in batch and then process them.
+        """
+        queue = self._queues[index]
+        put_times = self._put_times[index]
+
+        while self._active:
+            events = [await queue.get()]
+
+            while len(events) < self._batch_size and not queue.empty():
+                events.append(queue.get_nowait())
+
+            # None is put by stop to wake up the worker
+            events = [event for event in events if event is not None]
+            if not events:
+                continue
+
+            for event in events:
+                put_times.popleft()
+
+            if self._coalesce_keys:
+                skips = get_coalesce_skips(events, self._coalesce_keys)
+            else:
+                skips = [None] * len(events)
+
+            for event, skip in zip(events, skips):
+                await self._process(event, skip)
+
+    def _route(self, event: Event) -> int:
+        """
+        Find index of the worker queue which the event belongs to.
+        """
+        if self._workers == 1 or not self._partition_key:
+            return 0
+
+        key = self._partition_key(event)
+        if key is None:
+            return 0
+
+        return hash(key) % self._workers
+
+    def _enqueue(self, index: int, event: Event):
+        """
+        Put event into worker queue, which runs on the loop.
+        """
+        self._queues[index].put_nowait(event)
+        self._put_times[index].append(monotonic())
+
+    async def _process(self, event: Event, skip: list = None):
+        """
+        First ditribute event to those handlers registered listening
+        to this type.
+
+        Then distrubute event to those general handlers which listens
+        to all types.
+        """
+        for handler in self._handlers.get(event.type, ()):
+            if not skip or handler not in skip:
+                await self._call(handler, event)
+
+        for handler in self._general_handlers:
+            await self._call(handler, event)
+
+        self._stats.on_processed(event.type)
+
+    async def _call(self, handler: HandlerType, event: Event):
+        """
+        Await coroutine handler, or run sync handler in executor, and
+        record its latency.
+
+        Exception of handler is caught here, so that the worker task
+        keeps running.
+        """
+        start = perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(handler):
+                await handler(event)
+            else:
+                await self._loop.run_in_executor(self._executor, handler, event)
+        except Exception:
+            traceback.print_exc()
+            self._stats.on_failed(event.type, handler)
+        self._stats.on_handled(event.type, handler, perf_counter() - start)
+
+    def _schedule(self, handle: TimerHandle, when: float, interval: float):
+        """
+        Schedule the timer on loop at loop time when.
+        """
+        if handle.cancelled:
+            return
+
+        def fire():
+            if handle.cancelled:
+                return
+            if interval:
+                self._schedule(handle, when + interval, interval)
+
+            if asyncio.iscoroutinefunction(handle.callback):
+                self._loop.create_task(handle.callback(*handle.args))
+            else:
+                handle.run()
+
+        self._loop.call_at(when, fire)
+
+    def _add_timer(self, delay: float, interval: float, callback: Callable, args: tuple):
+        """
+        Create timer handle and schedule it from any thread.
+        """
+        handle = TimerHandle(0, callback, args)
+
+        def schedule():
+            self._schedule(handle, self._loop.time() + delay, interval)
+        self._loop.call_soon_threadsafe(schedule)
+
+        return handle
+
+    def call_later(self, delay: float, callback: Callable, *args) -> TimerHandle:
+        """
+        Call callback(*args) after delay seconds.
+        """
+        return self._add_timer(delay, 0, callback, args)
+
+    def call_at(self, when: float, callback: Callable, *args) -> TimerHandle:
+        """
+        Call callback(*args) at timestamp when.
+        """
+        return self._add_timer(when - time(), 0, callback, args)
+
+    def call_every(self, interval: float, callback: Callable, *args) -> TimerHandle:
+        """
+        Call callback(*args) every interval seconds, until cancelled.
+        """
+        return self._add_timer(interval, interval, callback, args)
+
+    def _put_timer_event(self):
+        """
+        Generate a timer event.
+        """
+        self.put(Event(EVENT_TIMER))
+
+    def _start_tasks(self):
+        """
+        Create queues, worker and timer tasks on the loop, then move
+        events put before start into queues.
+        """
+        with self._mutex:
+            self._queues = [asyncio.Queue() for i in range(self._workers)]
+            self._put_times = [deque() for i in range(self._workers)]
+            for event in self._pending:
+                self._enqueue(self._route(event), event)
+            self._pending = []
+
+        self._tasks = [self._loop.create_task(self._run(i)) for i in range(self._workers)]
+
+    def start(self):
+        """
+        Start event engine to process events and generate timer events.
+        """
+        self._active = True
+        if self._own_loop:
+            self._thread.start()
+        self._loop.call_soon_threadsafe(self._start_tasks)
+
+    def stop(self):
+        """
+        Stop event engine.
+        """
+        self._active = False
+
+        def wake_up():
+            for queue in self._queues:
+                queue.put_nowait(None)
+        self._loop.call_soon_threadsafe(wake_up)
+
+        if self._own_loop:
+            future = asyncio.run_coroutine_threadsafe(self._wait_tasks(), self._loop)
+            future.result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._executor.shutdown()
+
+    async def _wait_tasks(self):
+        """
+        Wait workers to finish.
+        """
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def put(self, event: Event):
+        """
+        Put an event object into event queue, which can be called
+        from any thread.
+        """
+        self._stats.on_put(event.type)
+
+        with self._mutex:
+            if not self._queues:
+                self._pending.append(event)
+                return
+
+        index = self._route(event)
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+
+        if in_loop:
+            self._enqueue(index, event)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, index, event)
+
+    def register(
+        self,
+        type: str,
+        handler: HandlerType,
+        coalesce_key: CoalesceType = None
+    ):
+        """
+        Register a new handler function for a specific event type. Every
+        function can only be registered once for each event type.
+
+        If coalesce_key is given, events superseded by a newer pending
+        event with the same key are not delivered to the handler.
+        """
+        handlers = self._handlers.get(type, ())
+        if handler not in handlers:
+            self._handlers[type] = handlers + (handler,)
+
+        if coalesce_key:
+            self._coalesce_keys[type][handler] = coalesce_key
+
+        if type == EVENT_TIMER and not self._timer_event:
+            self._timer_event = self.call_every(self._interval, self._put_timer_event)
+
+    def unregister(self, type: str, handler: HandlerType):
+        """
+        Unregister an existing handler function from event engine.
+        """
+        handlers = tuple(h for h in self._handlers.get(type, ()) if h != handler)
+
+        if handlers:
+            self._handlers[type] = handlers
+        else:
+            self._handlers.pop(type, None)
+
+        if type in self._coalesce_keys:
+            self._coalesce_keys[type].pop(handler, None)
+            if not self._coalesce_keys[type]:
+                self._coalesce_keys.pop(type)
+
+        if type == EVENT_TIMER and type not in self._handlers and self._timer_event:
+            self._timer_event.cancel()
+            self._timer_event = None
+
+    def register_general(self, handler: HandlerType):
+        """
+        Register a new handler function for all event types. Every
+        function can only be registered once for each event type.
+        """
+        if handler not in self._general_handlers:
+            self._general_handlers += (handler,)
+
+    def unregister_general(self, handler: HandlerType):
+        """
+        Unregister an existing general handler function.
+        """
+        self._general_handlers = tuple(
+            h for h in self._general_handlers if h != handler
+        )
+
+    def set_policy(
+        self,
+        type: str,
+        policy: PutPolicy,
+        coalesce_key: CoalesceType = None
+    ):
+        """
+        Kept for interface compatibility with EventEngine. Queues of
+        AsyncEventEngine are unbounded, so policies never apply.
+        """
+        if policy == PutPolicy.COALESCE and not coalesce_key:
+            raise ValueError("coalesce_key is required by COALESCE policy")
+        self._policies[type] = (policy, coalesce_key)
+
+    def get_overflow(self) -> dict:
+        """
+        Unbounded queues never delay, drop or coalesce events.
+        """
+        return {"delayed": {}, "dropped": {}, "coalesced": {}}
+
+    def get_stats(self) -> dict:
+        """
+        Get event rates, handler latency, queue depth and oldest event
+        age of every worker queue, and overflow counters.
+        """
+        stats = self._stats.to_dict()
+        now = monotonic()
+        queues = []
+        for put_times in list(self._put_times):
+            try:
+                oldest_age = now - put_times[0]
+            except IndexError:
+                oldest_age = 0.0
+            queues.append({"depth": len(put_times), "oldest_age": oldest_age})
+        stats["queues"] = queues
+        stats["overflow"] = self.get_overflow()
+        return stats
@@ -2,12 +2,18 @@
 Event-driven framework of vn.py framework.
 """
 
-from collections import defaultdict
-from queue import Empty, Queue
-from threading import Thread
-from time import sleep
+import traceback
+from collections import OrderedDict, defaultdict, deque
+from enum import Enum
+from math import ceil
+from queue import Empty
+from threading import Condition, Lock, Thread, current_thread
+from time import monotonic, perf_counter, time
 from typing import Any, Callable
 
+from .stats import EventStats
+from .timer import TimerHandle, TimerWheel
+
 EVENT_TIMER = "eTimer"
 
 
@@ -16,8 +22,13 @@ class Event:
     Event object consists of a type string which is used 
     by event engine for distributing event, and a data 
     object which contains the real data. 
+
+    Type strings are expected to be constants (literals are
+    interned), so handler lookup by type is cheap.
     """
 
+    __slots__ = ("type", "data")
+
     def __init__(self, type: str, data: Any = None):
         """"""
         self.type = type
@@ -28,68 +39,477 @@ class Event:
 HandlerType = Callable[[Event], None]
 
 
+# Defines partition function which maps an event to its dispatch key.
+PartitionType = Callable[[Event], Any]
+
+# Defines coalesce function which maps an event to the key of data it updates.
+CoalesceType = Callable[[Event], Any]
+
+
+def get_coalesce_skips(events: list, coalesce_keys: dict) -> list:
+    """
+    Find handlers which should skip each event of a batch, because
+    a newer event of the same coalesce key is found later in the batch.
+
+    Skip of an event is None if no handler should skip it.
+    """
+    latest = {}
+    event_keys = []
+    for i, event in enumerate(events):
+        handler_keys = coalesce_keys.get(event.type)
+        if not handler_keys:
+            event_keys.append(None)
+            continue
+
+        keys = []
+        for handler, coalesce_key in handler_keys.items():
+            key = (event.type, handler, coalesce_key(event))
+            latest[key] = i
+            keys.append((handler, key))
+        event_keys.append(keys)
+
+    skips = []
+    for i, keys in enumerate(event_keys):
+        skip = None
+        if keys:
+            for handler, key in keys:
+                if latest[key] != i:
+                    if skip is None:
+                        skip = []
+                    skip.append(handler)
+        skips.append(skip)
+
+    return skips
+
+
+class PutPolicy(Enum):
+    """
+    Policy applied when an event is put into a full queue.
+    """
+    BLOCK = "block"                 # wait until the queue has space
+    DROP_OLDEST = "drop_oldest"     # drop the oldest droppable event
+    COALESCE = "coalesce"           # replace pending event of the same key
+
+
+# Policy of event types without policy set.
+DEFAULT_POLICY = (PutPolicy.BLOCK, None)
+
+
+class EventQueue:
+    """
+    FIFO queue of events with optional capacity.
+
+    When the queue is full, the policy given with the incoming event
+    decides what happens: BLOCK waits for space, DROP_OLDEST sheds
+    the oldest queued event which was also put with DROP_OLDEST (or
+    the incoming one if there is none), COALESCE removes the pending
+    event of the same key and appends the new one to the tail.
+
+    Entries are kept in an ordered dict by sequence number, so dropped
+    and coalesced events are removed at once and the queue never holds
+    more entries than events.
+
+    Number of delayed, dropped and coalesced events are counted
+    by event type.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        """
+        Queue is unbounded if maxsize is 0.
+        """
+        self.maxsize = maxsize
+        self.delayed = defaultdict(int)
+        self.dropped = defaultdict(int)
+        self.coalesced = defaultdict(int)
+
+        self._entries = OrderedDict()   # {seq: (event, policy, key, put_time)}
+        self._droppable = deque()       # seq of DROP_OLDEST entries in put order
+        self._pending = {}              # {(type, key): seq} of COALESCE entries
+        self._seq = 0
+        self._mutex = Lock()
+        self._not_empty = Condition(self._mutex)
+        self._not_full = Condition(self._mutex)
+
+    def qsize(self) -> int:
+        """
+        Return number of events in queue.
+        """
+        with self._mutex:
+            return len(self._entries)
+
+    def put(
+        self,
+        event: Event,
+        policy: PutPolicy = PutPolicy.BLOCK,
+        key: Any = None,
+        block: bool = True
+    ) -> bool:
+        """
+        Put an event into queue, return False if the event is dropped.
+
+        If block is False, a full queue is overrun instead of waiting.
+        """
+        with self._not_full:
+            if self.maxsize and len(self._entries) >= self.maxsize:
+                pending_key = (event.type, key)
+                if policy == PutPolicy.COALESCE and pending_key in self._pending:
+                    del self._entries[self._pending.pop(pending_key)]
+                    self.coalesced[event.type] += 1
+                elif policy == PutPolicy.DROP_OLDEST:
+                    if not self._droppable:
+                        self.dropped[event.type] += 1
+                        return False
+                    dropped = self._entries.pop(self._droppable.popleft())[0]
+                    self.dropped[dropped.type] += 1
+                elif block:
+                    self.delayed[event.type] += 1
+                    while len(self._entries) >= self.maxsize:
+                        self._not_full.wait()
+
+            self._seq += 1
+            self._entries[self._seq] = (event, policy, key, monotonic())
+            if policy == PutPolicy.DROP_OLDEST:
+                self._droppable.append(self._seq)
+            elif policy == PutPolicy.COALESCE:
+                self._pending[(event.type, key)] = self._seq
+
+            self._not_empty.notify()
+            return True
+
+    def get(self, block: bool = True, timeout: float = None) -> Event:
+        """
+        Remove and return the first event, raise Empty if no event
+        is available in time.
+        """
+        with self._not_empty:
+            if not block:
+                if not self._entries:
+                    raise Empty
+            elif timeout is None:
+                while not self._entries:
+                    self._not_empty.wait()
+            else:
+                endtime = monotonic() + timeout
+                while not self._entries:
+                    remaining = endtime - monotonic()
+                    if remaining <= 0:
+                        raise Empty
+                    self._not_empty.wait(remaining)
+
+            seq, (event, policy, key, put_time) = self._entries.popitem(last=False)
+
+            # The first entry is also the oldest droppable one
+            if policy == PutPolicy.DROP_OLDEST:
+                self._droppable.popleft()
+            elif policy == PutPolicy.COALESCE:
+                pending_key = (event.type, key)
+                if self._pending.get(pending_key) == seq:
+                    del self._pending[pending_key]
+
+            self._not_full.notify()
+            return event
+
+    def oldest_age(self) -> float:
+        """
+        Return seconds since the oldest event in queue was put.
+        """
+        with self._mutex:
+            for event, policy, key, put_time in self._entries.values():
+                return monotonic() - put_time
+        return 0.0
+
+    def get_nowait(self) -> Event:
+        """
+        Remove and return the first event without blocking.
+        """
+        return self.get(block=False)
+
+
 class EventEngine:
     """
     Event engine distributes event object based on its type 
     to those handlers registered.
 
     It also generates timer event by every interval seconds,
-    which can be used for timing purpose.
+    which can be used for timing purpose, as long as any handler
+    is registered for EVENT_TIMER.
+
+    Callbacks can be scheduled by call_later, call_at and call_every,
+    which are kept in a hierarchical timer wheel and run by the timer
+    thread. The timer thread only wakes up when a timer is due, so
+    callbacks should be short and put events for heavy work.
+
+    With workers > 1, events are dispatched by several worker
+    threads. Each event is routed to one worker by the key
+    returned from partition_key, so events sharing a key are
+    always processed in order by the same worker, while events
+    of different keys are processed in parallel. Events without
+    a key are all routed to the first worker.
+
+    Workers drain their queue in batches of up to batch_size
+    events. A handler registered with a coalesce key receives
+    only the newest event of each key within one batch.
+
+    With maxsize > 0, each worker queue is bounded and the put
+    policy set for the event type is applied when it is full.
+    Worker threads never block on a full queue, which avoids
+    dead lock when handlers put new events.
+
+    With inline = True, no worker thread is started and put calls
+    handlers directly on the caller's thread, which makes event
+    processing synchronous and deterministic, e.g. for backtest.
+    Events put by a handler are processed before that put returns.
+    Timer callbacks still run on the timer thread, so they and the
+    events they put are handled concurrently with events put by
+    other threads. Handlers and callbacks sharing state must guard
+    it with their own lock.
+
+    With stats = True, put and processed events, handler latency and
+    handler exceptions are counted for get_stats. Counting takes a lock
+    per update, so it can be turned off where throughput matters.
     """
 
-    def __init__(self, interval: int = 1):
+    def __init__(
+        self,
+        interval: int = 1,
+        workers: int = 1,
+        partition_key: PartitionType = None,
+        batch_size: int = 100,
+        maxsize: int = 0,
+        timer_tick: float = 0.01,
+        inline: bool = False,
+        stats: bool = None
+    ):
         """
         Timer event is generated every 1 second by default, if
         interval not specified.
+
+        Timers are scheduled with precision of timer_tick seconds.
+
+        Stats are collected by default, except in inline mode, where
+        events are dispatched without queue or locking.
         """
+        if stats is None:
+            stats = not inline
+
         self._interval = interval
-        self._queue = Queue()
+        self._inline = inline
+        self._workers = max(1, workers)
+        self._partition_key = partition_key
+        self._batch_size = max(1, batch_size)
+        self._queues = [EventQueue(maxsize) for i in range(self._workers)]
+        self._queue = self._queues[0]
         self._active = False
-        self._thread = Thread(target=self._run)
+        self._threads = [
+            Thread(target=self._run, args=(queue,))
+            for queue in self._queues
+        ]
+        self._thread = self._threads[0]
         self._timer = Thread(target=self._run_timer)
-        self._handlers = defaultdict(list)
-        self._general_handlers = []
+        self._timer_tick = timer_tick
+        self._timer_origin = monotonic()
+        self._timer_cond = Condition()
+        self._timer_event = None
+        self._wheel = TimerWheel()
+        self._wake_tick = None
+        self._handlers = {}
+        self._general_handlers = ()
+        self._coalesce_keys = defaultdict(dict)
+        self._policies = {EVENT_TIMER: (PutPolicy.DROP_OLDEST, None)}
+        self._stats = EventStats() if stats else None
 
-    def _run(self):
+    def _run(self, queue: EventQueue):
         """
-        Get event from queue and then process it.
+        Get events from queue in batch and then process them.
         """
         while self._active:
             try:
-                event = self._queue.get(block=True, timeout=1)
-                self._process(event)
+                events = [queue.get(block=True, timeout=1)]
             except Empty:
-                pass
+                continue
+
+            while len(events) < self._batch_size:
+                try:
+                    events.append(queue.get_nowait())
+                except Empty:
+                    break
 
-    def _process(self, event: Event):
+            self._process_batch(events)
+
+    def _route(self, event: Event) -> EventQueue:
+        """
+        Find the worker queue which the event belongs to.
+        """
+        if self._workers == 1 or not self._partition_key:
+            return self._queue
+
+        key = self._partition_key(event)
+        if key is None:
+            return self._queue
+
+        return self._queues[hash(key) % self._workers]
+
+    def _process_batch(self, events: list):
+        """
+        Process a batch of events in the order they were put.
+
+        For handlers with coalesce key, the event is skipped if a newer
+        event of the same key is found later in the batch.
+        """
+        if not self._coalesce_keys:
+            for event in events:
+                self._process(event)
+            return
+
+        for event, skip in zip(events, get_coalesce_skips(events, self._coalesce_keys)):
+            self._process(event, skip)
+
+    def _process(self, event: Event, skip: list = None):
         """
         First ditribute event to those handlers registered listening
         to this type. 
 
         Then distrubute event to those general handlers which listens
         to all types.
+
+        Latency of every handler is recorded into statistics if
+        stats is enabled.
+
+        Handlers are kept in tuples which are replaced on register
+        and unregister, so they can be iterated without copying.
+        Without stats, handlers are called directly, so dispatch takes
+        no lock and no timing.
         """
-        if event.type in self._handlers:
-            [handler(event) for handler in self._handlers[event.type]]
+        if not self._stats:
+            for handler in self._handlers.get(event.type, ()):
+                if not skip or handler not in skip:
+                    handler(event)
+
+            for handler in self._general_handlers:
+                handler(event)
+            return
+
+        for handler in self._handlers.get(event.type, ()):
+            if not skip or handler not in skip:
+                self._call(handler, event)
 
-        if self._general_handlers:
-            [handler(event) for handler in self._general_handlers]
+        for handler in self._general_handlers:
+            self._call(handler, event)
+
+        self._stats.on_processed(event.type)
+
+    def _call(self, handler: HandlerType, event: Event):
+        """
+        Call handler and record its latency, or count the exception
+        raised by it before passing it on.
+        """
+        start = perf_counter()
+        try:
+            handler(event)
+        except Exception:
+            self._stats.on_failed(event.type, handler)
+            raise
+        self._stats.on_handled(event.type, handler, perf_counter() - start)
 
     def _run_timer(self):
         """
-        Sleep by interval second(s) and then generate a timer event.
+        Run callbacks of expired timers, then sleep until the next
+        timer expires, or until a timer is added if none is scheduled.
         """
         while self._active:
-            sleep(self._interval)
-            event = Event(EVENT_TIMER)
-            self.put(event)
+            with self._timer_cond:
+                now_tick = int((monotonic() - self._timer_origin) / self._timer_tick)
+                expired = self._wheel.advance(now_tick)
+
+                for handle in expired:
+                    if handle.interval:
+                        handle.deadline += handle.interval
+                        self._wheel.add(handle)
+
+                if not expired:
+                    self._wake_tick = self._wheel.next_tick()
+                    if self._wake_tick is None:
+                        timeout = None
+                    else:
+                        wake_time = self._timer_origin + self._wake_tick * self._timer_tick
+                        timeout = max(0, wake_time - monotonic())
+
+                    self._timer_cond.wait(timeout)
+                    self._wake_tick = None
+                    continue
+
+            for handle in expired:
+                if handle.cancelled:
+                    continue
+                try:
+                    handle.run()
+                except Exception:
+                    traceback.print_exc()
+
+    def _schedule(
+        self,
+        delay: float,
+        interval: float,
+        callback: Callable,
+        args: tuple
+    ) -> TimerHandle:
+        """
+        Add a timer into the wheel and wake up timer thread if the
+        timer expires earlier than it planned to.
+        """
+        deadline = ceil((monotonic() + delay - self._timer_origin) / self._timer_tick)
+        if interval:
+            interval = max(1, round(interval / self._timer_tick))
+
+        handle = TimerHandle(deadline, callback, args, interval)
+        handle._canceller = self._cancel_timer
+
+        with self._timer_cond:
+            self._wheel.add(handle)
+            if self._wake_tick is None or handle.deadline < self._wake_tick:
+                self._timer_cond.notify()
+
+        return handle
+
+    def _cancel_timer(self, handle: TimerHandle):
+        """
+        Remove a cancelled timer from the wheel.
+        """
+        with self._timer_cond:
+            self._wheel.remove(handle)
+
+    def call_later(self, delay: float, callback: Callable, *args) -> TimerHandle:
+        """
+        Call callback(*args) after delay seconds.
+        """
+        return self._schedule(delay, 0, callback, args)
+
+    def call_at(self, when: float, callback: Callable, *args) -> TimerHandle:
+        """
+        Call callback(*args) at timestamp when.
+        """
+        return self._schedule(when - time(), 0, callback, args)
+
+    def call_every(self, interval: float, callback: Callable, *args) -> TimerHandle:
+        """
+        Call callback(*args) every interval seconds, until cancelled.
+        """
+        return self._schedule(interval, interval, callback, args)
+
+    def _put_timer_event(self):
+        """
+        Generate a timer event.
+        """
+        self.put(Event(EVENT_TIMER))
 
     def start(self):
         """
         Start event engine to process events and generate timer events.
         """
         self._active = True
-        self._thread.start()
+        if not self._inline:
+            for thread in self._threads:
+                thread.start()
         self._timer.start()
 
     def stop(self):
@@ -97,35 +517,122 @@ class EventEngine:
         Stop event engine.
         """
         self._active = False
+        with self._timer_cond:
+            self._timer_cond.notify()
         self._timer.join()
-        self._thread.join()
+        if not self._inline:
+            for thread in self._threads:
+                thread.join()
 
     def put(self, event: Event):
         """
-        Put an event object into event queue.
+        Put an event object into event queue, or process it at once
+        in inline mode.
         """
-        self._queue.put(event)
+        if self._inline:
+            if self._stats:
+                self._stats.on_put(event.type)
+            self._process(event)
+            return
 
-    def register(self, type: str, handler: HandlerType):
+        policy, coalesce_key = self._policies.get(event.type, DEFAULT_POLICY)
+        key = coalesce_key(event) if coalesce_key else None
+        block = current_thread() not in self._threads
+        self._route(event).put(event, policy, key, block)
+        if self._stats:
+            self._stats.on_put(event.type)
+
+    def set_policy(
+        self,
+        type: str,
+        policy: PutPolicy,
+        coalesce_key: CoalesceType = None
+    ):
+        """
+        Set the policy applied when event of a specific type is put
+        into a full queue. COALESCE policy requires coalesce_key.
+        """
+        if policy == PutPolicy.COALESCE and not coalesce_key:
+            raise ValueError("coalesce_key is required by COALESCE policy")
+        self._policies[type] = (policy, coalesce_key)
+
+    def get_overflow(self) -> dict:
+        """
+        Get number of delayed, dropped and coalesced events by type.
+        """
+        overflow = {"delayed": defaultdict(int),
+                    "dropped": defaultdict(int),
+                    "coalesced": defaultdict(int)}
+
+        for queue in self._queues:
+            for name, counter in (("delayed", queue.delayed),
+                                  ("dropped", queue.dropped),
+                                  ("coalesced", queue.coalesced)):
+                for type, count in list(counter.items()):
+                    overflow[name][type] += count
+
+        return {name: dict(counter) for name, counter in overflow.items()}
+
+    def get_stats(self) -> dict:
+        """
+        Get event rates, handler latency, queue depth and oldest event
+        age of every worker queue, and overflow counters.
+
+        Event rates and handler latency are empty if stats is disabled.
+        """
+        if self._stats:
+            stats = self._stats.to_dict()
+        else:
+            stats = {"uptime": 0.0, "types": {}, "handlers": []}
+        stats["queues"] = [
+            {"depth": queue.qsize(), "oldest_age": queue.oldest_age()}
+            for queue in self._queues
+        ]
+        stats["overflow"] = self.get_overflow()
+        return stats
+
+    def register(
+        self,
+        type: str,
+        handler: HandlerType,
+        coalesce_key: CoalesceType = None
+    ):
         """
         Register a new handler function for a specific event type. Every 
         function can only be registered once for each event type.
+
+        If coalesce_key is given, events superseded by a newer pending
+        event with the same key are not delivered to the handler.
         """
-        handler_list = self._handlers[type]
-        if handler not in handler_list:
-            handler_list.append(handler)
+        handlers = self._handlers.get(type, ())
+        if handler not in handlers:
+            self._handlers[type] = handlers + (handler,)
+
+        if coalesce_key:
+            self._coalesce_keys[type][handler] = coalesce_key
+
+        if type == EVENT_TIMER and not self._timer_event:
+            self._timer_event = self.call_every(self._interval, self._put_timer_event)
 
     def unregister(self, type: str, handler: HandlerType):
         """
         Unregister an existing handler function from event engine.
         """
-        handler_list = self._handlers[type]
+        handlers = tuple(h for h in self._handlers.get(type, ()) if h != handler)
+
+        if handlers:
+            self._handlers[type] = handlers
+        else:
+            self._handlers.pop(type, None)
 
-        if handler in handler_list:
-            handler_list.remove(handler)
+        if type in self._coalesce_keys:
+            self._coalesce_keys[type].pop(handler, None)
+            if not self._coalesce_keys[type]:
+                self._coalesce_keys.pop(type)
 
-        if not handler_list:
-            self._handlers.pop(type)
+        if type == EVENT_TIMER and type not in self._handlers and self._timer_event:
+            self._timer_event.cancel()
+            self._timer_event = None
 
     def register_general(self, handler: HandlerType):
         """
@@ -133,11 +640,12 @@ class EventEngine:
         function can only be registered once for each event type.
         """
         if handler not in self._general_handlers:
-            self._general_handlers.append(handler)
+            self._general_handlers += (handler,)
 
     def unregister_general(self, handler: HandlerType):
         """
         Unregister an existing general handler function.
         """
-        if handler in self._general_handlers:
-            self._general_handlers.remove(handler)
+        self._general_handlers = tuple(
+            h for h in self._general_handlers if h != handler
+        )
@@ -0,0 +1,182 @@
+"""
+Runtime statistics of event engine.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+from time import monotonic
+from typing import Callable
+
+# Upper bounds of latency histogram buckets in seconds.
+LATENCY_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, float("inf")
+)
+
+
+def get_handler_name(handler: Callable) -> str:
+    """
+    Get readable name of handler, like AccountEngine.process_order_update.
+    """
+    owner = getattr(handler, "__self__", None)
+    if owner is not None:
+        return f"{owner.__class__.__name__}.{handler.__name__}"
+    return getattr(handler, "__qualname__", repr(handler))
+
+
+class LatencyHistogram:
+    """
+    Histogram of handler latency with fixed buckets.
+    """
+
+    def __init__(self):
+        """"""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, latency: float):
+        """
+        Add one latency sample in seconds.
+        """
+        self.count += 1
+        self.total += latency
+        if latency > self.max:
+            self.max = latency
+        self.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def to_dict(self) -> dict:
+        """
+        Export histogram with cumulative bucket counts.
+        """
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": buckets
+        }
+
+
+class EventStats:
+    """
+    Counters of event put/processed by type and latency histograms
+    of handlers by type, which are updated by event engine.
+    """
+
+    def __init__(self):
+        """"""
+        self.start_time = monotonic()
+        self.put_count = defaultdict(int)
+        self.processed_count = defaultdict(int)
+        self.latency = defaultdict(LatencyHistogram)
+        self.failed_count = defaultdict(int)
+
+        self._names = {}
+        self._mutex = Lock()
+
+    def on_put(self, type: str):
+        """
+        Count an event put into queue.
+        """
+        with self._mutex:
+            self.put_count[type] += 1
+
+    def on_processed(self, type: str):
+        """
+        Count an event processed by handlers.
+        """
+        with self._mutex:
+            self.processed_count[type] += 1
+
+    def get_name(self, handler: Callable) -> str:
+        """
+        Get cached readable name of handler.
+        """
+        name = self._names.get(handler)
+        if name is None:
+            name = self._names[handler] = get_handler_name(handler)
+        return name
+
+    def on_handled(self, type: str, handler: Callable, latency: float):
+        """
+        Record latency of a handler processing an event.
+        """
+        name = self.get_name(handler)
+
+        with self._mutex:
+            self.latency[(type, name)].add(latency)
+
+    def on_failed(self, type: str, handler: Callable):
+        """
+        Count an exception raised by a handler processing an event.
+        """
+        name = self.get_name(handler)
+
+        with self._mutex:
+            self.failed_count[(type, name)] += 1
+
+    def to_dict(self) -> dict:
+        """
+        Export all statistics as dict.
+        """
+        with self._mutex:
+            uptime = monotonic() - self.start_time
+            types = {}
+            for type in set(self.put_count) | set(self.processed_count):
+                put = self.put_count[type]
+                processed = self.processed_count[type]
+                types[type] = {
+                    "put": put,
+                    "processed": processed,
+                    "put_rate": put / uptime if uptime else 0.0,
+                    "processed_rate": processed / uptime if uptime else 0.0
+                }
+
+            # Handlers which only failed have no latency recorded
+            keys = list(self.latency)
+            keys += [key for key in self.failed_count if key not in self.latency]
+            handlers = [
+                dict(type=type, handler=name, failed=self.failed_count.get((type, name), 0),
+                     **self.latency.get((type, name), LatencyHistogram()).to_dict())
+                for type, name in keys
+            ]
+
+        return {"uptime": uptime, "types": types, "handlers": handlers}
+
+
+def stats_to_prometheus(stats: dict) -> str:
+    """
+    Format dict returned by event engine get_stats in prometheus text format.
+    """
+    lines = []
+
+    for i, queue in enumerate(stats["queues"]):
+        lines.append(f'pt_event_queue_depth{{worker="{i}"}} {queue["depth"]}')
+        lines.append(f'pt_event_oldest_age_seconds{{worker="{i}"}} {queue["oldest_age"]}')
+
+    for type, data in stats["types"].items():
+        lines.append(f'pt_event_put_total{{type="{type}"}} {data["put"]}')
+        lines.append(f'pt_event_processed_total{{type="{type}"}} {data["processed"]}')
+
+    for name, counter in stats["overflow"].items():
+        for type, count in counter.items():
+            lines.append(f'pt_event_{name}_total{{type="{type}"}} {count}')
+
+    for data in stats["handlers"]:
+        labels = f'type="{data["type"]}",handler="{data["handler"]}"'
+        for bound, count in data["buckets"].items():
+            le = "+Inf" if bound == "inf" else bound
+            lines.append(f'pt_event_handler_seconds_bucket{{{labels},le="{le}"}} {count}')
+        lines.append(f'pt_event_handler_seconds_sum{{{labels}}} {data["total"]}')
+        lines.append(f'pt_event_handler_seconds_count{{{labels}}} {data["count"]}')
+        lines.append(f'pt_event_handler_failed_total{{{labels}}} {data["failed"]}')
+
+    return "\n".join(lines) + "\n"
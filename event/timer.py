@@ -0,0 +1,222 @@
+"""
+Hierarchical timer wheel used by event engine for scheduling.
+"""
+
+from typing import Callable
+
+# Each level of wheel has 2 ** WHEEL_BITS slots.
+WHEEL_BITS = 6
+WHEEL_SIZE = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SIZE - 1
+WHEEL_LEVELS = 4
+
+
+class TimerHandle:
+    """
+    Handle of a scheduled callback, which can be cancelled.
+    """
+
+    def __init__(
+        self,
+        deadline: int,
+        callback: Callable,
+        args: tuple,
+        interval: int = 0
+    ):
+        """
+        Deadline and interval are counted in ticks.
+        """
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+
+        self._canceller = None
+        self._slot = None
+        self._level = None
+
+    def cancel(self):
+        """
+        Cancel the callback. Repeating callback stops repeating.
+        """
+        if not self.cancelled:
+            self.cancelled = True
+            if self._canceller:
+                self._canceller(self)
+
+    def run(self):
+        """"""
+        self.callback(*self.args)
+
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel which keeps timers in slots of several
+    levels. Level n slot covers 64 ** n ticks, timers are moved down
+    to lower levels (cascade) when their time gets close, so adding,
+    cancelling and expiring a timer are all O(1).
+
+    Timers further than all levels can cover are kept in an overflow
+    set and re-added when the highest level wraps.
+
+    Not thread safe, the owner should guard it with lock.
+    """
+
+    def __init__(self, current: int = 0):
+        """"""
+        self.current = current
+        self.count = 0
+
+        self._levels = [
+            [set() for i in range(WHEEL_SIZE)]
+            for level in range(WHEEL_LEVELS)
+        ]
+        self._level_counts = [0] * WHEEL_LEVELS
+        self._overflow = set()
+
+    def add(self, handle: TimerHandle):
+        """
+        Add timer into slot by its distance to current tick. Timers
+        already due are fired at next tick.
+        """
+        if handle.deadline <= self.current:
+            handle.deadline = self.current + 1
+
+        self._place(handle)
+
+    def _place(self, handle: TimerHandle):
+        """
+        Put timer into the slot which will expire or cascade it in time.
+        """
+        delta = handle.deadline - self.current
+        for level in range(WHEEL_LEVELS):
+            if delta < (1 << (WHEEL_BITS * (level + 1))):
+                index = (handle.deadline >> (WHEEL_BITS * level)) & WHEEL_MASK
+                slot = self._levels[level][index]
+                self._level_counts[level] += 1
+                break
+        else:
+            level = None
+            slot = self._overflow
+
+        slot.add(handle)
+        handle._slot = slot
+        handle._level = level
+        self.count += 1
+
+    def remove(self, handle: TimerHandle):
+        """
+        Remove timer from the wheel.
+        """
+        slot = handle._slot
+        if slot is None or handle not in slot:
+            return
+
+        slot.remove(handle)
+        if handle._level is not None:
+            self._level_counts[handle._level] -= 1
+        handle._slot = None
+        self.count -= 1
+
+    def _pop_slot(self, level: int, index: int) -> set:
+        """
+        Take all timers out of a slot.
+        """
+        slot = self._levels[level][index]
+        if not slot:
+            return slot
+
+        self._levels[level][index] = set()
+        self._level_counts[level] -= len(slot)
+        self.count -= len(slot)
+        for handle in slot:
+            handle._slot = None
+        return slot
+
+    def _step(self) -> set:
+        """
+        Move forward one tick, cascade higher levels when lower levels
+        wrap, and return timers expired at the new tick.
+        """
+        self.current += 1
+        current = self.current
+
+        for level in range(1, WHEEL_LEVELS + 1):
+            if current & ((1 << (WHEEL_BITS * level)) - 1):
+                break
+
+            if level == WHEEL_LEVELS:
+                handles = self._overflow
+                self.count -= len(handles)
+                self._overflow = set()
+                for handle in handles:
+                    handle._slot = None
+            else:
+                index = (current >> (WHEEL_BITS * level)) & WHEEL_MASK
+                handles = self._pop_slot(level, index)
+
+            for handle in handles:
+                self._place(handle)
+
+        return self._pop_slot(0, current & WHEEL_MASK)
+
+    def advance(self, target: int) -> list:
+        """
+        Move forward to target tick and return expired timers in order.
+
+        Ticks in which nothing can expire or cascade are skipped.
+        """
+        expired = []
+
+        while self.current < target:
+            # Find how many lower levels are empty, nothing happens
+            # until the next boundary of the first non-empty level.
+            span = 1
+            for level in range(WHEEL_LEVELS):
+                if self._level_counts[level]:
+                    break
+                span <<= WHEEL_BITS
+            else:
+                if not self._overflow:
+                    self.current = target
+                    break
+
+            if span > 1:
+                boundary = (self.current // span + 1) * span
+                if boundary > target:
+                    self.current = target
+                    break
+                self.current = boundary - 1
+
+            handles = self._step()
+            if handles:
+                expired.extend(sorted(handles, key=lambda handle: handle.deadline))
+
+        return expired
+
+    def next_tick(self):
+        """
+        Return the next tick at which a timer expires or cascades, or
+        None if the wheel is empty.
+        """
+        if not self.count:
+            return None
+
+        ticks = []
+        for level in range(WHEEL_LEVELS):
+            if not self._level_counts[level]:
+                continue
+
+            shift = WHEEL_BITS * level
+            block = self.current >> shift
+            for k in range(1, WHEEL_SIZE + 1):
+                if self._levels[level][(block + k) & WHEEL_MASK]:
+                    ticks.append((block + k) << shift)
+                    break
+
+        if self._overflow:
+            span = 1 << (WHEEL_BITS * WHEEL_LEVELS)
+            ticks.append((self.current // span + 1) * span)
+
+        return min(ticks)
@@ -0,0 +1,111 @@
+
+"""
+索引性能测试
+在测试账户中写入指定数量的订单，分别测试创建索引前后订单状态更新及当日订单查询的耗时。
+python -m paper_trading.example.index_benchmark [数据库地址] [数据库端口] [订单数量] [测试次数]
+"""
+
+import sys
+import random
+from time import perf_counter
+
+from paper_trading.api.db import MongoDBService
+from paper_trading.utility.setting import get_token
+from paper_trading.trade.db_model import (
+    on_orders_insert_many,
+    on_order_status_update,
+    on_account_index_creat,
+    on_account_delete,
+    query_orders_today
+)
+
+
+def make_orders(token: str, count: int):
+    """生成测试订单"""
+    orders = []
+    for i in range(count):
+        orders.append({
+            'code': "000001",
+            'exchange': "SZ",
+            'account_id': token,
+            'order_id': str(i),
+            'order_type': "buy",
+            'price_type': "限价",
+            'trade_type': "t1",
+            'order_price': 10.0,
+            'trade_price': 0.0,
+            'volume': 100,
+            'traded': 0,
+            'status': "未成交",
+            'order_date': "20200101",
+            'order_time': "09:30:00",
+            'error_msg': "",
+            'pt_symbol': "000001.SZ"
+        })
+    return orders
+
+
+def measure(func, times: int):
+    """执行多次并统计耗时（毫秒）"""
+    costs = []
+    for i in range(times):
+        start = perf_counter()
+        func()
+        costs.append((perf_counter() - start) * 1000)
+
+    costs.sort()
+    return {
+        "mean": sum(costs) / len(costs),
+        "p50": costs[len(costs) // 2],
+        "p99": costs[min(len(costs) - 1, int(len(costs) * 0.99))]
+    }
+
+
+def run(db, token: str, order_count: int, times: int):
+    """测试订单更新与查询耗时"""
+    def update():
+        on_order_status_update({
+            'token': token,
+            'id': str(random.randrange(order_count)),
+            'status': "已撤销",
+            'msg': ""
+        }, db)
+
+    def query():
+        query_orders_today(token, db)
+
+    return {
+        "update": measure(update, times),
+        "query_today": measure(query, max(1, times // 10))
+    }
+
+
+def main():
+    host = sys.argv[1] if len(sys.argv) > 1 else "localhost"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 27017
+    order_count = int(sys.argv[3]) if len(sys.argv) > 3 else 50000
+    times = int(sys.argv[4]) if len(sys.argv) > 4 else 1000
+
+    db = MongoDBService(host, port)
+    db.connect_db()
+    token = get_token()
+
+    try:
+        on_orders_insert_many(token, make_orders(token, order_count), db)
+
+        before = run(db, token, order_count, times)
+        on_account_index_creat(token, db)
+        after = run(db, token, order_count, times)
+
+        print(f"订单数量：{order_count}，测试次数：{times}，耗时单位：毫秒")
+        for name in before:
+            for key in ("mean", "p50", "p99"):
+                print(f"{name:<12}{key:<6}无索引：{before[name][key]:>10.3f}    "
+                      f"有索引：{after[name][key]:>10.3f}")
+    finally:
+        on_account_delete(token, db)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
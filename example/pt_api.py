@@ -133,6 +133,34 @@ class PaperTrading():
 
         return r
 
+    @url_request
+    def creat_many(self, infos: list):
+        """
+        批量创建模拟交易账户
+        :param infos:账户信息列表
+        :return:(status, data)  正确时数据类型(bool, list) 错误时数据类型(bool, str)
+        """
+        url = self.get_url("creat")
+        if not isinstance(infos, list):
+            raise ValueError("账户信息格式错误")
+
+        data = {'info': json.dumps(infos)}
+        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+
+        return r
+
+    @url_request
+    def delete_many(self, tokens: list):
+        """
+        批量删除模拟交易账户
+        :param tokens:账户token列表
+        :return:(status, data)  正确时数据类型(bool, list) 错误时数据类型(bool, str)
+        """
+        url = self.get_url("delete")
+        data = {'tokens': json.dumps(tokens)}
+        r = requests.post(url, data, timeout=MARKET_TIMEOUT)
+        return r
+
     @url_request
     def delete(self):
         """
@@ -187,6 +215,31 @@ class PaperTrading():
         r = requests.post(url, data, timeout=MARKET_TIMEOUT)
         return r
 
+    def iter_orders(self, start: str = None, end: str = None):
+        """
+        逐条读取交割单信息，服务端逐行输出，历史订单较多时不需要一次性读取全部数据
+        :param start:数据开始日期，为空时读取全部订单
+        :param end:数据结束日期
+        :return:订单字典的生成器，请求失败时抛出ValueError
+        """
+        url = self.get_url("orders")
+        data = {'token': self.__token, 'format': "ndjson"}
+        if start and end:
+            data['start_date'] = start
+            data['end_date'] = end
+
+        with requests.post(url, data, timeout=MARKET_TIMEOUT, stream=True) as r:
+            if r.status_code != requests.codes.ok:
+                raise ValueError("请求状态不正确")
+
+            # 查询失败时服务端返回json格式的错误信息
+            if "ndjson" not in r.headers.get("Content-Type", ""):
+                raise ValueError(json.loads(r.text)["data"])
+
+            for line in r.iter_lines(decode_unicode=True):
+                if line:
+                    yield json.loads(line)
+
     @url_request
     def orders_today(self):
         """
@@ -353,34 +406,33 @@ class PaperTrading():
         :param save_data:
         :return:
         """
-        status, trade_record = self.orders()
-        if status:
-            if isinstance(trade_record, list):
-                trade_df = pd.DataFrame(trade_record)
-                trade_df = trade_df[trade_df['status'] == "全部成交"]
-                trade_df['commission'] = 0.
-
-                # 计算commission
-                for i, row in trade_df.iterrows():
-                    commission = 0.
-                    if row['order_type'] == "buy":
-                        commission = row['traded'] * row['trade_price'] * self.__cost
-                    elif row['order_type'] == "sell":
-                        commission = row['traded'] * row['trade_price'] * (self.__cost + self.__tax)
-                    else:
-                        pass
-
-                    trade_df.loc[i, 'commission'] = commission
-
-                trade_df = trade_df[['order_date', 'order_time', 'pt_symbol', 'order_type', 'price_type', 'order_price', 'trade_price', 'volume', 'traded', 'status', 'commission', 'status', 'trade_type','account_id', 'error_msg']]
-                if save_data:
-                    self.downloader(trade_df, start, end, "orders.xls")
-
-                return trade_df
-            else:
-                raise ValueError(trade_record)
+        status, msg = self.connect()
+        if not status:
+            raise ValueError(msg)
+
+        # 逐条读取订单，只保留全部成交的订单，并计算commission
+        trade_record = list()
+        for order in self.iter_orders():
+            if order['status'] != "全部成交":
+                continue
+
+            commission = 0.
+            if order['order_type'] == "buy":
+                commission = order['traded'] * order['trade_price'] * self.__cost
+            elif order['order_type'] == "sell":
+                commission = order['traded'] * order['trade_price'] * (self.__cost + self.__tax)
+            order['commission'] = commission
+            trade_record.append(order)
+
+        if trade_record:
+            trade_df = pd.DataFrame(trade_record)
+            trade_df = trade_df[['order_date', 'order_time', 'pt_symbol', 'order_type', 'price_type', 'order_price', 'trade_price', 'volume', 'traded', 'status', 'commission', 'status', 'trade_type','account_id', 'error_msg']]
+            if save_data:
+                self.downloader(trade_df, start, end, "orders.xls")
+
+            return trade_df
         else:
-            raise ValueError(trade_record)
+            raise ValueError("无成交记录")
 
     def data_statistics(self, assets_df, pos_df, trade_df, save_data=False):
         """交易结果分析"""
@@ -3,6 +3,8 @@ import sys
 
 from paper_trading.config import config
 from paper_trading.app import creat_app
+from paper_trading.api.db import MongoDBService
+from paper_trading.trade.db_model import on_index_backfill
 from paper_trading.trade.pt_engine import MainEngine
 from paper_trading.utility.constant import ConfigType, PersistanceMode, LoadDataMode
 from paper_trading.trade.market import (
@@ -11,6 +13,15 @@ from paper_trading.trade.market import (
 )
 
 
+def index_backfill(config_name):
+    """为已存在的账户补建数据库索引"""
+    db = MongoDBService(config[config_name].MONGO_HOST, config[config_name].MONGO_PORT)
+    db.connect_db()
+    count = on_index_backfill(db)
+    db.close()
+    print(f"索引创建完成，共计账户：{count}个")
+
+
 def main():
     # 系统参数
     param = dict()
@@ -24,19 +35,32 @@ def main():
     # 模拟交易flask配置参数
     config_name = ConfigType.DEFAULT.value
 
+    # 补建索引：python run.py index [test|dev]
+    if len(sys.argv) > 1 and sys.argv[1] == "index":
+        if len(sys.argv) > 2 and sys.argv[2] == "test":
+            config_name = ConfigType.TESTING.value
+        elif len(sys.argv) > 2 and sys.argv[2] == "dev":
+            config_name = ConfigType.DEVELOPMENT.value
+        index_backfill(config_name)
+        return
+
     # 获取命令行输入的参数，判断启动何种模式的引擎
     if len(sys.argv) > 1:
         if sys.argv[1] == "test":
             market = BacktestMarket
             param['PERSISTENCE_MODE'] = PersistanceMode.MANUAL
             param['LOAD_DATA_MODE'] = LoadDataMode.BACKTEST
+            param['EVENT_INLINE'] = True
             config_name = ConfigType.TESTING.value
         elif sys.argv[1] == "dev":
             market = BacktestMarket
             param['PERSISTENCE_MODE'] = PersistanceMode.MANUAL
             param['LOAD_DATA_MODE'] = LoadDataMode.BACKTEST
+            param['EVENT_INLINE'] = True
             config_name = ConfigType.DEVELOPMENT.value
 
+    param['DB_BACKEND'] = config[config_name].DB_BACKEND
+    param['SQLITE_PATH'] = config[config_name].SQLITE_PATH
     param['MONGO_HOST'] = config[config_name].MONGO_HOST
     param['MONGO_PORT'] = config[config_name].MONGO_PORT
 
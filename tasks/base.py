@@ -1,5 +1,7 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 
+from paper_trading.utility.setting import SETTINGS
+
 
 def init_tasks(app, engine):
     scheduler = BackgroundScheduler()
@@ -10,4 +12,13 @@ def init_tasks(app, engine):
         hour=9,
         minute=30
     )
+    # 收盘后归档历史数据
+    if SETTINGS.get('ARCHIVE_PATH') and SETTINGS.get('ARCHIVE_DAYS', 0) > 0:
+        scheduler.add_job(
+            engine.archive,
+            "cron",
+            day_of_week="mon-fri",
+            hour=16,
+            minute=0
+        )
     scheduler.start()
@@ -0,0 +1,56 @@
+import os
+import sys
+import importlib.util
+
+import pytest
+
+# 仓库目录即paper_trading包，未安装时按包名加载
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "paper_trading" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("paper_trading",
+                                                  os.path.join(ROOT, "__init__.py"),
+                                                  submodule_search_locations=[ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["paper_trading"] = module
+    spec.loader.exec_module(module)
+
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.api.memory_db import MemoryDBService
+from paper_trading.api.sqlite_db import SQLiteDBService
+
+
+@pytest.fixture(autouse=True)
+def settings():
+    """测试中修改的配置在测试结束后还原"""
+    saved = dict(SETTINGS)
+    yield SETTINGS
+    SETTINGS.clear()
+    SETTINGS.update(saved)
+
+
+@pytest.fixture
+def memory_db():
+    db = MemoryDBService()
+    db.connect_db()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    db = SQLiteDBService(str(tmp_path / "pt.db"))
+    db.connect_db()
+    yield db
+    db.close()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def db(request, tmp_path):
+    """分别使用内存及SQLite存储后端"""
+    if request.param == "memory":
+        db = MemoryDBService()
+    else:
+        db = SQLiteDBService(str(tmp_path / "pt.db"))
+    db.connect_db()
+    yield db
+    db.close()
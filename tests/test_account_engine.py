@@ -0,0 +1,221 @@
+from time import sleep
+from datetime import datetime
+from threading import Barrier
+
+import pytest
+
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.model import Order
+from paper_trading.utility.constant import Status, OrderType, LoadDataMode
+from paper_trading.event import EventEngine
+from paper_trading.api.memory_db import MemoryDBService
+from paper_trading.utility.event import EVENT_PERSISTANCE_FLUSH
+from paper_trading.trade.db_model import (
+    on_account_add,
+    on_orders_insert,
+    query_account_one,
+    query_orders
+)
+
+pytest.importorskip("pandas")
+
+
+def test_inline_flush_timer_runs_alongside_trades(memory_db):
+    """同步模式下定时持久化在定时器线程中执行，与撮合线程的交易同时进行时数据一致"""
+    from paper_trading.trade.account_engine import AccountEngine
+
+    SETTINGS['P_TIMING'] = 0.01
+    event_engine = EventEngine(inline=True)
+    engine = AccountEngine(event_engine, False, LoadDataMode.TRADING, memory_db, write_behind=True)
+    token = on_account_add({}, memory_db)['account_id']
+    engine.login(token)
+    flushed = []
+    event_engine.register(EVENT_PERSISTANCE_FLUSH, lambda event: flushed.append(1))
+
+    event_engine.start()
+    engine.start()
+    try:
+        for i in range(300):
+            order = Order(code="000001", exchange="SZ", account_id=token,
+                          order_type=OrderType.BUY.value, volume=100, order_price=1.0,
+                          order_date="20190101", status=Status.SUBMITTING.value)
+            status, order = engine.orders_arrived(order)
+            if i % 2:
+                order.status = Status.CANCELLED.value
+                engine.orders_cancel(order)
+            if i % 50 == 0:
+                sleep(0.02)
+    finally:
+        engine.close()
+        event_engine.stop()
+
+    assert flushed
+    trader = engine.trader_dict[token]
+    assert query_account_one(token, memory_db)['available'] == trader.account.available
+    orders = {d['order_id']: d['status'] for d in query_orders(token=token, db=memory_db)}
+    assert orders == {k: v.status for k, v in trader.orders.items()}
+
+
+class QuoteClient():
+    """行情源：记录每次请求的证券，batch_error为True时批量请求失败，failed中的证券获取失败"""
+
+    def __init__(self, prices: dict, batch_error: bool = False, failed=()):
+        self.prices = prices
+        self.batch_error = batch_error
+        self.failed = set(failed)
+        self.requests = []
+
+    def get_realtime_quotes(self, symbols: list):
+        self.requests.append(list(symbols))
+        if len(symbols) > 1 and self.batch_error:
+            raise ValueError("股票数据获取失败")
+        if self.failed & set(symbols):
+            raise ValueError("股票数据获取失败")
+        return {s: {'price': str(self.prices[s])} for s in symbols if s in self.prices}
+
+
+@pytest.fixture
+def account_engine(memory_db):
+    from paper_trading.trade.account_engine import AccountEngine
+    return AccountEngine(EventEngine(), False, LoadDataMode.TRADING, memory_db)
+
+
+def test_close_prices_are_fetched_in_one_batch(account_engine):
+    client = QuoteClient({"000001.SZ": 10.5, "600000.SH": 8.0})
+    prices = account_engine.get_close_prices(client, ["000001.SZ", "600000.SH", "000001.SZ"])
+    assert prices == {"000001.SZ": 10.5, "600000.SH": 8.0}
+    assert client.requests == [["000001.SZ", "600000.SH"]]
+
+
+def test_close_prices_fall_back_to_single_requests(account_engine):
+    """批量获取失败时逐个获取，仍失败的证券不在结果中"""
+    client = QuoteClient({"000001.SZ": 10.5, "600000.SH": 8.0, "000002.SZ": 20.0},
+                         batch_error=True, failed=["600000.SH"])
+    prices = account_engine.get_close_prices(client, ["000001.SZ", "600000.SH", "000002.SZ"])
+    assert prices == {"000001.SZ": 10.5, "000002.SZ": 20.0}
+    assert client.requests[1:] == [["000001.SZ"], ["600000.SH"], ["000002.SZ"]]
+    assert account_engine.get_close_prices(client, []) == {}
+
+
+@pytest.mark.skipif(not hasattr(__import__("pandas").DataFrame, "append"),
+                    reason="清算使用DataFrame.append，需要requirements.txt中的pandas版本")
+def test_liquidation_keeps_last_price_without_quote(account_engine, memory_db):
+    from paper_trading.utility.model import Position
+
+    token = on_account_add({}, memory_db)['account_id']
+    account_engine.login(token)
+    trader = account_engine.trader_dict[token]
+    for code, price in (("000001", 10.0), ("000002", 20.0)):
+        trader.pos[f"{code}.SZ"] = Position(code=code, exchange="SZ", account_id=token, volume=100,
+                                            available=100, buy_price=price, now_price=price)
+
+    account_engine.liquidation(QuoteClient({"000001.SZ": 11.0}, batch_error=True))
+    assert trader.pos["000001.SZ"].now_price == 11.0
+    assert trader.pos["000002.SZ"].now_price == 20.0
+    assert len(trader.account_record) == 1
+
+
+class CountingDB(MemoryDBService):
+    """记录批量写入操作数量的内存数据服务"""
+
+    def __init__(self):
+        super().__init__()
+        self.bulk_ops = []
+
+    def on_bulk_write(self, pt_db):
+        self.bulk_ops.extend((pt_db.db_name, op[1]) for op in pt_db.raw_data['data'])
+        return super().on_bulk_write(pt_db)
+
+
+def test_data_persistance_writes_only_changed_data():
+    """手动持久化只写入上次持久化后变更过的数据"""
+    from paper_trading.trade.account_engine import AccountEngine
+
+    db = CountingDB()
+    db.connect_db()
+    engine = AccountEngine(EventEngine(), False, LoadDataMode.TRADING, db)
+    token = on_account_add({}, db)['account_id']
+    engine.login(token)
+
+    orders = []
+    for i in range(5):
+        order = Order(code="000001", exchange="SZ", account_id=token,
+                      order_type=OrderType.BUY.value, volume=100, order_price=1.0,
+                      order_date="20190101", status=Status.SUBMITTING.value)
+        orders.append(engine.orders_arrived(order)[1])
+
+    assert engine.data_persistance(token) is True
+    assert len(db.bulk_ops) == 6
+    assert len(query_orders(token=token, db=db)) == 5
+
+    # 没有变更时不写入
+    db.bulk_ops.clear()
+    engine.data_persistance(token)
+    assert db.bulk_ops == []
+
+    # 只写入撤销的订单及账户
+    orders[2].status = Status.CANCELLED.value
+    engine.orders_cancel(orders[2])
+    engine.data_persistance(token)
+    assert sorted(op[1].get('order_id', "") for op in db.bulk_ops) == ["", orders[2].order_id]
+    assert query_account_one(token, db)['available'] == engine.trader_dict[token].account.available
+
+    assert engine.data_persistance("unknown") == "账户未登录"
+
+
+def test_load_traders_runs_in_parallel(account_engine):
+    """账户在线程池中并行加载"""
+    SETTINGS['LOAD_WORKERS'] = 4
+    barrier = Barrier(4, timeout=5)
+
+    def loader(account_id):
+        barrier.wait()
+        return account_id * 2
+
+    assert account_engine.load_traders([1, 2, 3, 4], loader) == {1: 2, 2: 4, 3: 6, 4: 8}
+
+
+def test_load_traders_skips_failed_accounts(account_engine):
+    SETTINGS['LOAD_WORKERS'] = 2
+    SETTINGS['LOAD_FAIL_FAST'] = False
+
+    def loader(account_id):
+        if account_id % 3 == 0:
+            raise ValueError("账户数据错误")
+        return account_id
+
+    results = account_engine.load_traders(list(range(1, 11)), loader)
+    assert sorted(results) == [1, 2, 4, 5, 7, 8, 10]
+
+
+def test_load_traders_fail_fast(account_engine):
+    SETTINGS['LOAD_WORKERS'] = 1
+    SETTINGS['LOAD_FAIL_FAST'] = True
+    loaded = []
+
+    def loader(account_id):
+        if account_id == 1:
+            raise ValueError("账户数据错误")
+        sleep(0.05)
+        loaded.append(account_id)
+
+    with pytest.raises(ValueError):
+        account_engine.load_traders(list(range(10)), loader)
+    # 失败后尚未开始的加载被取消
+    assert len(loaded) < 9
+
+
+def test_load_data_restores_accounts_with_today_orders(account_engine, memory_db):
+    SETTINGS['LOAD_WORKERS'] = 4
+    today = datetime.now().strftime("%Y%m%d")
+    tokens = [on_account_add({}, memory_db)['account_id'] for _ in range(20)]
+
+    for i, token in enumerate(tokens[:10]):
+        status = Status.NOTTRADED.value if i % 2 else Status.ALLTRADED.value
+        on_orders_insert(Order(code="000001", exchange="SZ", account_id=token,
+                               order_id=f"{i}.0", order_date=today, status=status),
+                         memory_db)
+
+    orders_book = account_engine.load_data()
+    assert set(account_engine.trader_dict) == set(tokens[:10])
+    assert sorted(orders_book) == [f"{i}.0" for i in range(1, 10, 2)]
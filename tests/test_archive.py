@@ -0,0 +1,113 @@
+from datetime import datetime
+
+import pytest
+
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.model import Order, AccountRecord
+from paper_trading.trade.archive import (
+    archive_account,
+    archive_all,
+    get_cutoff,
+    iter_archive,
+    merge_archive,
+    write_archive
+)
+from paper_trading.trade.db_model import (
+    on_account_add,
+    on_orders_insert,
+    account_record_creat,
+    query_orders,
+    query_account_record,
+    query_orders_page,
+    iter_orders_history
+)
+
+# 回测账户的模拟日期：2019年1月至6月，每月两个交易日
+DATES = [f"2019{m:02d}{d:02d}" for m in range(1, 7) for d in (10, 20)]
+
+
+def add_history(token, db):
+    """写入回测账户的历史订单及账户记录"""
+    for i, date in enumerate(DATES):
+        order = Order(code="000001", exchange="SZ", account_id=token,
+                      order_id=f"{1546000000 + i}.0", order_date=date)
+        on_orders_insert(order, db)
+        account_record_creat(AccountRecord(account_id=token, check_date=date, assets=i), db)
+
+
+@pytest.fixture
+def account(db, tmp_path):
+    SETTINGS['ARCHIVE_PATH'] = str(tmp_path / "archive")
+    token = on_account_add({}, db)['account_id']
+    add_history(token, db)
+    return token
+
+
+def test_cutoff_follows_data_dates(db, account):
+    """截止日期以账户最新的模拟日期为准，而不是当前时间"""
+    assert get_cutoff(account, db, 90, now=datetime(2026, 1, 1)) == "20190322"
+
+
+def test_archive_all_keeps_recent_backtest_data(db, account):
+    archive_all(db, 90)
+
+    archived = [d['order_date'] for d in iter_archive('orders', account)]
+    assert archived and max(archived) < "20190322"
+    assert len(query_orders(account, db)) == len(DATES)
+
+
+def test_interrupted_archive_has_no_duplicates(db, account):
+    """归档文件已写入但数据库中的数据尚未删除时，查询结果不重复"""
+    archive_account(account, db, "20190401")
+    add_history(account, db)
+
+    orders = query_orders(account, db)
+    assert sorted(d['order_id'] for d in orders) == sorted(set(d['order_id'] for d in orders))
+    assert len(orders) == len(DATES)
+    assert len(list(iter_orders_history(account, db))) == len(DATES)
+
+    records = query_account_record(account, db)
+    assert len(records) == len(DATES)
+
+    page, cursor = query_orders_page(account, db, limit=len(DATES) + 5)
+    assert len(page) == len(DATES) and cursor is None
+
+
+def test_merge_archive_prefers_live_data():
+    archived = [{'order_id': "1", 'status': "old"}, {'order_id': "2", 'status': "old"}]
+    docs = [{'order_id': "2", 'status': "new"}, {'order_id': "3", 'status': "new"}]
+    merged = merge_archive('orders', archived, docs)
+    assert merged == [archived[0]] + docs
+
+
+def test_write_archive_merges_by_key(tmp_path):
+    file_name = str(tmp_path / "201901.json.gz")
+    write_archive(file_name, [{'order_id': "1", 'v': 1}], ('order_id',))
+    count = write_archive(file_name, [{'order_id': "1", 'v': 2}, {'order_id': "2", 'v': 3}], ('order_id',))
+    assert count == 2
+
+
+def test_iter_archive_skips_months_out_of_range(db, account, tmp_path):
+    archive_account(account, db, "20190701")
+    flt = {'order_date': {'$gte': "20190301", '$lte': "20190331"}}
+    dates = [d['order_date'] for d in iter_archive('orders', account, flt)]
+    assert dates == ["20190310", "20190320"]
+
+
+def test_account_engine_query_backtest_no_duplicates(db, account):
+    """回测交易员在内存中保留全部历史数据，归档后查询不重复"""
+    pytest.importorskip("pandas")
+    from paper_trading.event import EventEngine
+    from paper_trading.utility.constant import LoadDataMode
+    from paper_trading.trade.account_engine import AccountEngine
+
+    engine = AccountEngine(EventEngine(), True, LoadDataMode.BACKTEST, db)
+    engine.login(account)
+    archive_account(account, db, "20190401")
+
+    status, orders = engine.query_orders(account)
+    assert status and len(orders) == len(DATES)
+    assert len({d['order_id'] for d in orders}) == len(DATES)
+
+    status, records = engine.query_account_record(account)
+    assert status and len(records) == len(DATES)
@@ -0,0 +1,143 @@
+from threading import Event as Signal, get_ident
+
+from paper_trading.event import AsyncEventEngine, Event
+from paper_trading.event.stats import stats_to_prometheus
+
+
+def run_events(engine, events, done, timeout=5):
+    engine.start()
+    try:
+        for event in events:
+            engine.put(event)
+        assert done.wait(timeout)
+    finally:
+        engine.stop()
+
+
+def test_handler_exception_does_not_stop_worker(capsys):
+    """处理函数异常时记录失败次数，同一分区的后续事件继续处理"""
+    engine = AsyncEventEngine()
+    received = []
+    done = Signal()
+
+    def fail(event):
+        if event.data == 1:
+            raise ValueError("bad event")
+
+    async def record(event):
+        received.append(event.data)
+        if event.data == 3:
+            done.set()
+
+    engine.register("test", fail)
+    engine.register("test", record)
+    run_events(engine, [Event("test", i) for i in range(1, 4)], done)
+
+    assert received == [1, 2, 3]
+    handlers = {d["handler"]: d for d in engine.get_stats()["handlers"]}
+    assert handlers["test_handler_exception_does_not_stop_worker.<locals>.fail"]["failed"] == 1
+    assert handlers["test_handler_exception_does_not_stop_worker.<locals>.record"]["failed"] == 0
+    assert "bad event" in capsys.readouterr().err
+    assert "pt_event_handler_failed_total" in stats_to_prometheus(engine.get_stats())
+
+
+def test_coroutine_handler_exception_is_caught(capsys):
+    engine = AsyncEventEngine()
+    done = Signal()
+
+    async def fail(event):
+        if event.data == 0:
+            raise RuntimeError("async failure")
+        done.set()
+
+    engine.register("test", fail)
+    run_events(engine, [Event("test", 0), Event("test", 1)], done)
+    assert "async failure" in capsys.readouterr().err
+
+
+def test_executor_size_is_independent_of_workers():
+    """一个工作任务时同步处理函数也可在多个线程中执行"""
+    engine = AsyncEventEngine(workers=1, executor_workers=4)
+    assert engine._executor._max_workers == 4
+
+    # 各分区的同步处理函数并发执行时使用不同线程
+    engine = AsyncEventEngine(workers=2, partition_key=lambda event: event.data,
+                              executor_workers=2)
+    threads = set()
+    barrier_hit = []
+    done = Signal()
+    gate = Signal()
+
+    def handler(event):
+        threads.add(get_ident())
+        barrier_hit.append(event.data)
+        if len(barrier_hit) == 2:
+            gate.set()
+        gate.wait(2)
+        if len(barrier_hit) == 2:
+            done.set()
+
+    engine.register("test", handler)
+    run_events(engine, [Event("test", 0), Event("test", 1)], done)
+    assert len(threads) == 2
+
+
+def test_coroutine_handlers_keep_order_per_key():
+    """同一分区的协程处理函数按推送顺序执行，不同分区的等待相互重叠"""
+    import asyncio
+
+    engine = AsyncEventEngine(workers=2, partition_key=lambda event: event.data[0])
+    received = {0: [], 1: []}
+    active = set()
+    overlapped = []
+    done = Signal()
+
+    async def handler(event):
+        key, i = event.data
+        active.add(key)
+        if len(active) == 2:
+            overlapped.append(True)
+        await asyncio.sleep(0.001)
+        active.discard(key)
+        received[key].append(i)
+        if len(received[0]) == len(received[1]) == 20:
+            done.set()
+
+    engine.register("test", handler)
+    # 启动前推送的事件在启动后处理
+    events = [Event("test", (key, i)) for i in range(20) for key in (0, 1)]
+    run_events(engine, events, done)
+
+    assert received == {0: list(range(20)), 1: list(range(20))}
+    assert overlapped
+
+
+def test_timer_callbacks_run_on_loop():
+    engine = AsyncEventEngine()
+    done = Signal()
+    calls = []
+
+    def tick(name):
+        calls.append(name)
+        if len(calls) == 3:
+            done.set()
+
+    engine.start()
+    try:
+        handle = engine.call_every(0.01, tick, "every")
+        engine.call_later(0.01, tick, "later")
+        assert done.wait(5)
+        handle.cancel()
+    finally:
+        engine.stop()
+    assert "later" in calls and calls.count("every") >= 2
+
+
+def test_unregister_handler():
+    engine = AsyncEventEngine()
+    handler = lambda event: None
+    engine.register("test", handler)
+    engine.register("test", handler)
+    assert engine._handlers["test"] == (handler,)
+    engine.unregister("test", handler)
+    assert "test" not in engine._handlers
@@ -0,0 +1,64 @@
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.model import Order, DBData
+from paper_trading.trade.db_layout import EntityLayoutDB, migrate
+from paper_trading.trade.db_model import (
+    on_accounts_add,
+    on_account_avl_update,
+    on_orders_insert,
+    query_account_list,
+    query_account_one,
+    query_orders
+)
+
+
+def add_orders(token, db, count):
+    for i in range(count):
+        on_orders_insert(Order(code="000001", exchange="SZ", account_id=token,
+                               order_id=f"{i}.0", order_date="20190101"), db)
+
+
+def test_accounts_are_isolated_in_entity_collections(db):
+    layout = EntityLayoutDB(db)
+    a, b = [d['account_id'] for d in on_accounts_add([{}, {}], layout)]
+    add_orders(a, layout, 2)
+    add_orders(b, layout, 3)
+
+    on_account_avl_update({'token': a, 'avl': 1.0}, layout)
+    assert query_account_one(a, layout)['available'] == 1.0
+    assert query_account_one(b, layout)['available'] == SETTINGS['CAPITAL']
+    assert len(query_orders(a, layout)) == 2 and len(query_orders(b, layout)) == 3
+    assert sorted(query_account_list(layout)) == sorted([a, b])
+
+    # 所有账户的订单保存在同一集合中
+    orders = DBData(db_name=SETTINGS['TRADE_DB'], db_cl="orders", raw_data={'flt': {}})
+    assert len(list(db.on_select(orders))) == 5
+
+
+def test_collection_delete_removes_only_one_account(memory_db):
+    layout = EntityLayoutDB(memory_db)
+    a, b = [d['account_id'] for d in on_accounts_add([{}, {}], layout)]
+    add_orders(a, layout, 2)
+    add_orders(b, layout, 2)
+
+    layout.on_collection_delete(DBData(db_name=SETTINGS['TRADE_DB'], db_cl=a, raw_data={}))
+    assert not query_orders(a, layout)
+    assert len(query_orders(b, layout)) == 2
+
+
+def test_migrate_is_repeatable(sqlite_db, memory_db):
+    """按账户分集合的数据迁移到合并存储，重复迁移不产生重复数据"""
+    tokens = [d['account_id'] for d in on_accounts_add([{}, {}], sqlite_db)]
+    for i, token in enumerate(tokens):
+        add_orders(token, sqlite_db, i + 2)
+
+    assert migrate(sqlite_db, memory_db) == 2
+    assert migrate(sqlite_db, memory_db) == 2
+
+    layout = EntityLayoutDB(memory_db)
+    assert sorted(query_account_list(layout)) == sorted(tokens)
+    for token in tokens:
+        assert query_orders(token, layout) == query_orders(token, sqlite_db)
+        assert query_account_one(token, layout) == query_account_one(token, sqlite_db)
+
+    migrate(sqlite_db, memory_db, drop=True)
+    assert query_account_list(sqlite_db) == []
@@ -0,0 +1,183 @@
+import pytest
+
+from paper_trading.api.memory_db import MemoryDBService
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.model import Order, DBData
+from paper_trading.trade.db_layout import EntityLayoutDB
+from paper_trading.trade.db_model import (
+    on_accounts_add,
+    on_accounts_delete,
+    on_orders_insert,
+    query_account_list,
+    query_orders
+)
+
+
+class FailingDB(MemoryDBService):
+    """指定数据库删除失败的内存数据服务，after为True时删除完成后才失败，db_key为空时不失败"""
+
+    def __init__(self, db_key: str, after: bool = False, error: type = ConnectionError):
+        super().__init__()
+        self.db_key = db_key
+        self.after = after
+        self.error = error
+
+    def on_delete(self, pt_db):
+        if not self.db_key or pt_db.db_name != SETTINGS[self.db_key]:
+            return super().on_delete(pt_db)
+        if self.after:
+            super().on_delete(pt_db)
+        raise self.error("连接中断")
+
+
+def add_accounts(db, count=3):
+    tokens = [d['account_id'] for d in on_accounts_add([{}] * count, db)]
+    for token in tokens:
+        on_orders_insert(Order(code="000001", exchange="SZ", account_id=token, order_id="1.0"), db)
+    return tokens
+
+
+@pytest.mark.parametrize("layout", [False, True])
+def test_accounts_delete(db, layout):
+    if layout:
+        db = EntityLayoutDB(db)
+    tokens = add_accounts(db)
+
+    assert on_accounts_delete(tokens[:2], db) == tokens[:2]
+    assert query_account_list(db) == tokens[2:]
+    assert not query_orders(tokens[0], db)
+    assert query_orders(tokens[2], db)
+
+
+def test_consolidated_delete_failure_keeps_accounts():
+    """订单删除失败时账户信息未删除，返回空列表，重新删除可完成"""
+    db = EntityLayoutDB(FailingDB('TRADE_DB'))
+    db.connect_db()
+    tokens = add_accounts(db)
+
+    assert on_accounts_delete(tokens, db) == []
+    assert sorted(query_account_list(db)) == sorted(tokens)
+
+    db.db.db_key = None
+    assert on_accounts_delete(tokens, db) == tokens
+    assert not query_account_list(db)
+
+
+def test_consolidated_delete_reports_deleted_accounts():
+    """账户信息已删除但返回失败时，按数据库中剩余的账户返回删除成功的账户"""
+    db = EntityLayoutDB(FailingDB('ACCOUNT_DB', after=True))
+    db.connect_db()
+    tokens = add_accounts(db)
+
+    assert on_accounts_delete(tokens, db) == tokens
+    assert not query_account_list(db)
+
+
+def test_consolidated_delete_does_not_swallow_interrupt():
+    """批量删除过程中的KeyboardInterrupt不被当作删除失败处理"""
+    db = EntityLayoutDB(FailingDB('TRADE_DB', error=KeyboardInterrupt))
+    db.connect_db()
+    tokens = add_accounts(db)
+
+    with pytest.raises(KeyboardInterrupt):
+        on_accounts_delete(tokens, db)
+
+
+def test_pos_records_are_keyed_by_pos_id(db):
+    """同一天的持仓记录按编号区分，重复写入同一记录不产生重复数据"""
+    from paper_trading.utility.model import PosRecord
+    from paper_trading.trade.db_model import pos_record_creat, iter_pos_records
+
+    token = on_accounts_add([{}], db)[0]['account_id']
+    for pos_id in ("1.0", "2.0", "2.0"):
+        pos_record_creat(PosRecord(code="000001", exchange="SZ", account_id=token,
+                                   first_buy_date="20190102", last_sell_date="",
+                                   pos_id=pos_id), db)
+    assert sorted(d['pos_id'] for d in iter_pos_records(token, db)) == ["1.0", "2.0"]
+
+
+def test_sqlite_indexes_are_created_once(sqlite_db):
+    from paper_trading.trade.db_model import INDEXES, on_account_index_creat, on_index_backfill
+
+    token = on_accounts_add([{}], sqlite_db)[0]['account_id']
+    on_account_index_creat(token, sqlite_db)
+
+    conn = sqlite_db._get_conn()
+    names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index' "
+                                            "AND name LIKE ?", (f"%{token}%",))]
+    assert len(names) == sum(len(indexes) for indexes in INDEXES.values())
+    assert f"{SETTINGS['TRADE_DB']}.{token}_order_date_order_id" in names
+
+    assert on_index_backfill(sqlite_db) == 1
+
+
+def test_consolidated_indexes_start_with_account_id():
+    from paper_trading.trade.persist_worker import OpRecorder
+    from paper_trading.trade.db_model import on_account_index_creat
+
+    recorder = OpRecorder()
+    on_account_index_creat("token", EntityLayoutDB(recorder))
+    indexes = [pt_db.raw_data['index'] for name, pt_db in recorder.ops if name == 'on_index_creat']
+    assert indexes and all(keys[0] == ('account_id', 1) for index in indexes for keys in index)
+    orders = [pt_db for name, pt_db in recorder.ops if pt_db.db_cl == "orders"][0]
+    assert [('account_id', 1), ('order_date', 1), ('order_id', 1)] in orders.raw_data['index']
+
+
+def test_memory_index_serves_equality_queries(memory_db):
+    token = add_accounts(memory_db, 1)[0]
+    cl = memory_db._get_cl(DBData(db_name=SETTINGS['TRADE_DB'], db_cl=token, raw_data={}))
+    assert ('order_id',) in cl.indexes
+    assert cl._candidates({'order_id': "1.0"}) == [1]
+    assert cl._candidates({'order_id': "2.0"}) == []
+
+
+def add_orders(token, db, count=5):
+    for i in range(count):
+        on_orders_insert(Order(code=f"00000{i}", exchange="SZ", account_id=token,
+                               order_id=f"{i}.0", order_date=f"2019010{i}"), db)
+
+
+def test_iter_orders_projection_sort_and_limit(db):
+    from paper_trading.trade.db_model import iter_orders, iter_position, get_projection
+
+    token = on_accounts_add([{}], db)[0]['account_id']
+    add_orders(token, db)
+
+    orders = list(iter_orders(token, db, fields=['order_id', 'code'],
+                              sort=[('order_id', -1)], limit=3))
+    assert orders == [{'order_id': f"{i}.0", 'code': f"00000{i}"} for i in (4, 3, 2)]
+    assert all('_id' not in d for d in iter_orders(token, db))
+    assert list(iter_position(token, db)) == []
+    assert get_projection() == {'_id': 0}
+
+
+def test_iter_orders_reads_lazily(memory_db):
+    """创建生成器时不查询数据库，遍历时才读取"""
+    from paper_trading.trade.db_model import iter_orders
+
+    calls = []
+
+    class RecordingDB():
+        def on_select(self, pt_db):
+            calls.append(pt_db.raw_data)
+            return memory_db.on_select(pt_db)
+
+    token = on_accounts_add([{}], memory_db)[0]['account_id']
+    add_orders(token, memory_db)
+
+    orders = iter_orders(token, RecordingDB(), {'order_date': {'$gte': "20190103"}})
+    assert calls == []
+    assert next(orders)['order_id'] == "3.0"
+    assert calls[0]['batch_size'] > 0
+
+
+def test_query_order_status_and_one(db):
+    from paper_trading.trade.db_model import query_order_one, query_order_status
+
+    token = on_accounts_add([{}], db)[0]['account_id']
+    add_orders(token, db, 1)
+
+    status, order = query_order_one(token, "0.0", db)
+    assert status and order['code'] == "000000" and '_id' not in order
+    assert query_order_status(token, "0.0", db) == (True, Order.status)
+    assert query_order_status(token, "9.0", db) == (False, "无此订单")
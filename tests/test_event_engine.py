@@ -0,0 +1,215 @@
+import sys
+from collections import defaultdict
+from threading import Event as Signal, Lock, current_thread
+
+from paper_trading.event import Event, EventEngine
+from paper_trading.trade.account_engine import account_partition_key
+
+
+def wait_processed(engine, count, timeout=5):
+    """等待事件引擎处理完count个事件"""
+    done = Signal()
+    processed = []
+    lock = Lock()
+
+    def handler(event):
+        with lock:
+            processed.append(event)
+            if len(processed) == count:
+                done.set()
+
+    engine.register_general(handler)
+    return done
+
+
+def test_events_of_one_token_are_processed_in_order():
+    """同一账户的事件由同一工作线程按顺序处理，不同账户的事件分配到不同工作线程"""
+    engine = EventEngine(workers=4, partition_key=account_partition_key)
+    received = defaultdict(list)
+    threads = defaultdict(set)
+    lock = Lock()
+
+    def handler(event):
+        with lock:
+            received[event.data['token']].append(event.data['i'])
+            threads[event.data['token']].add(current_thread().name)
+
+    engine.register("test", handler)
+    tokens = [f"token{i}" for i in range(8)]
+    done = wait_processed(engine, len(tokens) * 100)
+    engine.start()
+    try:
+        for i in range(100):
+            for token in tokens:
+                engine.put(Event("test", {'token': token, 'i': i}))
+        assert done.wait(5)
+    finally:
+        engine.stop()
+
+    for token in tokens:
+        assert received[token] == list(range(100))
+        assert len(threads[token]) == 1
+    assert len(set().union(*threads.values())) > 1
+
+
+def test_events_without_key_go_to_first_worker():
+    engine = EventEngine(workers=4, partition_key=lambda event: event.data)
+    assert engine._route(Event("test", None)) is engine._queues[0]
+    assert engine._route(Event("test", "a")) is engine._route(Event("test", "a"))
+
+    single = EventEngine(workers=1, partition_key=lambda event: event.data)
+    assert single._route(Event("test", "a")) is single._queues[0]
+
+
+def test_account_partition_key():
+    from paper_trading.utility.model import Order
+
+    assert account_partition_key(Event("test", {'token': "a"})) == "a"
+    assert account_partition_key(Event("test", Order(code="000001", exchange="SZ", account_id="b"))) == "b"
+    assert account_partition_key(Event("test", None)) is None
+
+
+def test_coalesce_skips_superseded_events():
+    from paper_trading.event.engine import get_coalesce_skips
+
+    def latest(event):
+        pass
+
+    events = [Event("price", ("a", 1)), Event("price", ("b", 1)),
+              Event("other", None), Event("price", ("a", 2))]
+    skips = get_coalesce_skips(events, {"price": {latest: lambda event: event.data[0]}})
+    assert skips == [[latest], None, None, None]
+
+
+def test_batch_delivers_only_latest_event_of_key():
+    """同一批次中合并处理函数只收到每个键最新的事件，其他处理函数收到全部事件"""
+    engine = EventEngine(batch_size=100)
+    latest, every = [], []
+    engine.register("price", lambda event: latest.append(event.data),
+                    coalesce_key=lambda event: event.data[0])
+    engine.register("price", lambda event: every.append(event.data))
+
+    # 引擎启动前推送的事件在第一个批次中处理
+    for i in range(10):
+        for symbol in ("a", "b"):
+            engine.put(Event("price", (symbol, i)))
+    done = wait_processed(engine, 20)
+    engine.start()
+    try:
+        assert done.wait(5)
+    finally:
+        engine.stop()
+
+    assert latest == [("a", 9), ("b", 9)]
+    assert len(every) == 20
+
+
+def test_batch_size_limits_coalescing():
+    engine = EventEngine(batch_size=5)
+    latest = []
+    engine.register("price", lambda event: latest.append(event.data[1]),
+                    coalesce_key=lambda event: event.data[0])
+
+    for i in range(10):
+        engine.put(Event("price", ("a", i)))
+    done = wait_processed(engine, 10)
+    engine.start()
+    try:
+        assert done.wait(5)
+    finally:
+        engine.stop()
+
+    assert latest == [4, 9]
+
+
+def test_event_has_no_instance_dict():
+    event = Event("test", 1)
+    assert not hasattr(event, "__dict__")
+    assert (event.type, event.data) == ("test", 1)
+
+
+def test_dispatch_without_stats_takes_no_lock_or_timing():
+    """关闭统计时事件处理只调用处理函数，不加锁、不计时"""
+    engine = EventEngine(stats=False)
+
+    def handler(event):
+        pass
+
+    def general(event):
+        pass
+
+    engine.register("order", handler)
+    engine.register_general(general)
+
+    calls = []
+
+    def profile(frame, what, arg):
+        if what == "call":
+            calls.append(frame.f_code.co_name)
+        elif what == "c_call":
+            calls.append(arg.__name__)
+
+    event = Event("order")
+    sys.setprofile(profile)
+    engine._process(event)
+    sys.setprofile(None)
+
+    assert calls[:-1] == ["_process", "get", "handler", "general"]
+
+
+def test_unregister_during_dispatch_keeps_current_handlers():
+    """处理函数在分发过程中注销其他处理函数时，当前事件仍交给注册时的所有处理函数"""
+    engine = EventEngine(inline=True)
+    calls = []
+
+    def second(event):
+        calls.append("second")
+
+    def first(event):
+        calls.append("first")
+        engine.unregister("test", second)
+
+    def general(event):
+        calls.append("general")
+
+    engine.register("test", first)
+    engine.register("test", second)
+    engine.register("test", first)
+    engine.register_general(general)
+    engine.register_general(general)
+
+    engine.put(Event("test"))
+    assert calls == ["first", "second", "general"]
+
+    engine.unregister_general(general)
+    engine.put(Event("test"))
+    assert calls[3:] == ["first"]
+
+    engine.unregister("test", first)
+    engine.unregister("test", first)
+    assert "test" not in engine._handlers
+
+
+def test_inline_put_processes_nested_events_synchronously():
+    """同步模式下处理函数推送的事件在推送返回前处理完毕"""
+    engine = EventEngine(inline=True, stats=True)
+    calls = []
+
+    def on_order(event):
+        calls.append(("order", event.data))
+        engine.put(Event("trade", event.data))
+        calls.append(("order done", event.data))
+
+    engine.register("order", on_order)
+    engine.register("trade", lambda event: calls.append(("trade", event.data)))
+
+    engine.start()
+    try:
+        engine.put(Event("order", 1))
+        assert calls == [("order", 1), ("trade", 1), ("order done", 1)]
+        assert not any(thread.is_alive() for thread in engine._threads)
+    finally:
+        engine.stop()
+
+    stats = engine.get_stats()
+    assert stats["types"]["trade"]["processed"] == 1
@@ -0,0 +1,96 @@
+from queue import Empty
+from threading import Thread
+
+import pytest
+
+from paper_trading.event import Event, EventEngine, EventQueue, PutPolicy
+
+
+def drain(queue):
+    events = []
+    while True:
+        try:
+            events.append(queue.get_nowait())
+        except Empty:
+            return events
+
+
+def test_drop_oldest_sheds_only_droppable_events():
+    queue = EventQueue(maxsize=2)
+    queue.put(Event("log", 1), PutPolicy.DROP_OLDEST)
+    queue.put(Event("order", 2))
+
+    assert queue.put(Event("log", 3), PutPolicy.DROP_OLDEST)
+    assert [e.data for e in drain(queue)] == [2, 3]
+    assert queue.dropped == {"log": 1}
+
+    # 队列中没有可丢弃的事件时丢弃新事件
+    queue.put(Event("order", 4))
+    queue.put(Event("order", 5))
+    assert not queue.put(Event("log", 6), PutPolicy.DROP_OLDEST)
+    assert [e.data for e in drain(queue)] == [4, 5]
+    assert queue.dropped == {"log": 2}
+
+
+def test_coalesce_replaces_pending_event_of_same_key():
+    queue = EventQueue(maxsize=2)
+    queue.put(Event("price", ("a", 1)), PutPolicy.COALESCE, "a")
+    queue.put(Event("order", 2))
+    queue.put(Event("price", ("a", 3)), PutPolicy.COALESCE, "a")
+
+    assert [e.data for e in drain(queue)] == [2, ("a", 3)]
+    assert queue.coalesced == {"price": 1} and queue.qsize() == 0
+
+
+def test_block_waits_for_space():
+    queue = EventQueue(maxsize=1)
+    queue.put(Event("order", 1))
+    thread = Thread(target=queue.put, args=(Event("order", 2),))
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()
+
+    assert queue.get().data == 1
+    thread.join(5)
+    assert queue.get_nowait().data == 2
+    assert queue.delayed == {"order": 1}
+
+
+def test_non_blocking_put_overruns_full_queue():
+    """工作线程推送事件时不等待，避免处理函数推送事件时死锁"""
+    queue = EventQueue(maxsize=1)
+    queue.put(Event("order", 1))
+    assert queue.put(Event("order", 2), block=False)
+    assert queue.qsize() == 2
+
+
+def test_unbounded_queue_never_overflows():
+    queue = EventQueue()
+    for i in range(1000):
+        queue.put(Event("log", i), PutPolicy.DROP_OLDEST)
+    assert queue.qsize() == 1000 and not queue.dropped
+
+
+def test_engine_overflow_and_policy():
+    engine = EventEngine(workers=2, maxsize=1, partition_key=lambda event: event.data)
+    engine.set_policy("log", PutPolicy.DROP_OLDEST)
+    for i in range(3):
+        engine.put(Event("log", None))
+    assert engine.get_overflow()["dropped"] == {"log": 2}
+
+    with pytest.raises(ValueError):
+        engine.set_policy("price", PutPolicy.COALESCE)
+
+
+@pytest.mark.parametrize("policy", [PutPolicy.DROP_OLDEST, PutPolicy.COALESCE])
+def test_overflow_keeps_entries_bounded(policy):
+    """持续溢出时丢弃及合并的事件立即移除，队列内部条目不超过容量"""
+    queue = EventQueue(maxsize=10)
+    for i in range(100000):
+        queue.put(Event("price", i), policy, i % 10)
+        assert len(queue._entries) <= 10
+
+    assert queue.qsize() == 10
+    assert len(queue._droppable if policy == PutPolicy.DROP_OLDEST else queue._pending) == 10
+    assert sorted(e.data for e in drain(queue)) == list(range(99990, 100000))
+    assert not queue._entries and not queue._droppable and not queue._pending
@@ -0,0 +1,102 @@
+from time import sleep
+
+import pytest
+
+from paper_trading.event import Event, EventEngine
+from paper_trading.event.stats import EventStats, LatencyHistogram, get_handler_name, stats_to_prometheus
+
+
+def test_latency_histogram_buckets_are_cumulative():
+    histogram = LatencyHistogram()
+    for latency in (0.00005, 0.0003, 0.0003, 2.0):
+        histogram.add(latency)
+
+    data = histogram.to_dict()
+    assert data["count"] == 4 and data["max"] == 2.0
+    assert data["buckets"]["0.0001"] == 1
+    assert data["buckets"]["0.0005"] == 3
+    assert data["buckets"]["1"] == 3
+    assert data["buckets"]["inf"] == 4
+
+
+def test_event_stats_counts_by_type_and_handler():
+    class Engine:
+        def process(self, event):
+            pass
+
+    stats = EventStats()
+    handler = Engine().process
+    stats.on_put("order")
+    stats.on_put("order")
+    stats.on_processed("order")
+    stats.on_handled("order", handler, 0.001)
+
+    data = stats.to_dict()
+    assert data["types"]["order"]["put"] == 2 and data["types"]["order"]["processed"] == 1
+    assert data["handlers"][0]["handler"] == "Engine.process" == get_handler_name(handler)
+    assert data["handlers"][0]["count"] == 1
+
+
+def test_engine_stats_report_queue_depth_and_age():
+    engine = EventEngine(workers=2, partition_key=lambda event: event.data)
+    engine.register("order", lambda event: None)
+    for i in range(3):
+        engine.put(Event("order", 0))
+    sleep(0.01)
+
+    stats = engine.get_stats()
+    assert [q["depth"] for q in stats["queues"]] == [3, 0]
+    assert stats["queues"][0]["oldest_age"] > 0
+    assert stats["types"]["order"]["put"] == 3 and stats["types"]["order"]["processed"] == 0
+
+    text = stats_to_prometheus(stats)
+    assert 'pt_event_queue_depth{worker="0"} 3' in text
+    assert 'pt_event_put_total{type="order"} 3' in text
+
+
+def test_inline_engine_records_handler_latency():
+    engine = EventEngine(inline=True, stats=True)
+    engine.register("order", lambda event: sleep(0.002))
+    engine.put(Event("order"))
+
+    stats = engine.get_stats()
+    handler = stats["handlers"][0]
+    assert handler["type"] == "order" and handler["count"] == 1 and handler["max"] >= 0.002
+    assert 'pt_event_handler_seconds_count{type="order"' in stats_to_prometheus(stats)
+
+
+def test_engine_counts_handler_failures():
+    def fail(event):
+        raise ValueError("处理失败")
+
+    engine = EventEngine(inline=True, stats=True)
+    engine.register("order", fail)
+    with pytest.raises(ValueError):
+        engine.put(Event("order"))
+
+    handler = engine.get_stats()["handlers"][0]
+    assert handler["failed"] == 1 and handler["count"] == 0
+    assert 'pt_event_handler_failed_total{type="order"' in stats_to_prometheus(engine.get_stats())
+
+
+def test_engine_without_stats():
+    engine = EventEngine(workers=2, stats=False)
+    engine.register("order", lambda event: None)
+    engine.put(Event("order"))
+
+    stats = engine.get_stats()
+    assert not stats["types"] and not stats["handlers"]
+    assert [q["depth"] for q in stats["queues"]] == [1, 0]
+    assert stats_to_prometheus(stats)
+
+
+def test_inline_engine_skips_stats_by_default():
+    """同步事件引擎默认不统计，事件处理不加锁"""
+    engine = EventEngine(inline=True)
+    handled = []
+    engine.register("order", handled.append)
+    engine.put(Event("order"))
+
+    assert handled and engine._stats is None
+    assert not engine.get_stats()["types"]
+    assert EventEngine()._stats is not None
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import pytest
+
+from paper_trading.utility.model import Order
+from paper_trading.utility.constant import Status, OrderType, LoadDataMode
+from paper_trading.event import EventEngine
+from paper_trading.trade.journal import EventJournal, HEADER, get_journal_file, read_journal
+from paper_trading.trade.db_model import on_account_add, query_account_one, query_orders
+
+
+def journal_file(path):
+    """当日的日志文件"""
+    return get_journal_file(str(path), datetime.now().strftime("%Y%m%d"))
+
+
+def test_round_trip_and_truncated_tail(tmp_path):
+    journal = EventJournal(str(tmp_path / "journal"))
+    for i in range(3):
+        journal.write("e_test", {'i': i})
+    journal.close()
+
+    file_name = journal_file(tmp_path / "journal")
+    assert [event.data['i'] for t, event in read_journal(file_name)] == [0, 1, 2]
+
+    # 写入过程中崩溃，最后一条记录不完整
+    with open(file_name, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 3)
+    assert [event.data['i'] for t, event in read_journal(file_name)] == [0, 1]
+
+
+def test_corrupt_record_stops_reading(tmp_path):
+    journal = EventJournal(str(tmp_path))
+    journal.write("e_test", 1)
+    journal.write("e_test", 2)
+    journal.close()
+
+    file_name = journal_file(tmp_path)
+    with open(file_name, "r+b") as f:
+        f.seek(HEADER.size + 2)
+        f.write(b"\x00\x00")
+    assert list(read_journal(file_name)) == []
+
+
+def test_replay_rebuilds_unpersisted_data(memory_db, tmp_path):
+    """数据未持久化时系统崩溃，回放事件日志后数据库与崩溃前的内存数据一致"""
+    pytest.importorskip("pandas")
+    from paper_trading.trade.account import Trader
+    from paper_trading.trade.account_engine import AccountEngine
+
+    account = on_account_add({}, memory_db)
+    token = account['account_id']
+    journal = EventJournal(str(tmp_path))
+    trader = Trader(EventEngine(), account, False, LoadDataMode.TRADING, memory_db, journal=journal)
+
+    for i in range(20):
+        order = Order(code="000001", exchange="SZ", account_id=token, order_type=OrderType.BUY.value,
+                      volume=100, order_price=10.0 + i, order_date="20190101",
+                      status=Status.SUBMITTING.value)
+        status, order = trader.on_orders_arrived(order)
+        if i % 3 == 0:
+            order.status = Status.CANCELLED.value
+            trader.on_order_cancel(order)
+    journal.close()
+
+    assert not query_orders(token, memory_db)
+    engine = AccountEngine(EventEngine(), True, LoadDataMode.TRADING, memory_db)
+    count = engine.replay_journal(journal_file(tmp_path))
+
+    assert count == 20 * 2 + 7 * 2
+    assert query_account_one(token, memory_db)['available'] == trader.account.available
+    orders = {d['order_id']: d['status'] for d in query_orders(token, memory_db)}
+    assert orders == {k: v.status for k, v in trader.orders.items()}
@@ -0,0 +1,80 @@
+import pytest
+
+from paper_trading.utility.model import Order
+from paper_trading.utility.constant import OrderType, PriceType
+from paper_trading.event import EventEngine
+from paper_trading.trade.market import ChinaAMarket
+
+
+class QuoteClient():
+    """记录请求的行情源"""
+
+    def __init__(self, quotes):
+        self.quotes = quotes
+        self.requests = []
+
+    def get_realtime_quotes(self, symbols):
+        self.requests.append(list(symbols))
+        if self.quotes is None:
+            raise ValueError("行情获取失败")
+        return {s: self.quotes[s] for s in symbols if s in self.quotes}
+
+
+def quote(bid1, ask1):
+    return {'price': str((bid1 + ask1) / 2), 'bid1': str(bid1), 'ask1': str(ask1),
+            'bid_vol1': "100", 'ask_vol1': "100", 'vol': "1000"}
+
+
+def limit_order(order_id, code, exchange, order_type, price):
+    return Order(code=code, exchange=exchange, account_id="token", order_id=order_id,
+                 order_type=order_type, price_type=PriceType.LIMIT.value, order_price=price,
+                 volume=100)
+
+
+@pytest.fixture
+def market():
+    client = QuoteClient({"000001.SZ": quote(9.8, 9.9), "600000.SH": quote(19.0, 19.1)})
+    market = ChinaAMarket(EventEngine(), None, client, None)
+    market.deals = []
+    market.on_order_deal = market.deals.append
+
+    for order in [limit_order("1", "000001", "SZ", OrderType.BUY.value, 10.0),
+                  limit_order("2", "000001", "SZ", OrderType.BUY.value, 9.0),
+                  limit_order("3", "600000", "SH", OrderType.SELL.value, 18.5),
+                  limit_order("4", "600001", "SH", OrderType.BUY.value, 10.0)]:
+        market.orders_book[order.order_id] = order
+    return market
+
+
+def test_one_quote_request_per_cycle(market):
+    market.match_orders()
+
+    assert len(market.hq_client.requests) == 1
+    assert set(market.hq_client.requests[0]) == {"000001.SZ", "600000.SH", "600001.SH"}
+    assert [order.order_id for order in market.deals] == ["1", "3"]
+    assert [order.trade_price for order in market.deals] == [9.9, 19.0]
+
+    # 未成交及没有行情的订单留在订单簿中
+    assert list(market.orders_book) == ["2", "4"]
+
+
+def test_failed_quote_request_keeps_orders(market):
+    market.hq_client.quotes = None
+    market.match_orders()
+
+    assert not market.deals
+    assert list(market.orders_book) == ["1", "2", "3", "4"]
+
+
+def test_cancelled_during_cycle_is_not_matched(market):
+    """撮合期间撤销的订单不再撮合"""
+    client = market.hq_client
+    get_quotes = client.get_realtime_quotes
+
+    def cancel_then_get(symbols):
+        market.orders_book.pop("1")
+        return get_quotes(symbols)
+
+    client.get_realtime_quotes = cancel_then_get
+    market.match_orders()
+    assert [order.order_id for order in market.deals] == ["3"]
@@ -0,0 +1,63 @@
+from paper_trading.api.memory_db import MemoryDBService
+from paper_trading.utility.model import DBData
+
+
+def make_db(name="test", cl="docs", **raw_data):
+    return DBData(db_name=name, db_cl=cl, raw_data=raw_data)
+
+
+def test_close_dumps_and_connect_loads(tmp_path):
+    """设置保存文件时关闭保存数据，下次连接时恢复数据及索引"""
+    path = str(tmp_path / "pt.db.gz")
+    db = MemoryDBService(path)
+    db.connect_db()
+    db.on_index_creat(make_db(index=[[('code', 1)]]))
+    db.on_insert_many(make_db(data=[{'code': "000001", 'n': 1}, {'code': "000002", 'n': 2}]))
+    db.close()
+
+    restored = MemoryDBService(path)
+    restored.connect_db()
+    assert [d['n'] for d in restored.on_select(make_db(flt={'code': "000002"}))] == [2]
+    cl = restored._get_cl(make_db())
+    assert ('code',) in cl.indexes
+
+    # _id继续递增，不与恢复的数据重复
+    restored.on_insert_many(make_db(data=[{'code': "000003", 'n': 3}]))
+    ids = [d['_id'] for d in restored.on_select(make_db(flt={}))]
+    assert len(set(ids)) == 3
+    restored.close()
+
+
+def test_without_path_nothing_is_written(tmp_path):
+    db = MemoryDBService()
+    db.connect_db()
+    db.on_insert_many(make_db(data=[{'n': 1}]))
+    db.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_returned_docs_are_copies():
+    """修改查询结果不影响保存的数据"""
+    db = MemoryDBService()
+    db.connect_db()
+    db.on_insert_many(make_db(data=[{'n': 1, 'tags': ["a"]}]))
+
+    doc = db.on_query_one(make_db(flt={'n': 1}))
+    doc['n'] = 2
+    assert db.on_query_one(make_db(flt={'n': 1})) is not None
+
+
+def test_update_bulk_write_and_group():
+    db = MemoryDBService()
+    db.connect_db()
+    db.on_insert_many(make_db(data=[{'code': "a", 'v': 1}, {'code': "b", 'v': 2}, {'code': "a", 'v': 3}]))
+    db.on_update(make_db(flt={'code': "b"}, set={'$inc': {'v': 10}}))
+    db.on_bulk_write(make_db(data=[('replace', {'code': "c"}, {'code': "c", 'v': 5}),
+                                   ('delete', {'code': "a", 'v': 1}, None)]))
+
+    docs = {d['code']: d['v'] for d in db.on_select(make_db(flt={}))}
+    assert docs == {'a': 3, 'b': 12, 'c': 5}
+
+    groups = db.on_group(make_db(flt={}, group={'_id': "$code", 'total': {'$sum': "$v"}}))
+    assert sorted((g['_id'], g['total']) for g in groups) == [('a', 3), ('b', 12), ('c', 5)]
+    assert db.on_collections_query(make_db(cl="")) == ["docs"]
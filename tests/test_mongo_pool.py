@@ -0,0 +1,132 @@
+from collections import defaultdict
+
+import pytest
+
+from paper_trading.utility.setting import SETTINGS
+
+db_api = pytest.importorskip("paper_trading.api.db")
+
+
+class FakeClient():
+    """不连接服务器的MongoClient"""
+
+    def __init__(self, host, port, event_listeners=None, **options):
+        self.host = host
+        self.port = port
+        self.listeners = event_listeners
+        self.options = options
+        self.closed = False
+
+    def server_info(self):
+        if self.host == "downhost":
+            raise ConnectionError("服务器未启动")
+        return {}
+
+    def __getitem__(self, name):
+        return defaultdict(dict)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(db_api, "MongoClient", FakeClient)
+    monkeypatch.setattr(db_api, "AsyncIOMotorClient", FakeClient)
+    return db_api.MongoConnectionManager()
+
+
+def test_client_options_from_settings():
+    SETTINGS["MONGO_POOL_SIZE"] = 20
+    SETTINGS["MONGO_MIN_POOL_SIZE"] = 2
+    SETTINGS["MONGO_WRITE_CONCERN"] = "majority"
+    SETTINGS["MONGO_WAIT_QUEUE_TIMEOUT"] = 0
+    SETTINGS["MONGO_COMPRESSORS"] = ""
+
+    options = db_api.get_client_options()
+    assert options["maxPoolSize"] == 20 and options["minPoolSize"] == 2
+    assert options["w"] == "majority"
+    assert "waitQueueTimeoutMS" not in options and "compressors" not in options
+
+    SETTINGS["MONGO_WAIT_QUEUE_TIMEOUT"] = 1000
+    SETTINGS["MONGO_COMPRESSORS"] = "zstd,zlib"
+    options = db_api.get_client_options()
+    assert options["waitQueueTimeoutMS"] == 1000 and options["compressors"] == "zstd,zlib"
+
+
+def test_services_share_one_client(manager, monkeypatch):
+    monkeypatch.setattr(db_api, "connection_manager", manager)
+    a = db_api.MongoDBService("localhost", 27017)
+    b = db_api.MongoDBService("localhost", 27017)
+    c = db_api.MongoDBService("otherhost", 27017)
+    for service in (a, b, c):
+        assert service.connect_db()
+
+    assert a.db_client is b.db_client
+    assert a.db_client is not c.db_client
+    assert manager.get_stats()["localhost:27017"]["refs"] == 2
+
+    # 最后一个使用者关闭时才关闭连接池
+    client = a.db_client
+    a.close()
+    assert not client.closed
+    b.close()
+    assert client.closed
+    assert set(manager.get_stats()) == {"otherhost:27017"}
+
+
+def test_pool_wait_stats(manager):
+    client = manager.get_client("localhost", 27017)
+    listener = client.listeners[0]
+
+    for _ in range(3):
+        listener.connection_check_out_started(None)
+        listener.connection_checked_out(None)
+    listener.connection_check_out_started(None)
+    listener.connection_check_out_failed(None)
+
+    stats = manager.get_stats()["localhost:27017"]
+    assert stats["checkouts"] == 3 and stats["failures"] == 1
+    assert 0 <= stats["wait_mean"] <= stats["wait_max"]
+    assert stats["wait_total"] >= stats["wait_max"]
+
+
+def test_empty_listener_stats():
+    stats = db_api.PoolWaitListener().get_stats()
+    assert stats["checkouts"] == 0 and stats["wait_mean"] == 0
+
+
+def test_failed_connection_closes_client(manager, monkeypatch):
+    clients = []
+
+    def make_client(*args, **kwargs):
+        clients.append(FakeClient(*args, **kwargs))
+        return clients[-1]
+
+    monkeypatch.setattr(db_api, "MongoClient", make_client)
+    with pytest.raises(ConnectionError):
+        manager.get_client("downhost", 27017)
+    assert clients[0].closed and not manager.get_stats()
+
+
+def test_async_writers_share_one_client(manager, monkeypatch):
+    """异步写入共享连接管理中的motor客户端，与同步连接分开统计"""
+    monkeypatch.setattr(db_api, "connection_manager", manager)
+    a = db_api.AsyncMongoWriter("localhost", 27017)
+    b = db_api.AsyncMongoWriter("localhost", 27017)
+    manager.get_client("localhost", 27017)
+
+    pt_db = db_api.DBData(db_name="db", db_cl="cl", raw_data={})
+    clients = []
+    for writer in (a, b):
+        writer._get_cl(pt_db)
+        clients.append(writer.db_client)
+
+    assert clients[0] is clients[1]
+    assert clients[0].options == db_api.get_client_options()
+    assert manager.get_stats()["localhost:27017/async"]["refs"] == 2
+
+    a.close()
+    b.close()
+    assert clients[0].closed
+    assert set(manager.get_stats()) == {"localhost:27017"}
@@ -0,0 +1,148 @@
+import json
+
+import pytest
+
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.model import Order
+from paper_trading.trade.archive import archive_account, iter_archive
+from paper_trading.trade.db_model import (
+    on_account_add,
+    on_orders_insert,
+    get_orders_cursor,
+    iter_orders_sorted,
+    query_orders_page
+)
+
+# 每个交易日两笔订单，订单编号与日期顺序不一致
+DATES = [f"2019{m:02d}{d:02d}" for m in range(1, 5) for d in (10, 20)]
+
+
+@pytest.fixture
+def account(db, tmp_path):
+    """前两个月的订单已归档的账户"""
+    SETTINGS['ARCHIVE_PATH'] = str(tmp_path / "archive")
+    token = on_account_add({}, db)['account_id']
+    for i, date in enumerate(DATES):
+        for j in range(2):
+            order = Order(code="000001", exchange="SZ", account_id=token,
+                          order_id=f"{1546000000 - i * 10 + j}.0", order_date=date)
+            on_orders_insert(order, db)
+    archive_account(token, db, "20190301")
+    return token
+
+
+def expected(flt_dates=DATES):
+    return [get_orders_cursor(d) for d in sorted(
+        ({'order_date': date, 'order_id': f"{1546000000 - i * 10 + j}.0"}
+         for i, date in enumerate(DATES) if date in flt_dates for j in range(2)),
+        key=lambda d: (d['order_date'], d['order_id']))]
+
+
+def read_pages(token, db, flt=None, limit=3):
+    """逐页读取直到没有下一页"""
+    keys, cursor, pages = [], None, 0
+    while True:
+        page, cursor = query_orders_page(token, db, flt, cursor, limit)
+        keys.extend(get_orders_cursor(d) for d in page)
+        pages += 1
+        if cursor is None:
+            return keys, pages
+
+
+def test_pages_cover_archive_and_db_in_order(db, account):
+    assert len(list(iter_archive('orders', account))) == 8
+    keys, pages = read_pages(account, db)
+    assert keys == expected()
+    assert pages == (len(DATES) * 2 + 2) // 3
+
+
+@pytest.mark.parametrize("limit", [1, 4, 16, 100])
+def test_page_size(db, account, limit):
+    keys, pages = read_pages(account, db, limit=limit)
+    assert keys == expected()
+
+
+def test_pages_with_date_range(db, account):
+    flt = {"order_date": {"$gte": "20190215", "$lte": "20190315"}}
+    keys, _ = read_pages(account, db, flt, limit=1)
+    assert keys == expected(["20190220", "20190310"])
+
+
+def test_cursor_skips_earlier_orders(db, account):
+    cursor = expected()[5]
+    orders = list(iter_orders_sorted(account, db, cursor=cursor))
+    assert [get_orders_cursor(d) for d in orders] == expected()[6:]
+
+
+class TestOrdersView():
+    """/orders接口的分页及逐行输出"""
+
+    @pytest.fixture
+    def client(self, db, account, monkeypatch):
+        flask = pytest.importorskip("flask")
+        from paper_trading.app import views
+
+        monkeypatch.setattr(views, "db", db)
+        app = flask.Flask(__name__)
+        app.register_blueprint(views.blue)
+        return app.test_client()
+
+    def test_json_pages(self, client, account):
+        keys, cursor = [], ""
+        while True:
+            data = client.post("/orders", data={"token": account, "limit": 5, "cursor": cursor}).get_json()
+            assert data['status']
+            keys.extend(get_orders_cursor(d) for d in data['data'])
+            cursor = data['next']
+            if cursor is None:
+                break
+        assert keys == expected()
+
+    def test_ndjson_page(self, client, account):
+        rsp = client.post("/orders", data={"token": account, "limit": 5, "format": "ndjson"})
+        assert rsp.mimetype == "application/x-ndjson"
+        orders = [json.loads(line) for line in rsp.get_data(as_text=True).splitlines()]
+        assert [get_orders_cursor(d) for d in orders] == expected()[:5]
+        assert rsp.headers["X-Next-Cursor"] == expected()[4]
+
+    def test_ndjson_all(self, client, account):
+        rsp = client.post("/orders", data={"token": account, "format": "ndjson"})
+        orders = [json.loads(line) for line in rsp.get_data(as_text=True).splitlines()]
+        assert [get_orders_cursor(d) for d in orders] == expected()
+        assert "X-Next-Cursor" not in rsp.headers
+
+    def test_invalid_limit(self, client, account):
+        data = client.post("/orders", data={"token": account, "limit": "x"}).get_json()
+        assert data['status'] is False
+
+    def test_json_all(self, client, account):
+        data = client.post("/orders", data={"token": account}).get_json()
+        assert data['status'] and len(data['data']) == len(expected())
+
+    @pytest.mark.parametrize("ndjson", [False, True])
+    def test_stream_error_ends_with_error_record(self, client, account, monkeypatch, ndjson):
+        """输出中途读取订单出错时，以错误结束而不是截断"""
+        from paper_trading.app import views
+
+        def broken(*args, **kwargs):
+            yield {'order_date': "20190110", 'order_id': "1.0"}
+            yield {'order_date': "20190110", 'order_id': "2.0"}
+            raise ConnectionError("连接中断")
+
+        monkeypatch.setattr(views, "iter_orders_history", broken)
+        monkeypatch.setattr(views, "iter_orders_sorted", broken)
+
+        form = {"token": account}
+        if ndjson:
+            form["format"] = "ndjson"
+        rsp = client.post("/orders", data=form)
+        body = rsp.get_data(as_text=True)
+
+        if ndjson:
+            lines = [json.loads(line) for line in body.splitlines()]
+            assert [d['order_id'] for d in lines[:2]] == ["1.0", "2.0"]
+            assert lines[-1] == {"status": False, "data": "查询订单失败"}
+        else:
+            data = json.loads(body)
+            assert data['status'] is False and data['error'] == "查询订单失败"
+            assert len(data['data']) == 2
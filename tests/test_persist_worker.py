@@ -0,0 +1,145 @@
+from time import monotonic, sleep
+
+import pytest
+
+from paper_trading.api.memory_db import MemoryDBService
+
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.model import Order
+from paper_trading.utility.constant import Status
+from paper_trading.trade.db_layout import EntityLayoutDB
+from paper_trading.trade.db_model import (
+    on_accounts_add,
+    on_account_avl_update,
+    on_orders_insert,
+    query_account_one,
+    query_order_status
+)
+
+
+@pytest.fixture
+def persist_worker():
+    """PersistWorker依赖pymongo（MongoDB时可使用motor）"""
+    pytest.importorskip("pymongo")
+    from paper_trading.trade.persist_worker import PersistWorker
+    return PersistWorker
+
+
+@pytest.mark.parametrize("layout", [False, True])
+def test_writes_keep_order_per_account(db, persist_worker, layout):
+    if layout:
+        db = EntityLayoutDB(db)
+    tokens = [d['account_id'] for d in on_accounts_add([{}] * 4, db)]
+    errors = []
+    worker = persist_worker(db, concurrency=4, retries=0, on_error=errors.append).start()
+
+    for i in range(200):
+        for token in tokens:
+            worker.submit(on_account_avl_update, {'token': token, 'avl': i})
+
+    assert worker.join(10)
+    for token in tokens:
+        assert query_account_one(token, db)['available'] == 199
+    stats = worker.get_stats()
+    assert stats['written'] == 800 and stats['failed'] == 0 and not errors
+    worker.close()
+
+
+def test_submitted_data_is_copied(memory_db, persist_worker):
+    """提交后修改订单对象不影响已提交的写入"""
+    token = on_accounts_add([{}], memory_db)[0]['account_id']
+    worker = persist_worker(memory_db).start()
+
+    order = Order(code="000001", exchange="SZ", account_id=token, order_id="1.0",
+                  status=Status.NOTTRADED.value)
+    worker.submit(on_orders_insert, order)
+    order.status = Status.ALLTRADED.value
+    worker.close()
+
+    assert query_order_status(token, "1.0", memory_db) == (True, Status.NOTTRADED.value)
+
+
+def test_failed_write_is_reported(memory_db, persist_worker):
+    errors = []
+    worker = persist_worker(memory_db, retries=1, on_error=errors.append).start()
+
+    # 数据服务不可用，写入失败
+    worker._target = object()
+    worker.submit(on_account_avl_update, {'token': "token", 'avl': 1})
+    worker.close()
+    assert len(errors) == 1 and worker.get_stats()['failed'] == 1
+
+
+class RecordingWorker():
+    """记录等待次数的异步持久化"""
+
+    def __init__(self):
+        self.joins = 0
+
+    def join(self, timeout=None):
+        self.joins += 1
+        return True
+
+
+def test_order_queries_see_unpersisted_orders(memory_db):
+    """已登录账户刚提交的订单尚未写入数据库时，撤单及状态查询从内存中查到订单"""
+    pytest.importorskip("pandas")
+    from paper_trading.event import EventEngine
+    from paper_trading.utility.constant import LoadDataMode
+    from paper_trading.trade.account_engine import AccountEngine
+
+    token = on_accounts_add([{}], memory_db)[0]['account_id']
+    worker = RecordingWorker()
+    engine = AccountEngine(EventEngine(), True, LoadDataMode.TRADING, memory_db,
+                           persist_worker=worker)
+    engine.login(token)
+
+    order = Order(code="000001", exchange="SZ", account_id=token, order_id="1.0",
+                  status=Status.NOTTRADED.value)
+    engine.trader_dict[token].orders[order.order_id] = order
+
+    assert engine.query_order_status(token, "1.0") == (True, Status.NOTTRADED.value)
+    assert engine.query_order_one(token, "1.0")[1]['code'] == "000001"
+    assert worker.joins == 0
+
+    # 内存中没有的订单等待写入完成后从数据库查询
+    assert engine.query_order_status(token, "2.0")[0] is False
+    assert worker.joins == 1
+
+
+class FailingUpdateDB(MemoryDBService):
+    """指定集合更新失败的内存数据服务"""
+
+    def __init__(self, db_cl: str = None):
+        super().__init__()
+        self.db_cl = db_cl
+
+    def on_update(self, pt_db):
+        if pt_db.db_cl == self.db_cl:
+            raise ConnectionError("连接中断")
+        return super().on_update(pt_db)
+
+
+def test_retry_wait_does_not_block_other_collections(persist_worker):
+    """一个集合写入失败等待重试时，不占用写入数量，其他集合的写入继续执行"""
+    db = FailingUpdateDB()
+    db.connect_db()
+    failing, other = [d['account_id'] for d in on_accounts_add([{}] * 2, db)]
+    db.db_cl = failing
+
+    errors = []
+    worker = persist_worker(db, concurrency=1, retries=2, on_error=errors.append)
+    worker.retry_delay = 1
+    worker.start()
+
+    worker.submit(on_account_avl_update, {'token': failing, 'avl': 1})
+    worker.submit(on_account_avl_update, {'token': other, 'avl': 1})
+
+    # 失败的写入重试完毕需要3秒，其他集合的写入不等待重试
+    deadline = monotonic() + 1
+    while query_account_one(other, db)['available'] != 1:
+        assert monotonic() < deadline
+        sleep(0.01)
+
+    worker.close()
+    assert len(errors) == 1 and worker.get_stats()['failed'] == 1
@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+from paper_trading.api import quote_bus
+from paper_trading.api.quote_bus import QuoteBus, RECORD, SEQ, PID, PID_OFFSET
+
+
+@pytest.fixture
+def bus():
+    writer = QuoteBus(f"ptqb_{uuid.uuid4().hex[:8]}", create=True, capacity=8, max_symbols=4)
+    yield writer
+    writer.close(unlink=True)
+
+
+def test_publish_and_read(bus):
+    reader = QuoteBus(bus.name)
+    for i in range(10):
+        bus.publish("000001.SZ", 10.0 + i, 9.9, 10.1)
+    bus.publish("600000.SH", 8.0, 7.9, 8.1)
+
+    assert reader.get_quote("000001.SZ")['last'] == 19.0
+    assert reader.get_quote("600000.SH")['symbol'] == "600000.SH"
+    assert reader.get_quote("000002.SZ") is None
+
+    quotes, seq = reader.read(0)
+    assert seq == 11
+    assert [q['seq'] for q in quotes] == list(range(4, 12))
+
+    quotes, seq = reader.read(10)
+    assert [q['last'] for q in quotes] == [8.0]
+    reader.close()
+
+
+def test_symbol_limit(bus):
+    for i in range(4):
+        assert bus.publish(f"00000{i}.SZ", 1.0, 1.0, 1.0)
+    assert not bus.publish("000009.SZ", 1.0, 1.0, 1.0)
+
+
+def test_stuck_odd_sequence_returns_none(bus):
+    """写入方在写入过程中退出，记录序号一直为奇数时读取不会无限重试"""
+    bus.publish("000001.SZ", 10.0, 9.9, 10.1)
+    reader = QuoteBus(bus.name)
+    offset = reader._latest_offset + reader.get_symbol_id("000001.SZ") * RECORD.size
+    SEQ.pack_into(bus.buf, offset, 3)
+
+    assert reader.get_quote("000001.SZ", retries=10) is None
+    assert reader.get_quote("000001.SZ") is None
+    reader.close()
+
+
+def test_live_writer_segment_is_not_reclaimed(bus):
+    with pytest.raises(FileExistsError):
+        QuoteBus(bus.name, create=True, capacity=8, max_symbols=4)
+
+    # 原写入方的共享内存未被释放
+    bus.publish("000001.SZ", 10.0, 9.9, 10.1)
+    reader = QuoteBus(bus.name)
+    assert reader.get_quote("000001.SZ")['last'] == 10.0
+    reader.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows的共享内存随进程退出释放")
+def test_stale_segment_is_reclaimed():
+    """写入进程已退出时释放遗留的共享内存并重建"""
+    name = f"ptqb_{uuid.uuid4().hex[:8]}"
+    old = QuoteBus(name, create=True, capacity=8, max_symbols=4)
+    old.publish("000001.SZ", 10.0, 9.9, 10.1)
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    PID.pack_into(old.buf, PID_OFFSET, dead.pid)
+    old.close()
+
+    writer = QuoteBus(name, create=True, capacity=8, max_symbols=4)
+    try:
+        assert writer.get_quote("000001.SZ") is None
+        writer.publish("000001.SZ", 11.0, 10.9, 11.1)
+        assert writer.get_quote("000001.SZ")['last'] == 11.0
+    finally:
+        writer.close(unlink=True)
+
+
+def test_bus_requires_shared_memory(monkeypatch):
+    """没有共享内存模块时（Python 3.8以下）模块仍可导入，开启行情总线时报错"""
+    monkeypatch.setattr(quote_bus, "shared_memory", None)
+    with pytest.raises(ImportError):
+        QuoteBus("pt_test_bus_none", create=True)
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from paper_trading.trade import snapshot
+from paper_trading.trade.snapshot import (
+    HEADER,
+    write_snapshot,
+    read_snapshot,
+    clear_final,
+    get_snapshot_date
+)
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.model import Account, Order
+from paper_trading.utility.constant import Status
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    traders = {'a': {'orders': {'1': 1}}, 'b': {'orders': {}}}
+    write_snapshot(path, traders, final=True)
+
+    final, created, data = read_snapshot(path)
+    assert final and data == traders
+    assert get_snapshot_date(created) == datetime.now().strftime("%Y%m%d")
+
+
+def test_clear_final(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    write_snapshot(path, {}, final=True)
+    clear_final(path)
+    assert read_snapshot(path)[0] is False
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    write_snapshot(path, {'a': list(range(100))})
+    with open(path, "r+b") as f:
+        f.seek(HEADER.size + 10)
+        f.write(b"\xff\xff")
+    assert read_snapshot(path) is None
+
+
+def test_truncated_snapshot_is_ignored(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    write_snapshot(path, {'a': list(range(100))})
+    with open(path, "r+b") as f:
+        f.truncate(HEADER.size + 5)
+    assert read_snapshot(path) is None
+    assert read_snapshot(str(tmp_path / "missing.bin")) is None
+
+
+def make_traders(order_date: str):
+    """一个账户的快照数据，包含一个未成交订单"""
+    import pandas as pd
+
+    account = Account(account_id="token")
+    order = Order(code="000001", exchange="SZ", account_id="token", order_id="1.0",
+                  order_date=order_date, status=Status.NOTTRADED.value)
+    return {'token': {'account': account,
+                      'pos': {},
+                      'orders': {order.order_id: order},
+                      'account_record': pd.DataFrame(),
+                      'pos_record': pd.DataFrame()}}
+
+
+@pytest.fixture
+def account_engine(memory_db, tmp_path):
+    pytest.importorskip("pandas")
+    from paper_trading.event import EventEngine
+    from paper_trading.utility.constant import LoadDataMode
+    from paper_trading.trade.account_engine import AccountEngine
+
+    SETTINGS['SNAPSHOT_PATH'] = str(tmp_path / "snapshot.bin")
+    return AccountEngine(EventEngine(), True, LoadDataMode.TRADING, memory_db)
+
+
+def test_trading_restart_next_day_ignores_snapshot(account_engine, monkeypatch):
+    """跨日重启时不使用前一日的快照，当日订单为空"""
+    yesterday = datetime.now() - timedelta(days=1)
+    monkeypatch.setattr(snapshot, "time", lambda: yesterday.timestamp())
+    write_snapshot(SETTINGS['SNAPSHOT_PATH'], make_traders(yesterday.strftime("%Y%m%d")), final=True)
+
+    assert account_engine.load_snapshot() is None
+    assert not account_engine.trader_dict
+
+
+def test_trading_restart_same_day_keeps_only_today_orders(account_engine):
+    today = datetime.now().strftime("%Y%m%d")
+    traders = make_traders(today)
+    stale = make_traders("20000101")['token']['orders']['1.0']
+    stale.order_id = "0.5"
+    traders['token']['orders'][stale.order_id] = stale
+    write_snapshot(SETTINGS['SNAPSHOT_PATH'], traders, final=True)
+
+    orders_book = account_engine.load_snapshot()
+    assert list(orders_book) == ["1.0"]
+    assert list(account_engine.trader_dict['token'].orders) == ["1.0"]
+
+
+def test_trader_snapshot_is_copied_under_lock(memory_db):
+    """快照复制交易员数据，保存后撮合线程对订单的修改不影响快照"""
+    pytest.importorskip("pandas")
+    from threading import Thread
+    from paper_trading.event import EventEngine
+    from paper_trading.utility.constant import LoadDataMode
+    from paper_trading.trade.account import Trader
+    from paper_trading.trade.db_model import on_account_add
+
+    account = on_account_add({}, memory_db)
+    trader = Trader(EventEngine(), account, False, LoadDataMode.CREAT, memory_db)
+    trader.load_snapshot(make_traders("20190101")['token'])
+
+    snapshots = []
+    with trader.lock:
+        thread = Thread(target=lambda: snapshots.append(trader.get_snapshot()))
+        thread.start()
+        thread.join(0.2)
+        assert not snapshots
+        trader.orders["1.0"].status = Status.ALLTRADED.value
+    thread.join()
+
+    data = snapshots[0]
+    assert data['orders']["1.0"].status == Status.ALLTRADED.value
+    trader.orders["1.0"].status = Status.CANCELLED.value
+    assert data['orders']["1.0"].status == Status.ALLTRADED.value
@@ -0,0 +1,59 @@
+import pytest
+
+from paper_trading.utility.model import DBData
+from paper_trading.api.sqlite_db import to_sql
+
+DOCS = [
+    {'n': 0, 'code': "000001", 'price': 10.0, 'status': "done"},
+    {'n': 1, 'code': "000002", 'price': None, 'status': "done"},
+    {'n': 2, 'code': "600000", 'price': 8.5},
+    {'n': 3, 'code': "600001", 'price': 12.0, 'status': None},
+    {'n': 4, 'code': "000003", 'status': "open"},
+]
+
+FILTERS = [
+    {},
+    {'code': "000001"},
+    {'price': {'$ne': None}},
+    {'status': {'$ne': None}},
+    {'status': {'$ne': "done"}},
+    {'price': {'$gt': 9}},
+    {'price': {'$gte': 8.5, '$lt': 12}},
+    {'price': {'$lte': None}},
+    {'code': {'$in': ["000001", "600000", "999999"]}},
+    {'status': {'$exists': False}},
+    {'status': {'$exists': True, '$ne': None}},
+    {'$or': [{'code': "000001"}, {'price': {'$gt': 11}}]},
+    {'$and': [{'price': {'$ne': None}}, {'code': {'$ne': "000001"}}]},
+    {'$or': [{'status': {'$exists': False}}, {'price': None}]},
+]
+
+
+def select(db, flt):
+    pt_db = DBData(db_name="test", db_cl="docs", raw_data={'flt': flt, 'sort': [('n', 1)]})
+    return [d['n'] for d in db.on_select(pt_db)]
+
+
+@pytest.mark.parametrize("flt", FILTERS)
+def test_filter_matches_memory_backend(memory_db, sqlite_db, flt):
+    for db in (memory_db, sqlite_db):
+        db.on_insert_many(DBData(db_name="test", db_cl="docs",
+                                 raw_data={'data': [dict(d) for d in DOCS]}))
+    assert select(sqlite_db, flt) == select(memory_db, flt)
+
+
+def test_ne_none_is_not_null():
+    where, params, exact = to_sql({'price': {'$ne': None}})
+    assert where == "json_extract(doc, '$.price') IS NOT NULL"
+    assert params == [] and exact
+
+
+def test_ne_value_matches_missing_field():
+    where, params, exact = to_sql({'status': {'$ne': "done"}})
+    assert "IS NULL OR" in where and params == ["done"] and exact
+
+
+def test_untranslatable_filter_is_not_exact():
+    where, params, exact = to_sql({'status': {'$exists': False}, 'code': "000001"})
+    assert where == "json_extract(doc, '$.code') = ?" and params == ["000001"]
+    assert not exact
@@ -0,0 +1,97 @@
+import random
+from threading import Event as Signal
+
+from paper_trading.event import EventEngine, EVENT_TIMER
+from paper_trading.event.timer import TimerHandle, TimerWheel, WHEEL_SIZE, WHEEL_LEVELS
+
+
+def make_handles(deadlines):
+    return [TimerHandle(deadline, None, ()) for deadline in deadlines]
+
+
+def test_timers_expire_at_deadline_in_order():
+    rng = random.Random(7)
+    wheel = TimerWheel()
+    deadlines = [rng.randint(1, 300000) for i in range(2000)]
+    handles = make_handles(deadlines)
+    for handle in handles:
+        wheel.add(handle)
+
+    current = 0
+    expired = []
+    while wheel.count:
+        next_tick = wheel.next_tick()
+        # 下次唤醒时间不晚于最早到期的定时器
+        assert next_tick <= min(h.deadline for h in handles if h._slot is not None)
+        target = current + rng.randint(1, 5000)
+        for handle in wheel.advance(target):
+            assert current < handle.deadline <= target
+            expired.append(handle.deadline)
+        current = target
+
+    assert expired == sorted(deadlines)
+    assert wheel.next_tick() is None
+
+
+def test_overflow_timers_cascade():
+    span = WHEEL_SIZE ** WHEEL_LEVELS
+    wheel = TimerWheel()
+    far = TimerHandle(span + 10, None, ())
+    wheel.add(far)
+    assert far._level is None
+
+    assert wheel.advance(span + 9) == []
+    assert wheel.advance(span + 10) == [far]
+
+
+def test_removed_timer_never_expires():
+    wheel = TimerWheel()
+    keep, drop = make_handles([100, 100])
+    wheel.add(keep)
+    wheel.add(drop)
+    wheel.remove(drop)
+    wheel.remove(drop)
+
+    assert wheel.advance(200) == [keep]
+    assert wheel.count == 0
+
+
+def test_due_timer_fires_next_tick():
+    wheel = TimerWheel(current=50)
+    handle = TimerHandle(10, None, ())
+    wheel.add(handle)
+    assert handle.deadline == 51 and wheel.advance(51) == [handle]
+
+
+def test_engine_call_later_and_every():
+    engine = EventEngine(timer_tick=0.005)
+    calls = []
+    done = Signal()
+
+    def tick(name):
+        calls.append(name)
+        if calls.count("every") == 3:
+            done.set()
+
+    engine.start()
+    try:
+        handle = engine.call_every(0.01, tick, "every")
+        engine.call_later(0.01, tick, "later")
+        engine.call_later(0.01, tick, "cancelled").cancel()
+        assert done.wait(5)
+        handle.cancel()
+    finally:
+        engine.stop()
+
+    assert "later" in calls and "cancelled" not in calls
+
+
+def test_timer_event_only_with_handler():
+    engine = EventEngine(interval=1)
+    assert engine._timer_event is None
+
+    handler = lambda event: None
+    engine.register(EVENT_TIMER, handler)
+    assert engine._timer_event is not None
+    engine.unregister(EVENT_TIMER, handler)
+    assert engine._timer_event is None
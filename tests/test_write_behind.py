@@ -0,0 +1,148 @@
+from threading import Thread, Event
+
+import pytest
+
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.model import Order
+from paper_trading.utility.constant import Status, OrderType, LoadDataMode
+from paper_trading.trade.write_behind import DirtyTracker, make_flush_ops, flush_trader, mark_all
+from paper_trading.trade.db_model import (
+    on_account_add,
+    iter_pos_records,
+    query_account_one,
+    query_orders
+)
+
+pytest.importorskip("pandas")
+
+
+@pytest.fixture
+def trader(memory_db):
+    """未开启实时持久化的交易员"""
+    from paper_trading.event import EventEngine
+    from paper_trading.trade.account import Trader
+
+    account = on_account_add({}, memory_db)
+    return Trader(EventEngine(), account, False, LoadDataMode.TRADING, memory_db)
+
+
+def buy_order(token, volume=100, price=10.0):
+    return Order(code="000001", exchange="SZ", account_id=token, order_type=OrderType.BUY.value,
+                 volume=volume, order_price=price, order_date="20190101",
+                 status=Status.SUBMITTING.value)
+
+
+def test_dirty_tracker_swap_and_restore():
+    dirty = DirtyTracker()
+    dirty.mark_order("1")
+    dirty.mark_order("1")
+    dirty.mark_pos("000001.SZ")
+
+    swapped = dirty.swap()
+    assert not dirty and swapped.orders == {"1"} and swapped.pos == {"000001.SZ"}
+
+    dirty.mark_order("2")
+    dirty.restore(swapped)
+    assert dirty.orders == {"1", "2"} and dirty.pos == {"000001.SZ"}
+
+
+def test_flush_ops_write_latest_state_once(trader):
+    status, order = trader.on_orders_arrived(buy_order(trader.token))
+    assert status
+    order.status = Status.CANCELLED.value
+    trader.on_order_cancel(order)
+
+    ops = make_flush_ops(trader, trader.dirty.swap())
+    assert [op[0] for op in ops[SETTINGS['ACCOUNT_DB']]] == ['replace']
+    order_ops = ops[SETTINGS['TRADE_DB']]
+    assert len(order_ops) == 1 and order_ops[0][2]['status'] == Status.CANCELLED.value
+
+
+def test_flush_and_mark_all(trader, memory_db):
+    status, order = trader.on_orders_arrived(buy_order(trader.token))
+    assert flush_trader(trader, memory_db) == 2
+    assert flush_trader(trader, memory_db) == 0
+    assert query_orders(token=trader.token, db=memory_db)[0]['order_id'] == order.order_id
+
+    mark_all(trader)
+    assert trader.dirty.account and trader.dirty.orders == {order.order_id}
+
+
+def test_failed_flush_keeps_dirty(trader):
+    trader.on_orders_arrived(buy_order(trader.token))
+
+    with pytest.raises(AttributeError):
+        flush_trader(trader, object())
+    assert trader.dirty.account and trader.dirty.orders
+
+
+def test_flush_waits_for_trader_lock(trader, memory_db):
+    """撮合线程修改交易员数据时，定时持久化等待修改完成"""
+    trader.on_orders_arrived(buy_order(trader.token))
+    done = Event()
+
+    def flush():
+        flush_trader(trader, memory_db)
+        done.set()
+
+    with trader.lock:
+        thread = Thread(target=flush)
+        thread.start()
+        assert not done.wait(0.2)
+    assert done.wait(5)
+    thread.join()
+
+
+def test_concurrent_flush_matches_memory(trader, memory_db):
+    """交易与定时持久化同时进行，最终数据库与内存一致"""
+    stop = Event()
+
+    def flush():
+        while not stop.is_set():
+            flush_trader(trader, memory_db)
+
+    thread = Thread(target=flush)
+    thread.start()
+    try:
+        for i in range(200):
+            status, order = trader.on_orders_arrived(buy_order(trader.token, price=1.0))
+            if i % 2:
+                order.status = Status.CANCELLED.value
+                trader.on_order_cancel(order)
+    finally:
+        stop.set()
+        thread.join()
+    flush_trader(trader, memory_db)
+
+    assert query_account_one(trader.token, memory_db)['available'] == trader.account.available
+    orders = {d['order_id']: d['status'] for d in query_orders(token=trader.token, db=memory_db)}
+    assert orders == {k: v.status for k, v in trader.orders.items()}
+
+
+def pos_record(pos_id=None, profit=0.0):
+    record = dict(code="000001", exchange="SZ", pt_symbol="000001.SZ", account_id="token",
+                  first_buy_date="20190102", last_sell_date="20190102", max_vol=100,
+                  buy_price_mean=10.0, sell_price_mean=10.5, profit=profit, is_clear=1)
+    if pos_id is not None:
+        record['pos_id'] = pos_id
+    return record
+
+
+def test_same_day_pos_records_are_flushed_separately(trader, memory_db):
+    """T0交易同一天清仓后再次建仓，两条持仓记录分别写入，旧数据没有编号时按日期写入"""
+    import pandas as pd
+
+    trader.pos_record = pd.DataFrame([pos_record(), pos_record("1.0", 1.0), pos_record("2.0", 2.0)])
+    trader.pos_record.loc[0, 'pos_id'] = None
+    mark_all(trader)
+    assert len(trader.dirty.pos_records) == 3
+
+    flush_trader(trader, memory_db)
+    records = list(iter_pos_records(trader.token, memory_db))
+    assert sorted(d['profit'] for d in records) == [0.0, 1.0, 2.0]
+
+    trader.pos_record.loc[1, 'profit'] = 5.0
+    trader.dirty.mark_pos_record("1.0")
+    flush_trader(trader, memory_db)
+    records = list(iter_pos_records(trader.token, memory_db))
+    assert sorted(d['profit'] for d in records) == [0.0, 2.0, 5.0]
@@ -1,17 +1,20 @@
 
 import copy
 import time
+from functools import wraps
+from threading import RLock
+
 import pandas as pd
 
 from paper_trading.event import Event
 from paper_trading.utility.event import *
 from paper_trading.utility.setting import SETTINGS
+from paper_trading.trade.write_behind import DirtyTracker, get_pos_record_key
 from paper_trading.trade.db_model import (
-    query_position,
-    query_orders,
-    query_orders_today,
-    query_account_record,
-    query_pos_records,
+    iter_position,
+    iter_orders,
+    iter_account_record,
+    iter_pos_records,
     query_pos_records_not_clear
 )
 from paper_trading.utility.constant import (
@@ -34,6 +37,15 @@ from paper_trading.utility.model import (
 P = SETTINGS["POINT"]
 
 
+def locked(func):
+    """在交易员锁中执行，交易员数据的修改、定时持久化及快照不会同时进行"""
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
 class Trader:
     """交易员"""
 
@@ -42,10 +54,16 @@ class Trader:
                  account_dict: dict,
                  pst_active,
                  load_data_mode,
-                 db):
+                 db,
+                 journal=None):
         """构造函数"""
         self.event_engine = event_engine            # 事件引擎
         self.__pst_active = pst_active              # 数据持久化开关
+        self.__journal = journal                    # 事件日志
+        # 数据变更记录，未开启实时持久化时用于定时或手动持久化
+        self.dirty = None if pst_active else DirtyTracker()
+        # 交易员锁：撮合线程、web线程修改数据与定时器线程持久化、保存快照时互斥
+        self.lock = RLock()
         account = account_generate(account_dict)
         self.token = account.account_id
         self.account = account
@@ -78,39 +96,57 @@ class Trader:
         else:
             raise ValueError("数据加载模式错误")
 
+    @locked
+    def get_snapshot(self):
+        """
+        交易员数据快照：账户、持仓、订单、账户记录及持仓记录
+        在交易员锁中复制数据，保存快照时撮合线程对数据的修改不影响快照
+        """
+        return {
+            'account': copy.copy(self.account),
+            'pos': {k: copy.copy(v) for k, v in self.pos.items()},
+            'orders': {k: copy.copy(v) for k, v in self.orders.items()},
+            'account_record': self.account_record.copy(),
+            'pos_record': self.pos_record.copy()
+        }
+
+    @locked
+    def load_snapshot(self, data: dict):
+        """从快照恢复交易员数据"""
+        self.account = data['account']
+        self.pos = data['pos']
+        self.orders = data['orders']
+        self.account_record = data['account_record']
+        self.pos_record = data['pos_record']
+
     def __load_pos(self, db):
         """加载持仓"""
-        data = query_position(self.token, db)
-        if isinstance(data, list):
-            for d in data:
-                pos = pos_generate(d)
-                self.pos[pos.pt_symbol] = pos
+        for d in iter_position(self.token, db):
+            pos = pos_generate(d)
+            self.pos[pos.pt_symbol] = pos
 
     def __load_orders(self, db):
         """加载所有订单数据"""
-        data = query_orders(self.token, db)
-        if isinstance(data, list):
-            for d in data:
-                order = order_generate(d)
-                self.orders[order.order_id] = order
+        for d in iter_orders(self.token, db):
+            order = order_generate(d)
+            self.orders[order.order_id] = order
 
     def __load_today_orders(self, db):
         """加载当日订单"""
-        data = query_orders_today(self.token, db)
-        if isinstance(data, list):
-            for d in data:
-                order = order_generate(d)
-                self.orders[order.order_id] = order
+        today = time.strftime("%Y%m%d", time.localtime())
+        for d in iter_orders(self.token, db, {"order_date": today}):
+            order = order_generate(d)
+            self.orders[order.order_id] = order
 
     def __load_account_records(self, db):
         """加载账户记录"""
-        account_record = query_account_record(self.token, db)
+        account_record = list(iter_account_record(self.token, db))
         if account_record:
             self.account_record = pd.DataFrame(account_record, index=[i for i in range(len(account_record))])
 
     def __load_pos_records(self, db):
         """加载所有持仓记录"""
-        pos_record = query_pos_records(self.token, db)
+        pos_record = list(iter_pos_records(self.token, db))
         if pos_record:
              self.pos_record = pd.DataFrame(pos_record, index=[i for i in range(len(pos_record))])
 
@@ -122,11 +158,51 @@ class Trader:
 
     def __make_event(self, event_name, data):
         """制造事件"""
-        if self.__pst_active:
+        # 记录变更的数据，用于定时或手动持久化
+        if self.dirty is not None:
+            self.__mark_dirty(event_name, data)
+
+        if self.__pst_active or self.__journal:
             new_data = copy.deepcopy(data)
-            event = Event(event_name, new_data)
-            self.event_engine.put(event)
 
+            # 写入事件日志
+            if self.__journal:
+                self.__journal.write(event_name, new_data)
+
+            if self.__pst_active:
+                event = Event(event_name, new_data)
+                self.event_engine.put(event)
+
+    def __mark_dirty(self, event_name, data):
+        """记录变更的数据"""
+        if event_name in (EVENT_ACCOUNT_UPDATE,
+                          EVENT_ACCOUNT_AVL_UPDATE,
+                          EVENT_ACCOUNT_ASSETS_UPDATE):
+            self.dirty.mark_account()
+        elif event_name in (EVENT_POS_INSERT, EVENT_POS_UPDATE):
+            self.dirty.mark_pos(data.pt_symbol)
+        elif event_name in (EVENT_POS_AVL_UPDATE,
+                            EVENT_POS_PRICE_UPDATE,
+                            EVENT_POS_DELETE):
+            self.dirty.mark_pos(data['symbol'])
+        elif event_name in (EVENT_ORDER_INSERT, EVENT_ORDER_UPDATE):
+            self.dirty.mark_order(data.order_id)
+        elif event_name == EVENT_ORDER_STATUS_UPDATE:
+            self.dirty.mark_order(data['id'])
+        elif event_name == EVENT_ACCOUNT_RECORD_INSERT:
+            self.dirty.mark_account_record(data.check_date)
+        elif event_name == EVENT_POS_RECORD_INSERT:
+            self.dirty.mark_pos_record(get_pos_record_key(data.__dict__))
+        elif event_name in (EVENT_POS_RECORD_BUY,
+                            EVENT_POS_RECORD_SELL,
+                            EVENT_POS_RECORD_CLEAR):
+            # 变更的持仓记录为该证券最新的一条持仓记录
+            df = self.pos_record
+            index = df.loc[df['pt_symbol'] == data['symbol']].index.tolist()
+            if index:
+                self.dirty.mark_pos_record(get_pos_record_key(df.loc[index[-1]].to_dict()))
+
+    @locked
     def on_orders_arrived(self, order: Order):
         """订单到达"""
         # 接收订单前的验证
@@ -151,6 +227,7 @@ class Trader:
 
         return True, order
 
+    @locked
     def on_order_deal(self, order: Order):
         """订单成交处理"""
         # 买入处理
@@ -174,11 +251,13 @@ class Trader:
         # 订单更新事件
         self.__make_event(EVENT_ORDER_UPDATE, order)
 
+    @locked
     def on_order_cancel(self, order: Order):
         """取消订单"""
         order.status = Status.CANCELLED.value
         self.on_order_refuse(order)
 
+    @locked
     def on_order_refuse(self, order: Order):
         """拒绝订单"""
         # 更新订单
@@ -198,6 +277,7 @@ class Trader:
         else:
             return self.__on_sell_cancel(self.orders[order.order_id])
 
+    @locked
     def on_order_status_update(self, order: Order):
         """更新订单状态信息"""
         self.orders[order.order_id].status = order.status
@@ -310,7 +390,8 @@ class Trader:
             max_vol=pos.volume,
             buy_price_mean=pos.buy_price,
             sell_price_mean=0.0,
-            profit=pos.profit
+            profit=pos.profit,
+            pos_id=order.order_id
         )
         df = pd.DataFrame(pos_record.__dict__, index=[len(self.pos_record)])
         self.pos_record = self.pos_record.append(df)
@@ -425,6 +506,7 @@ class Trader:
 
         return pos_val_diff
 
+    @locked
     def on_position_update_price(self, pos, price: float):
         """更新持仓价格"""
         volume = pos.volume
@@ -576,6 +658,7 @@ class Trader:
 
     """清算"""
 
+    @locked
     def on_liquidation(self, liq_date: str, price_dict: dict = None):
         """清算"""
         # 更新所有持仓最新价格并冻结证券，并更新市值
@@ -746,6 +829,7 @@ def pos_record_generate(d: dict):
         buy_price_mean=d['buy_price_mean'],
         sell_price_mean=d['sell_price_mean'],
         profit=d['profit'],
-        is_clear=d['is_clear']
+        is_clear=d['is_clear'],
+        pos_id=d.get('pos_id') or ""
     )
     return pos_record
\ No newline at end of file
@@ -1,12 +1,28 @@
 
 import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from paper_trading.utility.model import LogData
+from paper_trading.utility.setting import SETTINGS
 from paper_trading.utility.constant import Status, LoadDataMode
-from paper_trading.event import Event
+from paper_trading.event import Event, PutPolicy
 from paper_trading.utility.event import *
 from paper_trading.trade.db_model import *
 from paper_trading.trade.account import Trader, order_generate
+from paper_trading.trade.journal import replay_journal
+from paper_trading.trade.archive import iter_archive, merge_archive
+from paper_trading.trade.write_behind import flush_trader, mark_all
+from paper_trading.trade.snapshot import write_snapshot, read_snapshot, clear_final, get_snapshot_date
+
+
+def account_partition_key(event: Event):
+    """事件分区键：按账户token分配事件引擎的工作线程"""
+    data = event.data
+    if isinstance(data, dict):
+        return data.get('token')
+    else:
+        return getattr(data, 'account_id', None)
 
 
 class AccountEngine():
@@ -17,11 +33,19 @@ class AccountEngine():
             pst_active,
             load_data_mode,
             db,
+            journal=None,
+            write_behind=False,
+            persist_worker=None
     ):
         self.event_engine = event_engine        # 事件引擎
         self.db = db                            # 数据库实例
         self.pst_active = pst_active            # 数据持久化开关
         self.load_data_mode = load_data_mode    # 加载数据的模式
+        self.journal = journal                  # 事件日志
+        self.write_behind = write_behind        # 定时持久化开关
+        self.persist_worker = persist_worker    # 异步持久化
+        self._flush_timer = None                # 定时持久化定时器
+        self._snapshot_timer = None             # 快照定时器
 
         # 交易账户字典
         self.trader_dict = dict()               # 交易账户字典
@@ -33,54 +57,243 @@ class AccountEngine():
 
     def event_register(self):
         """注册事件监听"""
-        self.event_engine.register(EVENT_ACCOUNT_UPDATE, self.process_account_update)
-        self.event_engine.register(EVENT_ACCOUNT_AVL_UPDATE, self.process_account_avl_update)
-        self.event_engine.register(EVENT_ACCOUNT_ASSETS_UPDATE, self.process_account_assets_update)
-        self.event_engine.register(EVENT_POS_INSERT, self.process_pos_insert)
-        self.event_engine.register(EVENT_POS_UPDATE, self.process_pos_update)
-        self.event_engine.register(EVENT_POS_AVL_UPDATE, self.process_pos_avl_update)
-        self.event_engine.register(EVENT_POS_PRICE_UPDATE, self.process_pos_price_update)
-        self.event_engine.register(EVENT_POS_DELETE, self.process_pos_delete)
-        self.event_engine.register(EVENT_ORDER_INSERT, self.process_order_insert)
-        self.event_engine.register(EVENT_ORDER_UPDATE, self.process_order_update)
-        self.event_engine.register(EVENT_ORDER_STATUS_UPDATE, self.process_order_status_update)
-        self.event_engine.register(EVENT_ACCOUNT_RECORD_INSERT, self.process_account_record_insert)
-        self.event_engine.register(EVENT_POS_RECORD_INSERT, self.process_pos_record_insert)
-        self.event_engine.register(EVENT_POS_RECORD_BUY, self.process_pos_record_buy)
-        self.event_engine.register(EVENT_POS_RECORD_SELL, self.process_pos_record_sell)
-        self.event_engine.register(EVENT_POS_RECORD_CLEAR, self.process_pos_record_clear)
+        assets_key = lambda event: event.data['token']
+        price_key = lambda event: (event.data['token'], event.data['symbol'])
+        coalesce_keys = {
+            EVENT_ACCOUNT_ASSETS_UPDATE: assets_key,
+            EVENT_POS_PRICE_UPDATE: price_key
+        }
+
+        for event_type, handler in self.get_handlers().items():
+            self.event_engine.register(event_type, handler,
+                                       coalesce_key=coalesce_keys.get(event_type))
+
+        if self.write_behind:
+            self.event_engine.register(EVENT_PERSISTANCE_FLUSH, self.process_persistance_flush)
+
+        # 事件队列已满时，行情驱动的更新事件只保留最新的一条，其余事件阻塞等待
+        self.event_engine.set_policy(EVENT_ACCOUNT_ASSETS_UPDATE, PutPolicy.COALESCE, assets_key)
+        self.event_engine.set_policy(EVENT_POS_PRICE_UPDATE, PutPolicy.COALESCE, price_key)
+
+    def get_handlers(self):
+        """数据持久化事件与处理函数的字典"""
+        return {
+            EVENT_ACCOUNT_UPDATE: self.process_account_update,
+            EVENT_ACCOUNT_AVL_UPDATE: self.process_account_avl_update,
+            EVENT_ACCOUNT_ASSETS_UPDATE: self.process_account_assets_update,
+            EVENT_POS_INSERT: self.process_pos_insert,
+            EVENT_POS_UPDATE: self.process_pos_update,
+            EVENT_POS_AVL_UPDATE: self.process_pos_avl_update,
+            EVENT_POS_PRICE_UPDATE: self.process_pos_price_update,
+            EVENT_POS_DELETE: self.process_pos_delete,
+            EVENT_ORDER_INSERT: self.process_order_insert,
+            EVENT_ORDER_UPDATE: self.process_order_update,
+            EVENT_ORDER_STATUS_UPDATE: self.process_order_status_update,
+            EVENT_ACCOUNT_RECORD_INSERT: self.process_account_record_insert,
+            EVENT_POS_RECORD_INSERT: self.process_pos_record_insert,
+            EVENT_POS_RECORD_BUY: self.process_pos_record_buy,
+            EVENT_POS_RECORD_SELL: self.process_pos_record_sell,
+            EVENT_POS_RECORD_CLEAR: self.process_pos_record_clear,
+        }
 
     def start(self):
         """引擎初始化"""
         self.write_log("账户引擎：启动")
 
+        # 开启定时持久化
+        if self.write_behind:
+            self._flush_timer = self.event_engine.call_every(SETTINGS['P_TIMING'],
+                                                             self.put_flush_event)
+
+        # 开启定时快照
+        if SETTINGS.get('SNAPSHOT_PATH') and SETTINGS.get('SNAPSHOT_INTERVAL', 0) > 0:
+            self._snapshot_timer = self.event_engine.call_every(SETTINGS['SNAPSHOT_INTERVAL'],
+                                                                self.save_snapshot)
+
         return self
 
     def load_data(self):
         """
         加载数据
         用于在系统意外停止后，重启时加载数据使用
+        有可用的交易员快照时直接从快照恢复，否则从数据库加载
         :return:
         """
+        orders_book = self.load_snapshot()
+        if orders_book is not None:
+            return orders_book
+
         account_list = query_account_list(self.db)
         orders_book = dict()
-        for account_id in account_list:
-            orders = query_orders_today(account_id, self.db)
-            if isinstance(orders, list):
-                # 加载账户数据
-                self.load_trader_data(account_id)
-
-                # 加载订单数据
-                for order in orders:
-                    order = order_generate(order)
-                    if order.status in [Status.SUBMITTING.value,
-                                           Status.NOTTRADED.value,
-                                           Status.PARTTRADED.value]:
-                        # 未成交的订单添加到订单薄
-                        orders_book[order.order_id] = order
+        for orders in self.load_traders(account_list, self.load_account_orders).values():
+            orders_book.update(orders)
+
+        return orders_book
+
+    def load_account_orders(self, account_id):
+        """加载当日有订单的账户，返回该账户未成交的订单"""
+        orders_book = dict()
+        orders = query_orders_today(account_id, self.db)
+        if isinstance(orders, list):
+            # 加载账户数据
+            self.load_trader_data(account_id)
+
+            # 加载订单数据
+            for order in orders:
+                order = order_generate(order)
+                if order.status in [Status.SUBMITTING.value,
+                                       Status.NOTTRADED.value,
+                                       Status.PARTTRADED.value]:
+                    # 未成交的订单添加到订单薄
+                    orders_book[order.order_id] = order
 
         return orders_book
 
+    def load_traders(self, account_list: list, loader):
+        """
+        并行加载账户
+        账户在线程池中加载，线程数量由LOAD_WORKERS配置，每完成10%输出一次进度；
+        LOAD_FAIL_FAST为True时任一账户加载失败即停止加载并抛出异常，否则跳过失败的账户
+        :param account_list: 账户列表
+        :param loader: 加载单个账户的函数
+        :return: {账户: 加载结果}
+        """
+        workers = max(1, SETTINGS.get('LOAD_WORKERS', 1))
+        fail_fast = SETTINGS.get('LOAD_FAIL_FAST', False)
+        total = len(account_list)
+        step = max(1, total // 10)
+        results = dict()
+        failed = list()
+
+        self.write_log(f"账户引擎：开始加载账户，共计{total}个，线程数{workers}")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(loader, account_id): account_id
+                       for account_id in account_list}
+            for done, future in enumerate(as_completed(futures), 1):
+                account_id = futures[future]
+                try:
+                    results[account_id] = future.result()
+                except Exception as e:
+                    if fail_fast:
+                        for f in futures:
+                            f.cancel()
+                        self.write_log(f"账户引擎：账户{account_id}加载失败，停止加载：{e}",
+                                       level=logging.ERROR)
+                        raise
+                    failed.append(account_id)
+                    self.write_log(f"账户引擎：账户{account_id}加载失败，已跳过：{e}",
+                                   level=logging.ERROR)
+
+                if done % step == 0 or done == total:
+                    self.write_log(f"账户引擎：账户加载进度{done}/{total}")
+
+        self.write_log(f"账户引擎：账户加载完毕，成功{len(results)}个，失败{len(failed)}个")
+        return results
+
+    def save_snapshot(self, final: bool = False):
+        """
+        保存所有交易员的快照
+        :param final: 是否为引擎关闭时生成的最终快照
+        """
+        path = SETTINGS.get('SNAPSHOT_PATH')
+        if not path:
+            return
+
+        try:
+            traders = {token: trader.get_snapshot()
+                       for token, trader in list(self.trader_dict.items())}
+            size = write_snapshot(path, traders, final)
+            self.write_log(f"账户引擎：交易员快照保存完毕，账户{len(traders)}个，大小{size}字节")
+        except Exception as e:
+            self.write_log(f"账户引擎：交易员快照保存失败：{e}", level=logging.ERROR)
+
+    def load_snapshot(self):
+        """
+        从快照恢复交易员
+        只有引擎正常关闭时生成的最终快照与数据库一致，手动持久化模式下数据库并不保存最新数据，
+        因此只在这两种情况下使用快照，快照加载后清除最终快照标志。
+        交易模式与从数据库加载一致，只恢复当日有订单的账户及当日的订单；
+        非当日生成的快照不使用，其中手动持久化的数据先写入数据库，再从数据库加载
+        :return: 未成交订单的订单薄，快照不可用时返回None
+        """
+        path = SETTINGS.get('SNAPSHOT_PATH')
+        if not path:
+            return None
+
+        snapshot = read_snapshot(path)
+        if not snapshot:
+            return None
+
+        final, created, traders = snapshot
+        manual = not self.pst_active and not self.write_behind
+        if not final and not manual:
+            return None
+
+        trading = self.load_data_mode == LoadDataMode.TRADING
+        today = datetime.now().strftime("%Y%m%d")
+        if trading:
+            if get_snapshot_date(created) != today:
+                if not final:
+                    self.persist_snapshot(traders)
+                self.write_log("账户引擎：交易员快照不是当日生成，从数据库加载数据")
+                return None
+
+            for data in traders.values():
+                data['orders'] = {order_id: order for order_id, order in data['orders'].items()
+                                  if order.order_date == today}
+            traders = {token: data for token, data in traders.items() if data['orders']}
+
+        orders_book = dict()
+        for token, data in traders.items():
+            trader = Trader(self.event_engine,
+                            data['account'].__dict__,
+                            self.pst_active,
+                            LoadDataMode.CREAT,
+                            self.db,
+                            self.journal)
+            trader.load_snapshot(data)
+            self.trader_dict[token] = trader
+
+            # 快照中的数据可能尚未保存到数据库，手动持久化时全部写入
+            if not final and trader.dirty is not None:
+                mark_all(trader)
+
+            for order in trader.orders.values():
+                if order.status in [Status.SUBMITTING.value,
+                                    Status.NOTTRADED.value,
+                                    Status.PARTTRADED.value]:
+                    orders_book[order.order_id] = order
+
+        if final:
+            clear_final(path)
+
+        self.write_log(f"账户引擎：从快照恢复交易员{len(traders)}个")
+        return orders_book
+
+    def persist_snapshot(self, traders: dict):
+        """将快照中的交易员数据全部写入数据库"""
+        for token, data in traders.items():
+            trader = Trader(self.event_engine,
+                            data['account'].__dict__,
+                            False,
+                            LoadDataMode.CREAT,
+                            self.db)
+            trader.load_snapshot(data)
+            mark_all(trader)
+            flush_trader(trader, self.db)
+
+    def replay_journal(self, file_name: str):
+        """
+        回放事件日志
+        将日志中的事件按原有顺序交给数据持久化处理函数，用于系统崩溃后补齐数据库中
+        未保存的数据，或在其他数据库中重现某一交易日的数据
+        :param file_name: 日志文件
+        :return: 回放的事件数量
+        """
+        count = replay_journal(file_name, self.get_handlers())
+        self.write_log(f"账户引擎：事件日志回放完毕，共计{count}条")
+        return count
+
     def load_trader_data(self, account_id):
         """加载交易员数据"""
         account = query_account_one(account_id, self.db)
@@ -90,7 +303,8 @@ class AccountEngine():
                             account,
                             self.pst_active,
                             LoadDataMode.TRADING,
-                            self.db)
+                            self.db,
+                            self.journal)
             self.trader_dict[account_id] = trader
 
     def creat(self, info: dict):
@@ -103,10 +317,41 @@ class AccountEngine():
                                  account_dict,
                                  self.pst_active,
                                  LoadDataMode.CREAT,
-                                 self.db)
+                                 self.db,
+                                 self.journal)
                 self.trader_dict[token] = account
                 return account_dict
 
+    def creat_many(self, infos: list):
+        """
+        批量创建账户
+        :param infos: 账户参数列表
+        :return: 账户信息列表
+        """
+        account_list = on_accounts_add(infos, self.db)
+        for account_dict in account_list:
+            token = account_dict['account_id']
+            if not self.trader_dict.get(token):
+                self.trader_dict[token] = Trader(self.event_engine,
+                                                 account_dict,
+                                                 self.pst_active,
+                                                 LoadDataMode.CREAT,
+                                                 self.db,
+                                                 self.journal)
+        return account_list
+
+    def delete_many(self, tokens: list):
+        """
+        批量删除账户，不存在的账户跳过
+        :param tokens: 账户列表
+        :return: 删除成功的账户列表
+        """
+        exist = set(query_account_list(self.db))
+        tokens = [token for token in tokens if token in exist]
+        for token in tokens:
+            self.logout(token)
+        return on_accounts_delete(tokens, self.db)
+
     def login(self, token: str):
         """
         账户登录
@@ -126,7 +371,8 @@ class AccountEngine():
                                  account_dict,
                                  self.pst_active,
                                  self.load_data_mode,
-                                 self.db)
+                                 self.db,
+                                 self.journal)
                 self.trader_dict[token] = account
                 return account_dict
             else:
@@ -137,9 +383,16 @@ class AccountEngine():
 
     def logout(self, token: str):
         """账户登出"""
-        if self.trader_dict.get(token, None):
+        trader = self.trader_dict.get(token, None)
+        if trader:
+            # 定时持久化模式登出前保存未持久化的数据
+            if self.write_behind and trader.dirty:
+                flush_trader(trader, self.db)
             del self.trader_dict[token]
 
+            # 等待已提交的写入完成，之后删除账户数据不会被再次写入
+            self.wait_persist()
+
     def orders_arrived(self, order: Order):
         """订单到达处理"""
         trader = self.trader_dict.get(order.account_id)
@@ -173,15 +426,54 @@ class AccountEngine():
         """清算"""
         today = datetime.now().strftime("%Y%m%d")
 
-        for token, trader in self.trader_dict.items():
-            for symbol, pos in trader.pos.items():
-                hq = hq_client.get_realtime_data(symbol)
-                if hq is not None:
-                    now_price = float(hq.loc[0, "price"])
-                    # 更新收盘行情
-                    trader.on_position_update_price(pos, now_price)
-            # 清算
-            trader.on_liquidation(today)
+        # 批量获取所有持仓证券的收盘价格
+        traders = list(self.trader_dict.values())
+        symbols = [symbol for trader in traders for symbol in list(trader.pos)]
+        prices = self.get_close_prices(hq_client, symbols)
+
+        for trader in traders:
+            with trader.lock:
+                for symbol, pos in trader.pos.items():
+                    # 没有收盘价格的持仓按最新价格清算
+                    now_price = prices.get(symbol)
+                    if now_price:
+                        # 更新收盘行情
+                        trader.on_position_update_price(pos, now_price)
+                # 清算
+                trader.on_liquidation(today)
+
+    def get_close_prices(self, hq_client, symbols: list):
+        """
+        获取清算使用的收盘价格
+        批量获取失败时逐个证券获取，仍获取失败的证券不在结果中
+        :return: {证券代码: 价格}
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+
+        try:
+            quotes = hq_client.get_realtime_quotes(symbols)
+        except Exception as e:
+            self.write_log(f"账户引擎：批量获取收盘行情失败，逐个获取：{e}", level=logging.WARNING)
+            quotes = dict()
+            for symbol in symbols:
+                try:
+                    quotes.update(hq_client.get_realtime_quotes([symbol]))
+                except Exception:
+                    continue
+
+        prices = dict()
+        for symbol in symbols:
+            quote = quotes.get(symbol)
+            if quote:
+                prices[symbol] = float(quote["price"])
+
+        missing = [symbol for symbol in symbols if symbol not in prices]
+        if missing:
+            self.write_log(f"账户引擎：{len(missing)}只证券未获取到收盘行情，按最新价格清算：{missing}",
+                           level=logging.WARNING)
+        return prices
 
     def liq_manual(self, token, liq_date, price_dict):
         """手工清算"""
@@ -203,7 +495,8 @@ class AccountEngine():
         """
         trader = self.trader_dict.get(token, None)
         if trader:
-            account = trader.account
+            with trader.lock:
+                account = copy.copy(trader.account)
             return True, account.__dict__
         else:
             return False, "账户未登录"
@@ -217,22 +510,51 @@ class AccountEngine():
         """
         trader = self.trader_dict.get(token, None)
         if trader:
-            pos = copy.copy(trader.pos)
-            if pos:
-                pos_data = [d.__dict__ for d in pos.values()]
+            with trader.lock:
+                pos_data = [copy.copy(d.__dict__) for d in trader.pos.values()]
+            if pos_data:
                 return True, pos_data
             else:
                 return True, []
         else:
             return False, "账户未登录"
 
+    def query_order_one(self, token: str, order_id: str):
+        """
+        查询一条订单
+        已登录账户的订单从内存中查询，刚提交的订单在写入数据库之前也能查到；
+        否则等待异步持久化的写入完成后从数据库查询
+        """
+        trader = self.trader_dict.get(token)
+        if trader:
+            with trader.lock:
+                order = trader.orders.get(order_id)
+                if order:
+                    return True, copy.copy(order.__dict__)
+
+        self.wait_persist()
+        return query_order_one(token, order_id, self.db)
+
+    def query_order_status(self, token: str, order_id: str):
+        """查询订单状态，查询方式同query_order_one"""
+        trader = self.trader_dict.get(token)
+        if trader:
+            with trader.lock:
+                order = trader.orders.get(order_id)
+                if order:
+                    return True, order.status
+
+        self.wait_persist()
+        return query_order_status(token, order_id, self.db)
+
     def query_orders_today(self, token: str):
         """查询当天交易订单"""
         trader = self.trader_dict.get(token, None)
         if trader:
             orders = list()
-            for d in trader.orders.values():
-                orders.append(d.__dict__)
+            with trader.lock:
+                for d in trader.orders.values():
+                    orders.append(copy.copy(d.__dict__))
 
             if orders:
                 return True, orders
@@ -246,9 +568,10 @@ class AccountEngine():
         # 检查账户登录情况
         trader = self.trader_dict.get(token, None)
         if trader:
-            orders = list()
-            for d in trader.orders.values():
-                orders.append(d.__dict__)
+            with trader.lock:
+                docs = [copy.copy(d.__dict__) for d in trader.orders.values()]
+            # 合并归档的订单，回测模式下内存中已有的订单不重复加入
+            orders = merge_archive('orders', iter_archive('orders', token), docs)
 
             if orders:
                 return True, orders
@@ -262,7 +585,8 @@ class AccountEngine():
         trader = self.trader_dict.get(token, None)
         if trader:
             records = list()
-            df = trader.account_record
+            with trader.lock:
+                df = trader.account_record.copy()
             if len(df):
                 if start and end:
                     df = df.loc[(df['check_date'] >= start) & (df['check_date'] <= end)]
@@ -274,6 +598,12 @@ class AccountEngine():
                     pass
                 records = df.to_dict(orient='records')
 
+            # 合并归档的账户记录
+            flt = {}
+            if start or end:
+                flt['check_date'] = {k: v for k, v in (('$gte', start), ('$lte', end)) if v}
+            records = merge_archive('account_record', iter_archive('account_record', token, flt), records)
+
             if records:
                 return True, records
             else:
@@ -286,7 +616,8 @@ class AccountEngine():
         trader = self.trader_dict.get(token, None)
         if trader:
             records = list()
-            df = trader.pos_record
+            with trader.lock:
+                df = trader.pos_record.copy()
             if len(df):
                 if start and end:
                     df = df.loc[(df['first_buy_date'] >= start) & (df['last_sell_date'] <= end)]
@@ -298,6 +629,14 @@ class AccountEngine():
                     pass
                 records = df.to_dict(orient='records')
 
+            # 合并归档的持仓记录
+            flt = {}
+            if start:
+                flt['first_buy_date'] = {'$gte': start}
+            if end:
+                flt['last_sell_date'] = {'$lte': end}
+            records = merge_archive('pos_record', iter_archive('pos_record', token, flt), records)
+
             if records:
                 return True, records
             else:
@@ -306,124 +645,190 @@ class AccountEngine():
             return False, "账户未登录"
 
     def data_persistance(self, token: str):
-        """持久化数据"""
+        """
+        持久化数据
+        只将上次持久化后变更过的数据以无序批量写入的方式保存到数据库
+        """
         trader = self.trader_dict.get(token)
         if trader:
-            # 持久化账户数据
-            account = trader.account
-            on_account_update({
-                'token': account.account_id,
-                'avl': account.available,
-                'market_value': account.market_value,
-                'assets': account.assets
-            }, self.db)
-
-            # 持久化持仓数据
-            on_position_clear(token, self.db)
-            for symbol, pos in trader.pos.items():
-                pos_copy = copy.copy(pos)
-                on_position_insert(pos_copy, self.db)
-
-
-            # 持久化订单数据
-            on_orders_clear(token, self.db)
-            orders_copy = copy.deepcopy(trader.orders)
-            orders = [order.__dict__ for order in orders_copy.values()]
-            on_orders_insert_many(token, orders, self.db)
-
-            # 持久化账户记录数据
-            account_record_clear(token, self.db)
-            account_record_list = trader.account_record.to_dict(orient='records')
-            account_record_insert_many(token, account_record_list, self.db)
-
-            # 持久化持仓记录数据
-            pos_record_clear(token, self.db)
-            pos_record_list = trader.pos_record.to_dict(orient='records')
-            pos_record_insert_many(token, pos_record_list, self.db)
+            self.wait_persist()
+            if trader.dirty is not None:
+                flush_trader(trader, self.db)
+            else:
+                with trader.lock:
+                    self.__data_persistance_all(trader)
 
             return True
         else:
             return "账户未登录"
 
+    def __data_persistance_all(self, trader: Trader):
+        """持久化交易员的全部数据"""
+        token = trader.token
+
+        # 持久化账户数据
+        account = trader.account
+        on_account_update({
+            'token': account.account_id,
+            'avl': account.available,
+            'market_value': account.market_value,
+            'assets': account.assets
+        }, self.db)
+
+        # 持久化持仓数据
+        on_position_clear(token, self.db)
+        for symbol, pos in trader.pos.items():
+            pos_copy = copy.copy(pos)
+            on_position_insert(pos_copy, self.db)
+
+        # 持久化订单数据
+        on_orders_clear(token, self.db)
+        orders_copy = copy.deepcopy(trader.orders)
+        orders = [order.__dict__ for order in orders_copy.values()]
+        on_orders_insert_many(token, orders, self.db)
+
+        # 持久化账户记录数据
+        account_record_clear(token, self.db)
+        account_record_list = trader.account_record.to_dict(orient='records')
+        account_record_insert_many(token, account_record_list, self.db)
+
+        # 持久化持仓记录数据
+        pos_record_clear(token, self.db)
+        pos_record_list = trader.pos_record.to_dict(orient='records')
+        pos_record_insert_many(token, pos_record_list, self.db)
+
+    def put_flush_event(self):
+        """推送定时持久化事件"""
+        self.event_engine.put(Event(EVENT_PERSISTANCE_FLUSH))
+
+    def flush(self):
+        """定时持久化：将所有交易员变更过的数据批量写入数据库"""
+        count = 0
+        for trader in list(self.trader_dict.values()):
+            count += flush_trader(trader, self.db)
+        return count
+
+    def close(self):
+        """关闭账户引擎，定时持久化模式下保存所有未持久化的数据"""
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+        if self._snapshot_timer:
+            self._snapshot_timer.cancel()
+            self._snapshot_timer = None
+
+        if self.write_behind:
+            self.flush()
+
+        # 等待异步持久化的写入全部完成
+        if self.persist_worker:
+            self.persist_worker.close()
+
+        # 所有数据持久化后保存最终快照
+        self.save_snapshot(final=True)
+
+        self.write_log("账户引擎：关闭")
+
+    def persist(self, func, *args):
+        """
+        执行数据持久化
+        开启异步持久化时只将写入放入队列，事件线程不等待数据库写入
+        :param func: db_model的写入函数，最后一个参数为数据服务
+        """
+        if self.persist_worker:
+            self.persist_worker.submit(func, *args)
+        else:
+            func(*args, self.db)
+
+    def wait_persist(self):
+        """等待异步持久化的写入完成，直接读写数据库前调用，保证写入顺序"""
+        if self.persist_worker:
+            self.persist_worker.join()
+
+    def process_persistance_flush(self, event):
+        """处理定时持久化事件"""
+        self.flush()
+
     def process_order_insert(self, event):
         """处理订单插入事件"""
         order = event.data
-        on_orders_insert(order, self.db)
+        self.persist(on_orders_insert, order)
 
     def process_account_update(self, event):
         """处理账户更新事件"""
         data = event.data
-        on_account_update(data, self.db)
+        self.persist(on_account_update, data)
 
     def process_account_avl_update(self, event):
         """处理账户可用资金更新"""
         data = event.data
-        on_account_avl_update(data, self.db)
+        self.persist(on_account_avl_update, data)
 
     def process_account_assets_update(self, event):
         """处理账户资产更新"""
         data = event.data
-        on_account_assets_update(data, self.db)
+        self.persist(on_account_assets_update, data)
 
     def process_pos_insert(self, event):
         """处理持仓新增事件"""
         pos = event.data
-        on_position_insert(pos, self.db)
+        self.persist(on_position_insert, pos)
 
     def process_pos_update(self, event):
         """处理持仓更新事件"""
         pos = event.data
-        on_position_update(pos, self.db)
+        self.persist(on_position_update, pos)
 
     def process_pos_avl_update(self, event):
         """处理可用股份更新"""
         data = event.data
-        on_position_avl_update(data, self.db)
+        self.persist(on_position_avl_update, data)
 
     def process_pos_price_update(self, event):
         """处理可用股份更新"""
         data = event.data
-        on_position_price_update(data, self.db)
+        self.persist(on_position_price_update, data)
 
     def process_pos_delete(self, event):
         """处理可用股份更新"""
         data = event.data
-        on_position_delete(data, self.db)
+        self.persist(on_position_delete, data)
 
     def process_order_update(self, event):
         """处理订单更新事件"""
         data = event.data
-        on_order_update(data, self.db)
+        self.persist(on_order_update, data)
 
     def process_order_status_update(self, event):
         """处理订单更新事件"""
         data = event.data
-        on_order_status_update(data, self.db)
+        self.persist(on_order_status_update, data)
 
     def process_account_record_insert(self, event):
         """处理账户记录创建事件"""
         account_daily = event.data
-        account_record_creat(account_daily, self.db)
+        self.persist(account_record_creat, account_daily)
 
     def process_pos_record_insert(self, event):
         """处理持仓记录事件"""
         pos_record = event.data
-        pos_record_creat(pos_record, self.db)
+        self.persist(pos_record_creat, pos_record)
 
     def process_pos_record_buy(self, event):
         """处理持仓记录事件"""
         data = event.data
-        pos_record_update_buy(data, self.db)
+        self.persist(pos_record_update_buy, data)
 
     def process_pos_record_sell(self, event):
         """处理持仓记录事件"""
         data = event.data
-        pos_record_update_sell(data, self.db)
+        self.persist(pos_record_update_sell, data)
 
     def process_pos_record_clear(self, event):
         """处理持仓记录事件"""
         data = event.data
-        pos_record_update_liq(data, self.db)
+        self.persist(pos_record_update_liq, data)
 
     def write_log(self, msg: str, level: int = logging.INFO):
         """"""
@@ -0,0 +1,250 @@
+"""
+冷热数据分层
+超过保留天数的订单、账户记录及已清仓的持仓记录从数据库移到归档文件，数据库只保留近期数据。
+归档文件按账户按月保存：归档目录/数据类型/账户token/年月.json.gz，
+文件内容为按列保存的json：{"columns": [字段], "data": [[第一列的值], [第二列的值], ...]}。
+查询历史数据时合并归档文件与数据库中的数据，只读取日期范围内的归档文件，唯一键相同的数据只保留数据库中的一条。
+归档的截止日期以账户数据中最新的日期为准，回测账户的模拟日期不会因当前时间被全部归档。
+"""
+
+import os
+import sys
+import gzip
+import json
+from datetime import datetime, timedelta
+
+from paper_trading.api.storage import match_filter, sort_docs
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.model import DBData
+
+# 归档数据类型：(数据库配置名称, 日期字段, 唯一键字段, 只归档符合条件的数据)
+ARCHIVES = {
+    'orders': ('TRADE_DB', 'order_date', ('order_id',), {}),
+    'account_record': ('ACCOUNT_RECORD', 'check_date', ('check_date',), {}),
+    'pos_record': ('POS_RECORD', 'first_buy_date', ('pt_symbol', 'first_buy_date', 'pos_id'), {'is_clear': 1}),
+}
+
+# 归档文件后缀
+FILE_SUFFIX = ".json.gz"
+
+
+def get_key(kind: str, doc: dict):
+    """数据的唯一键"""
+    return tuple(doc.get(k) for k in ARCHIVES[kind][2])
+
+
+def merge_archive(kind: str, archived, docs: list):
+    """
+    合并归档数据与数据库或内存中的数据，归档数据在前
+    唯一键相同时只保留后者：归档中断或交易员在内存中保留了全部历史数据时，同一数据会同时存在
+    """
+    docs = list(docs)
+    keys = {get_key(kind, doc) for doc in docs}
+    return [doc for doc in archived if get_key(kind, doc) not in keys] + docs
+
+
+def get_archive_dir(path: str, kind: str, token: str):
+    """账户某类数据的归档目录"""
+    return os.path.join(path, kind, token)
+
+
+def write_archive(file_name: str, docs: list, key: tuple):
+    """
+    写入归档文件，与文件中已有的数据合并，唯一键相同的数据以新数据为准
+    先写入临时文件再替换，写入过程中断不会损坏原文件
+    """
+    merged = dict()
+    for doc in read_archive(file_name) + docs:
+        merged[tuple(doc.get(k) for k in key)] = doc
+
+    columns = list()
+    for doc in merged.values():
+        for field in doc:
+            if field not in columns:
+                columns.append(field)
+    data = [[doc.get(field) for doc in merged.values()] for field in columns]
+
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    tmp = file_name + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump({"columns": columns, "data": data}, f, ensure_ascii=False, default=str)
+    os.replace(tmp, file_name)
+
+    return len(merged)
+
+
+def read_archive(file_name: str):
+    """读取归档文件，返回数据列表"""
+    if not os.path.exists(file_name):
+        return []
+
+    with gzip.open(file_name, "rt", encoding="utf-8") as f:
+        archive = json.load(f)
+
+    columns = archive["columns"]
+    return [dict(zip(columns, row)) for row in zip(*archive["data"])]
+
+
+def iter_archive(kind: str, token: str, flt: dict = None, path: str = None, sort: list = None):
+    """
+    按月份顺序读取账户的归档数据
+    查询条件中包含日期字段的范围时，跳过范围以外月份的归档文件
+    :param kind: 数据类型，orders、account_record、pos_record
+    :param flt: 查询条件，与数据库查询条件格式一致
+    :param path: 归档目录，为空时使用SETTINGS中的配置，未配置时没有归档数据
+    :param sort: 每个月份内的排序，(字段, 排序方向)的列表，以日期字段开头时整体有序
+    """
+    path = path or SETTINGS.get('ARCHIVE_PATH')
+    if not path:
+        return
+
+    directory = get_archive_dir(path, kind, token)
+    if not os.path.isdir(directory):
+        return
+
+    flt = flt or {}
+    start, end = get_month_range(flt.get(ARCHIVES[kind][1]))
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(FILE_SUFFIX):
+            continue
+
+        month = name[:-len(FILE_SUFFIX)]
+        if (start and month < start) or (end and month > end):
+            continue
+
+        docs = [doc for doc in read_archive(os.path.join(directory, name)) if match_filter(doc, flt)]
+        yield from sort_docs(docs, sort) if sort else docs
+
+
+def get_month_range(cond):
+    """根据日期条件获取需要读取的月份范围"""
+    if isinstance(cond, str):
+        return cond[:6], cond[:6]
+
+    if isinstance(cond, dict):
+        start = cond.get('$gte') or cond.get('$gt')
+        end = cond.get('$lte') or cond.get('$lt')
+        return (start[:6] if start else None), (end[:6] if end else None)
+
+    return None, None
+
+
+def get_latest_date(token: str, db):
+    """账户数据中最新的日期，没有数据时返回None"""
+    latest = None
+    for kind, (db_key, date_field, key, condition) in ARCHIVES.items():
+        db_data = DBData(
+            db_name=SETTINGS[db_key],
+            db_cl=token,
+            raw_data={
+                'flt': {date_field: {'$exists': True}},
+                'projection': {'_id': 0, date_field: 1},
+                'sort': [(date_field, -1)],
+                'limit': 1
+            }
+        )
+        for doc in db.on_select(db_data):
+            date = doc.get(date_field)
+            if date and (latest is None or str(date) > latest):
+                latest = str(date)
+    return latest
+
+
+def get_cutoff(token: str, db, days: int, now: datetime = None):
+    """
+    账户的归档截止日期
+    取当前日期与账户最新数据日期往前保留天数中较早的一个，
+    回测账户的数据日期为模拟的历史日期，只归档相对于最新模拟日期超过保留天数的数据
+    """
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=days)).strftime("%Y%m%d")
+
+    latest = get_latest_date(token, db)
+    if latest:
+        data_cutoff = (datetime.strptime(latest[:8], "%Y%m%d") - timedelta(days=days)).strftime("%Y%m%d")
+        cutoff = min(cutoff, data_cutoff)
+    return cutoff
+
+
+def archive_account(token: str, db, cutoff: str, path: str = None):
+    """
+    归档账户在截止日期之前的数据
+    先写入归档文件再删除数据库中的数据，中断后重新执行不会丢失或重复数据
+    :param cutoff: 截止日期，日期早于此日期的数据被归档
+    :return: 归档的数据条数
+    """
+    path = path or SETTINGS['ARCHIVE_PATH']
+    count = 0
+
+    for kind, (db_key, date_field, key, condition) in ARCHIVES.items():
+        flt = dict(condition)
+        flt[date_field] = {'$lt': cutoff}
+        db_data = DBData(
+            db_name=SETTINGS[db_key],
+            db_cl=token,
+            raw_data={'flt': flt, 'projection': {'_id': 0}}
+        )
+
+        months = dict()
+        for doc in db.on_select(db_data):
+            months.setdefault(str(doc.get(date_field))[:6], []).append(doc)
+        if not months:
+            continue
+
+        directory = get_archive_dir(path, kind, token)
+        for month, docs in months.items():
+            write_archive(os.path.join(directory, month + FILE_SUFFIX), docs, key)
+            count += len(docs)
+
+        db.on_delete(DBData(
+            db_name=SETTINGS[db_key],
+            db_cl=token,
+            raw_data={'flt': flt}
+        ))
+
+    return count
+
+
+def archive_all(db, days: int = None, path: str = None):
+    """
+    归档所有账户超过保留天数的数据
+    :param days: 数据库中保留的天数，为空时使用SETTINGS中的配置
+    :return: 归档的数据条数
+    """
+    from paper_trading.trade.db_model import query_account_list
+
+    days = days or SETTINGS['ARCHIVE_DAYS']
+
+    count = 0
+    for token in query_account_list(db):
+        count += archive_account(token, db, get_cutoff(token, db, days), path)
+    return count
+
+
+def main():
+    """
+    数据归档工具，将超过保留天数的数据从数据库移到归档文件
+    python -m paper_trading.trade.archive 归档目录 [保留天数] [数据库地址] [数据库端口]
+    """
+    from paper_trading.api.db import MongoDBService
+
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        return
+
+    path = sys.argv[1]
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else SETTINGS.get("ARCHIVE_DAYS") or 90
+    host = sys.argv[3] if len(sys.argv) > 3 else SETTINGS.get("MONGO_HOST") or "localhost"
+    port = int(sys.argv[4]) if len(sys.argv) > 4 else SETTINGS.get("MONGO_PORT") or 27017
+
+    db = MongoDBService(host, port)
+    db.connect_db()
+
+    count = archive_all(db, days, path)
+    print(f"数据归档完成，共计：{count}条")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
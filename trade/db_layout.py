@@ -0,0 +1,245 @@
+import sys
+
+from paper_trading.api.storage import BaseDBService
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.utility.model import DBData
+
+# 账户数据的数据库配置名称与集合名称（按实体合并存储时使用）
+ENTITIES = {
+    'ACCOUNT_DB': "account",
+    'POSITION_DB': "position",
+    'TRADE_DB': "orders",
+    'ACCOUNT_RECORD': "account_record",
+    'POS_RECORD': "pos_record",
+}
+
+# 迁移时每批次写入的数据条数
+MIGRATE_BATCH = 1000
+
+
+class EntityLayoutDB(BaseDBService):
+    """
+    按实体合并存储的数据服务
+    默认每个账户在各数据库中单独建立以token命名的集合，账户数量很多时集合数量随之膨胀；
+    合并存储时每个数据库只使用一个实体集合，通过account_id区分账户。
+
+    db_model仍按账户token访问数据，本类将其转换为实体集合上的操作：
+    查询、更新、删除条件加入account_id，删除集合转换为删除该账户的数据，
+    查询集合列表转换为查询账户编号，索引以account_id为第一个字段。
+    条件或数据中已指定account_id时保持不变，用于批量操作多个账户的数据。
+    其他数据库（行情数据等）的操作不做转换。
+    """
+
+    # 所有账户的数据保存在同一集合中
+    consolidated = True
+
+    def __init__(self, db: BaseDBService):
+        """构造函数"""
+        self.db = db                # 实际的数据服务
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    @staticmethod
+    def get_entity(db_name: str):
+        """数据库对应的实体集合名称，非账户数据库返回None"""
+        for key, entity in ENTITIES.items():
+            if SETTINGS[key] == db_name:
+                return entity
+        return None
+
+    def _convert(self, pt_db: DBData, **raw_data):
+        """转换为实体集合上的操作，查询条件加入account_id"""
+        entity = self.get_entity(pt_db.db_name)
+        if entity is None:
+            return None
+
+        data = dict(pt_db.raw_data)
+        data.update(raw_data)
+        if 'flt' in data:
+            data['flt'] = with_account(data['flt'], pt_db.db_cl)
+
+        return DBData(
+            db_name=pt_db.db_name,
+            db_cl=entity,
+            raw_data=data
+        )
+
+    def connect_db(self):
+        """连接数据库"""
+        return self.db.connect_db()
+
+    def on_query_one(self, pt_db: DBData):
+        """数据库查询操作"""
+        return self.db.on_query_one(self._convert(pt_db) or pt_db)
+
+    def on_select(self, pt_db: DBData):
+        """数据库查询操作"""
+        return self.db.on_select(self._convert(pt_db) or pt_db)
+
+    def on_insert(self, pt_db: DBData):
+        """数据库插入数据操作，账户数据中均包含account_id"""
+        return self.db.on_insert(self._convert(pt_db) or pt_db)
+
+    def on_insert_many(self, pt_db: DBData):
+        """数据库插入数据操作"""
+        db_data = self._convert(pt_db)
+        if db_data:
+            db_data.raw_data['data'] = [d if d.get('account_id') else dict(d, account_id=pt_db.db_cl)
+                                        for d in db_data.raw_data['data']]
+        return self.db.on_insert_many(db_data or pt_db)
+
+    def on_replace_one(self, pt_db: DBData):
+        """数据库replace操作"""
+        return self.db.on_replace_one(self._convert(pt_db) or pt_db)
+
+    def on_update(self, pt_db: DBData):
+        """数据库更新操作"""
+        return self.db.on_update(self._convert(pt_db) or pt_db)
+
+    def on_bulk_write(self, pt_db: DBData):
+        """数据库批量写入操作"""
+        db_data = self._convert(pt_db)
+        if db_data:
+            token = pt_db.db_cl
+            ops = []
+            for op, flt, data in db_data.raw_data['data']:
+                if op == 'replace':
+                    data = dict(data, account_id=token)
+                ops.append((op, with_account(flt, token), data))
+            db_data.raw_data['data'] = ops
+        return self.db.on_bulk_write(db_data or pt_db)
+
+    def on_delete(self, pt_db: DBData):
+        """数据库删除操作"""
+        return self.db.on_delete(self._convert(pt_db) or pt_db)
+
+    def on_index_creat(self, pt_db: DBData):
+        """创建索引，账户数据的索引以account_id为第一个字段"""
+        db_data = self._convert(pt_db)
+        if db_data:
+            indexes = []
+            for keys in db_data.raw_data['index']:
+                keys = list(keys)
+                if keys[0][0] != 'account_id':
+                    keys.insert(0, ('account_id', 1))
+                indexes.append(keys)
+            db_data.raw_data['index'] = indexes
+        return self.db.on_index_creat(db_data or pt_db)
+
+    def on_group(self, pt_db: DBData):
+        """分组查询"""
+        db_data = self._convert(pt_db)
+        if db_data:
+            flt = pt_db.raw_data['flt']
+            if '$match' in flt:
+                flt = {'$match': with_account(flt['$match'], pt_db.db_cl)}
+            else:
+                flt = with_account(flt, pt_db.db_cl)
+            db_data.raw_data['flt'] = flt
+        return self.db.on_group(db_data or pt_db)
+
+    def on_collections_query(self, pt_db: DBData):
+        """获取集合列表，账户数据库返回所有账户编号"""
+        entity = self.get_entity(pt_db.db_name)
+        if entity is None:
+            return self.db.on_collections_query(pt_db)
+
+        db_data = DBData(
+            db_name=pt_db.db_name,
+            db_cl=entity,
+            raw_data={
+                'flt': {'$match': {}},
+                'group': {'$group': {'_id': "$account_id"}}
+            }
+        )
+        return [d['_id'] for d in self.db.on_group(db_data) if d['_id']]
+
+    def on_collection_delete(self, pt_db: DBData):
+        """数据库集合删除，账户数据库删除该账户的所有数据"""
+        db_data = self._convert(pt_db, flt={})
+        if db_data:
+            self.db.on_delete(db_data)
+            return True
+        return self.db.on_collection_delete(pt_db)
+
+    def close(self):
+        """数据服务关闭"""
+        self.db.close()
+
+
+def with_account(flt: dict, token: str):
+    """查询条件加入账户编号，已指定账户编号时不变"""
+    flt = dict(flt or {})
+    flt.setdefault('account_id', token)
+    return flt
+
+
+def migrate(src: BaseDBService, dst: BaseDBService, drop: bool = False):
+    """
+    将按账户分集合存储的数据迁移到按实体合并存储
+    :param src: 原数据服务（按账户分集合）
+    :param dst: 目标数据服务，可以与原数据服务连接同一个数据库
+    :param drop: 迁移完成后是否删除原集合
+    :return: 迁移的账户数量
+    """
+    from paper_trading.trade.db_model import query_account_list, on_account_index_creat
+
+    layout = EntityLayoutDB(dst)
+    tokens = [t for t in query_account_list(src) if t not in ENTITIES.values()]
+
+    for token in tokens:
+        # 先删除目标中该账户的数据，迁移中断后可以重新执行
+        for key in ENTITIES:
+            db_name = SETTINGS[key]
+            layout.on_collection_delete(DBData(db_name=db_name, db_cl=token, raw_data={}))
+
+            db_data = DBData(
+                db_name=db_name,
+                db_cl=token,
+                raw_data={'flt': {}, 'projection': {'_id': 0}, 'batch_size': MIGRATE_BATCH}
+            )
+            batch = []
+            for doc in src.on_select(db_data):
+                batch.append(doc)
+                if len(batch) >= MIGRATE_BATCH:
+                    layout.on_insert_many(DBData(db_name=db_name, db_cl=token, raw_data={'data': batch}))
+                    batch = []
+            if batch:
+                layout.on_insert_many(DBData(db_name=db_name, db_cl=token, raw_data={'data': batch}))
+
+        on_account_index_creat(token, layout)
+
+        if drop:
+            for key in ENTITIES:
+                src.on_collection_delete(DBData(db_name=SETTINGS[key], db_cl=token, raw_data={}))
+
+        print(f"账户迁移完成：{token}")
+
+    return len(tokens)
+
+
+def main():
+    """
+    数据迁移工具，将MongoDB中按账户分集合存储的数据迁移到按实体合并存储
+    python -m paper_trading.trade.db_layout [数据库地址] [数据库端口] [--drop]
+    --drop：迁移完成后删除原集合
+    """
+    from paper_trading.api.db import MongoDBService
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    drop = "--drop" in sys.argv
+    host = args[0] if len(args) > 0 else SETTINGS.get("MONGO_HOST") or "localhost"
+    port = int(args[1]) if len(args) > 1 else SETTINGS.get("MONGO_PORT") or 27017
+
+    db = MongoDBService(host, port)
+    db.connect_db()
+
+    count = migrate(db, db, drop)
+    print(f"数据迁移完成，共计账户：{count}个")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
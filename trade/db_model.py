@@ -1,8 +1,10 @@
 
 import copy
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from paper_trading.utility.setting import get_token, SETTINGS
+from paper_trading.trade.archive import iter_archive, merge_archive
 from paper_trading.utility.model import (
     Account,
     Position,
@@ -13,11 +15,46 @@ from paper_trading.utility.model import (
 # 小数点保留位数
 P = SETTINGS["POINT"]
 
+# 查询时排除数据库自动生成的_id字段
+NO_ID = {'_id': 0}
+
+# 游标每批次从数据库读取的数据条数
+BATCH_SIZE = 1000
+
+# 订单分页排序：订单日期、订单编号
+ORDERS_SORT = [('order_date', 1), ('order_id', 1)]
+
+# 账户各数据集合的索引：{数据库配置名称: [索引]}
+INDEXES = {
+    'ACCOUNT_DB': [[('account_id', 1)]],
+    'POSITION_DB': [[('pt_symbol', 1)]],
+    'TRADE_DB': [[('order_id', 1)],
+                 [('order_date', 1), ('order_id', 1)],
+                 [('pt_symbol', 1)]],
+    'ACCOUNT_RECORD': [[('check_date', 1)]],
+    'POS_RECORD': [[('pt_symbol', 1), ('is_clear', 1)],
+                   [('pt_symbol', 1), ('first_buy_date', 1)],
+                   [('first_buy_date', 1)],
+                   [('pos_id', 1)]],
+}
+
+# 账户的数据集合，删除账户时账户集合最后删除
+ACCOUNT_DATA_DBS = ('POSITION_DB', 'TRADE_DB', 'ACCOUNT_RECORD', 'POS_RECORD')
+
 """账户操作"""
 
 
-def on_account_add(account_info: dict, db):
-    """创建账户"""
+def get_projection(fields: list = None):
+    """生成查询返回的字段，fields为空时返回除_id以外的所有字段"""
+    projection = dict(NO_ID)
+    if fields:
+        for field in fields:
+            projection[field] = 1
+    return projection
+
+
+def make_account(account_info: dict):
+    """根据账户参数生成账户"""
     token = get_token()
 
     # 账户参数
@@ -43,6 +80,13 @@ def on_account_add(account_info: dict, db):
         slippoint=float(param['slippoint']),
         account_info=param['info']
     )
+    return account
+
+
+def on_account_add(account_info: dict, db):
+    """创建账户"""
+    account = make_account(account_info)
+    token = account.account_id
     account_dict = copy.copy(account.__dict__)
 
     raw_data = {}
@@ -54,6 +98,8 @@ def on_account_add(account_info: dict, db):
         raw_data=raw_data
     )
     if db.on_insert(db_data):
+        # 创建账户数据集合的索引
+        on_account_index_creat(token, db)
         return account_dict
 
 
@@ -110,6 +156,99 @@ def on_account_delete(token: str, db):
         return False
 
 
+def on_accounts_add(account_infos: list, db):
+    """
+    批量创建账户
+    按实体合并存储时所有账户一次写入，索引只创建一次；
+    按账户分集合存储时每个账户的集合不同，在线程池中并行写入
+    :return: 账户信息列表，顺序与account_infos一致
+    """
+    accounts = [make_account(info) for info in account_infos]
+    if not accounts:
+        return []
+
+    if getattr(db, 'consolidated', False):
+        token = accounts[0].account_id
+        db_data = DBData(
+            db_name=SETTINGS['ACCOUNT_DB'],
+            db_cl=token,
+            raw_data={'data': [copy.copy(a.__dict__) for a in accounts]}
+        )
+        db.on_insert_many(db_data)
+        on_account_index_creat(token, db)
+    else:
+        def insert(account):
+            db_data = DBData(
+                db_name=SETTINGS['ACCOUNT_DB'],
+                db_cl=account.account_id,
+                raw_data={'data': copy.copy(account)}
+            )
+            db.on_insert(db_data)
+            on_account_index_creat(account.account_id, db)
+
+        with ThreadPoolExecutor(max_workers=SETTINGS.get('BULK_WORKERS', 8)) as executor:
+            list(executor.map(insert, accounts))
+
+    return [copy.copy(a.__dict__) for a in accounts]
+
+
+def on_accounts_delete(tokens: list, db):
+    """
+    批量删除账户
+    按实体合并存储时每个数据库只执行一次删除，按账户分集合存储时在线程池中并行删除。
+    按实体合并存储时先删除持仓、订单及记录，最后删除账户信息，账户信息删除即视为账户删除成功；
+    删除失败时返回账户信息已删除的账户，其余账户可重新删除
+    :return: 删除成功的账户列表
+    """
+    if not tokens:
+        return []
+
+    if getattr(db, 'consolidated', False):
+        try:
+            for key in ACCOUNT_DATA_DBS + ('ACCOUNT_DB',):
+                db_data = DBData(
+                    db_name=SETTINGS[key],
+                    db_cl=tokens[0],
+                    raw_data={'flt': {'account_id': {'$in': list(tokens)}}}
+                )
+                db.on_delete(db_data)
+            return list(tokens)
+        except Exception:
+            try:
+                exist = set(query_account_list(db))
+            except Exception:
+                return []
+            return [token for token in tokens if token not in exist]
+    else:
+        with ThreadPoolExecutor(max_workers=SETTINGS.get('BULK_WORKERS', 8)) as executor:
+            results = list(executor.map(lambda token: on_account_delete(token, db), tokens))
+        return [token for token, result in zip(tokens, results) if result]
+
+
+def on_account_index_creat(token: str, db):
+    """创建账户各数据集合的索引"""
+    for db_key, indexes in INDEXES.items():
+        raw_data = {}
+        raw_data['index'] = indexes
+        db_data = DBData(
+            db_name=SETTINGS[db_key],
+            db_cl=token,
+            raw_data=raw_data
+        )
+        db.on_index_creat(db_data)
+
+    return True
+
+
+def on_index_backfill(db):
+    """为已存在的所有账户创建索引，返回处理的账户数量"""
+    account_list = query_account_list(db)
+    for token in account_list:
+        on_account_index_creat(token, db)
+
+    return len(account_list)
+
+
 def on_account_update(data: dict, db):
     """账户更新"""
     raw_data = {}
@@ -167,6 +306,7 @@ def query_account_one(token: str, db):
     if token:
         raw_data = {}
         raw_data['flt'] = {"account_id": token}
+        raw_data['projection'] = NO_ID
         db_data = DBData(
             db_name=SETTINGS['ACCOUNT_DB'],
             db_cl=token,
@@ -174,7 +314,6 @@ def query_account_one(token: str, db):
         )
         account = db.on_query_one(db_data)
         if account:
-            del account["_id"]
             return account
         else:
             return False
@@ -204,13 +343,13 @@ def on_orders_exist(token: str, order_id: str, db):
     """查询订单是否存在"""
     raw_data = {}
     raw_data["flt"] = {'order_id': order_id}
+    raw_data["projection"] = {'_id': 1}
     db_data = DBData(
         db_name=SETTINGS['TRADE_DB'],
         db_cl=token,
         raw_data=raw_data
     )
-    order = db.on_select(db_data)
-    if order.count():
+    if db.on_query_one(db_data):
         return True
     else:
         return False
@@ -272,35 +411,119 @@ def on_order_status_update(data, db):
     return db.on_update(db_data)
 
 
-def query_orders(token: str, db, flt: dict = None):
-    """查询交割单"""
+def iter_orders(token: str, db, flt: dict = None, fields: list = None, sort: list = None, limit: int = 0):
+    """
+    逐条读取订单数据
+    :param flt: 查询条件
+    :param fields: 需要返回的字段，为空时返回所有字段
+    :param sort: 排序，(字段, 排序方向)的列表
+    :param limit: 最多读取条数，为0时读取全部
+    :return: 订单字典的生成器
+    """
     raw_data = {}
     raw_data["flt"] = flt or {}
+    raw_data["projection"] = get_projection(fields)
+    raw_data["batch_size"] = BATCH_SIZE
+    if sort:
+        raw_data["sort"] = sort
+    if limit:
+        raw_data["limit"] = limit
     db_data = DBData(
         db_name=SETTINGS['TRADE_DB'],
         db_cl=token,
         raw_data=raw_data
     )
-    result = db.on_select(db_data)
-    orders = []
+    yield from db.on_select(db_data)
 
-    if isinstance(result, bool):
-        return False
+
+def iter_orders_archived(token: str, db, flt: dict = None, sort: list = None):
+    """
+    逐条读取归档的订单
+    归档中断时订单可能同时存在于归档文件及数据库中，跳过数据库中仍存在的订单
+    """
+    exist = None
+    for order in iter_archive('orders', token, flt, sort=sort):
+        if exist is None:
+            exist = {d['order_id'] for d in iter_orders(token, db, flt, ['order_id'])}
+        if order['order_id'] not in exist:
+            yield order
+
+
+def iter_orders_history(token: str, db, flt: dict = None):
+    """逐条读取包括归档数据在内的所有订单，先输出归档的订单"""
+    yield from iter_orders_archived(token, db, flt)
+    yield from iter_orders(token, db, flt)
+
+
+def get_orders_cursor(order: dict):
+    """订单的分页游标，格式：订单日期,订单编号"""
+    return f"{order['order_date']},{order['order_id']}"
+
+
+def with_orders_cursor(flt: dict, cursor: str):
+    """查询条件加入分页游标，只查询游标之后的订单"""
+    order_date, order_id = cursor.split(",", 1)
+    flt = dict(flt or {})
+
+    # 日期条件保留在顶层，用于数据库索引及跳过更早月份的归档文件
+    cond = flt.get('order_date')
+    if cond is None:
+        flt['order_date'] = {'$gte': order_date}
+    elif isinstance(cond, dict) and '$gt' not in cond and cond.get('$gte', "") < order_date:
+        flt['order_date'] = dict(cond, **{'$gte': order_date})
+
+    flt['$or'] = [{'order_date': {'$gt': order_date}},
+                  {'order_id': {'$gt': order_id}}]
+    return flt
+
+
+def iter_orders_sorted(token: str, db, flt: dict = None, cursor: str = None, limit: int = 0):
+    """
+    按订单日期及订单编号顺序逐条读取订单，包括归档的订单
+    :param cursor: 分页游标，从游标之后的订单开始读取，为空时从头读取
+    :param limit: 最多读取条数，为0时读取全部
+    """
+    if cursor:
+        flt = with_orders_cursor(flt, cursor)
+
+    count = 0
+    for order in iter_orders_archived(token, db, flt, ORDERS_SORT):
+        yield order
+        count += 1
+        if limit and count >= limit:
+            return
+
+    yield from iter_orders(token, db, flt, sort=ORDERS_SORT, limit=limit - count if limit else 0)
+
+
+def query_orders_page(token: str, db, flt: dict = None, cursor: str = None, limit: int = 100):
+    """
+    分页查询交割单，包括归档的订单
+    :param cursor: 上一页返回的游标，为空时查询第一页
+    :param limit: 每页条数
+    :return: (订单列表, 下一页游标)，没有更多订单时游标为None
+    """
+    orders = list(iter_orders_sorted(token, db, flt, cursor, limit + 1))
+    if len(orders) > limit:
+        orders = orders[:limit]
+        return orders, get_orders_cursor(orders[-1])
+    return orders, None
+
+
+def query_orders(token: str, db, flt: dict = None):
+    """查询交割单，包括归档的订单"""
+    orders = list(iter_orders_history(token, db, flt))
+    if orders:
+        return orders
     else:
-        result = list(result)
-        if result:
-            for o in result:
-                del o["_id"]
-                orders.append(o)
-            return orders
-        else:
-            return False
+        return False
 
 
 def query_order_one(token: str, order_id: str, db):
     """查询一条订单数据"""
     raw_data = {}
     raw_data["flt"] = {'order_id': order_id}
+    raw_data["projection"] = NO_ID
     db_data = DBData(
         db_name=SETTINGS['TRADE_DB'],
         db_cl=token,
@@ -318,6 +541,7 @@ def query_order_status(token: str, order_id: str, db):
     """查询订单情况"""
     raw_data = {}
     raw_data["flt"] = {'order_id': order_id}
+    raw_data["projection"] = get_projection(['status'])
     db_data = DBData(
         db_name=SETTINGS['TRADE_DB'],
         db_cl=token,
@@ -334,52 +558,20 @@ def query_order_status(token: str, order_id: str, db):
 def query_orders_today(token: str, db):
     """查询今天的所有订单"""
     today = datetime.now().strftime("%Y%m%d")
-    raw_data = {}
-    raw_data["flt"] = {"order_date": today}
-    db_data = DBData(
-        db_name=SETTINGS['TRADE_DB'],
-        db_cl=token,
-        raw_data=raw_data
-    )
-    result = db.on_select(db_data)
-    orders = []
-
-    if isinstance(result, bool):
-        return False
+    orders = list(iter_orders(token, db, {"order_date": today}))
+    if orders:
+        return orders
     else:
-        result = list(result)
-        if result:
-            for o in result:
-                del o["_id"]
-                orders.append(o)
-            return orders
-        else:
-            return False
+        return False
 
 
 def query_orders_by_symbol(token: str, symbol: str, db):
     """查询某symbol的所有订单"""
-    raw_data = {}
-    raw_data["flt"] = {'pt_symbol': symbol}
-    db_data = DBData(
-        db_name=SETTINGS['TRADE_DB'],
-        db_cl=token,
-        raw_data=raw_data
-    )
-    result = db.on_select(db_data)
-    orders = []
-
-    if isinstance(result, bool):
-        return False
+    orders = list(iter_orders(token, db, {'pt_symbol': symbol}))
+    if orders:
+        return orders
     else:
-        result = list(result)
-        if result:
-            for o in result:
-                del o["_id"]
-                orders.append(o)
-            return orders
-        else:
-            return "无此代码的交易记录"
+        return "无此代码的交易记录"
 
 
 """持仓操作"""
@@ -395,7 +587,8 @@ def on_position_insert(pos: Position, db):
         db_cl=pos.account_id,
         raw_data=raw_data
     )
-    db.on_insert(db_data)
+    # 以证券代码为条件替换，重复写入（如回放事件日志）不会产生重复的持仓
+    db.on_replace_one(db_data)
 
 
 def on_position_delete(data: dict, db):
@@ -467,34 +660,34 @@ def on_position_price_update(data: dict, db):
     db.on_update(db_data)
 
 
-def query_position(token: str, db):
-    """查询所有持仓信息"""
+def iter_position(token: str, db, fields: list = None):
+    """逐条读取持仓数据，返回持仓字典的生成器"""
     raw_data = {}
     raw_data["flt"] = {}
+    raw_data["projection"] = get_projection(fields)
+    raw_data["batch_size"] = BATCH_SIZE
     db_data = DBData(
         db_name=SETTINGS['POSITION_DB'],
         db_cl=token,
         raw_data=raw_data
     )
-    result = list(db.on_select(db_data))
-    pos = []
-    if isinstance(result, bool):
-        return False
+    yield from db.on_select(db_data)
+
+
+def query_position(token: str, db):
+    """查询所有持仓信息"""
+    pos = list(iter_position(token, db))
+    if pos:
+        return pos
     else:
-        result = list(result)
-        if result:
-            for p in result:
-                del p["_id"]
-                pos.append(p)
-            return pos
-        else:
-            return False
+        return False
 
 
 def query_position_one(token: str, symbol: str, db):
     """查询某一只证券的持仓"""
     raw_data = {}
     raw_data["flt"] = {'pt_symbol': symbol}
+    raw_data["projection"] = NO_ID
     db_data = DBData(
         db_name=SETTINGS['POSITION_DB'],
         db_cl=token,
@@ -507,6 +700,28 @@ def query_position_one(token: str, symbol: str, db):
         return False, ""
 
 
+"""批量操作"""
+
+
+def on_bulk_write(db_name: str, token: str, ops: list, db, ordered: bool = True):
+    """
+    批量写入
+    :param db_name: 数据库名称
+    :param token: 账户ID
+    :param ops: 操作列表：(操作类型, 条件, 数据)，操作类型为replace、update、delete
+    :param ordered: 是否按顺序执行
+    """
+    raw_data = {}
+    raw_data['data'] = ops
+    raw_data['ordered'] = ordered
+    db_data = DBData(
+        db_name=db_name,
+        db_cl=token,
+        raw_data=raw_data
+    )
+    return db.on_bulk_write(db_data)
+
+
 """账户记录"""
 
 
@@ -545,27 +760,34 @@ def account_record_clear(token, db):
     )
     db.on_collection_delete(db_data)
 
-def query_account_record(token, db, start: str = None, end: str = None):
-    """查询账户记录"""
+def iter_account_record(token, db, flt: dict = None):
+    """逐条读取账户记录，返回账户记录字典的生成器"""
     raw_data = {}
-    raw_data['flt'] = {}
-    if start and end == None:
-        raw_data["flt"] = {'first_buy_date': {'$gte': start}}
-    elif start == None and end:
-        raw_data["flt"] = {'first_buy_date': {'$lte': end}}
-    elif start and end:
-        raw_data["flt"] = {'first_buy_date': {'$gte': start, '$lte': end}}
+    raw_data["flt"] = flt or {}
+    raw_data["projection"] = NO_ID
+    raw_data["batch_size"] = BATCH_SIZE
     db_data = DBData(
         db_name=SETTINGS['ACCOUNT_RECORD'],
         db_cl=token,
         raw_data=raw_data
     )
-    result = list(db.on_select(db_data))
-    account_record = []
-    if result:
-        for i in result:
-            del i["_id"]
-            account_record.append(i)
+    yield from db.on_select(db_data)
+
+
+def query_account_record(token, db, start: str = None, end: str = None):
+    """查询账户记录，包括归档的记录"""
+    flt = {}
+    if start and end == None:
+        flt = {'check_date': {'$gte': start}}
+    elif start == None and end:
+        flt = {'check_date': {'$lte': end}}
+    elif start and end:
+        flt = {'check_date': {'$gte': start, '$lte': end}}
+
+    account_record = merge_archive('account_record',
+                                   iter_archive('account_record', token, flt),
+                                   iter_account_record(token, db, flt))
+    if account_record:
         return account_record
     else:
         return False
@@ -574,17 +796,31 @@ def query_account_record(token, db, start: str = None, end: str = None):
 """持仓记录"""
 
 
+def get_pos_record_flt(pos_record: dict):
+    """
+    持仓记录的唯一条件
+    按持仓记录编号查询，同一天清仓后再次建仓的持仓记录互不覆盖；
+    没有编号的旧数据按证券代码及首次买入日期查询
+    """
+    pos_id = pos_record.get('pos_id')
+    if isinstance(pos_id, str) and pos_id:
+        return {'pos_id': pos_id}
+    return {'pt_symbol': pos_record['pt_symbol'],
+            'first_buy_date': pos_record['first_buy_date']}
+
+
 def pos_record_creat(pos_record, db):
     """创建持仓记录"""
     raw_data = {}
-    raw_data['flt'] = {}
+    raw_data['flt'] = get_pos_record_flt(pos_record.__dict__)
     raw_data['data'] = pos_record
     db_data = DBData(
         db_name=SETTINGS['POS_RECORD'],
         db_cl=pos_record.account_id,
         raw_data=raw_data
     )
-    return db.on_insert(db_data)
+    # 以持仓记录编号为条件替换，重复写入不会产生重复的持仓记录
+    return db.on_replace_one(db_data)
 
 def pos_record_insert_many(token, record_list, db):
     """批量保存持仓记录数据"""
@@ -653,6 +889,7 @@ def query_pos_record_one(token ,db, flt):
     """获取持仓记录"""
     raw_data = {}
     raw_data['flt'] = flt
+    raw_data['projection'] = NO_ID
     db_data = DBData(
         db_name=SETTINGS['POS_RECORD'],
         db_cl=token,
@@ -664,48 +901,41 @@ def query_pos_record_one(token ,db, flt):
     else:
         return False
 
-def query_pos_records(token , db, start: str = None, end: str = None):
-    """获取持仓记录"""
+def iter_pos_records(token, db, flt: dict = None, fields: list = None):
+    """逐条读取持仓记录，返回持仓记录字典的生成器"""
     raw_data = {}
-    raw_data["flt"] = {}
-
-    if start and end == None:
-        raw_data["flt"] = {'first_buy_date': {'$gte': start}}
-    elif start == None and end:
-        raw_data["flt"] = {'first_buy_date': {'$lte': end}}
-    elif start and end:
-        raw_data["flt"] = {'first_buy_date': {'$gte': start, '$lte': end}}
-
+    raw_data["flt"] = flt or {}
+    raw_data["projection"] = get_projection(fields)
+    raw_data["batch_size"] = BATCH_SIZE
     db_data = DBData(
         db_name=SETTINGS['POS_RECORD'],
         db_cl=token,
         raw_data=raw_data
     )
-    result = list(db.on_select(db_data))
-    pos_record = []
-    if result:
-        for i in result:
-            del i["_id"]
-            pos_record.append(i)
+    yield from db.on_select(db_data)
+
+def query_pos_records(token , db, start: str = None, end: str = None):
+    """获取持仓记录，包括归档的记录"""
+    flt = {}
+    if start and end == None:
+        flt = {'first_buy_date': {'$gte': start}}
+    elif start == None and end:
+        flt = {'first_buy_date': {'$lte': end}}
+    elif start and end:
+        flt = {'first_buy_date': {'$gte': start, '$lte': end}}
+
+    pos_record = merge_archive('pos_record',
+                               iter_archive('pos_record', token, flt),
+                               iter_pos_records(token, db, flt))
+    if pos_record:
         return pos_record
     else:
         return False
 
 def query_pos_records_not_clear(token ,db):
     """获取未清仓的持仓记录"""
-    raw_data = {}
-    raw_data['flt'] = {'is_clear': 0}
-    db_data = DBData(
-        db_name=SETTINGS['POS_RECORD'],
-        db_cl=token,
-        raw_data=raw_data
-    )
-    result = list(db.on_select(db_data))
-    pos_record = []
-    if result:
-        for i in result:
-            del i["_id"]
-            pos_record.append(i)
+    pos_record = list(iter_pos_records(token, db, {'is_clear': 0}))
+    if pos_record:
         return pos_record
     else:
         return False
@@ -0,0 +1,141 @@
+import os
+import sys
+import pickle
+import struct
+import zlib
+from datetime import datetime
+from threading import Lock
+from time import time
+
+from paper_trading.event import Event
+from paper_trading.utility.setting import SETTINGS
+
+# 记录头：数据长度及crc32校验值
+HEADER = struct.Struct("<II")
+
+# 日志文件名前缀及后缀
+FILE_PREFIX = "journal_"
+FILE_SUFFIX = ".ptj"
+
+
+class EventJournal():
+    """
+    事件日志
+    将交易员产生的每一个数据变更事件以追加方式写入本地二进制文件，按日期切换文件；
+    每条记录由长度、crc32校验值及序列化后的(时间戳, 事件类型, 事件数据)组成
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path                # 日志文件目录
+        self.fsync = fsync              # 每条记录是否同步写入磁盘
+        self._date = ""                 # 当前日志文件的日期
+        self._file = None               # 当前日志文件
+        self._lock = Lock()
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def write(self, event_type: str, data):
+        """写入一条事件记录"""
+        payload = pickle.dumps((time(), event_type, data), pickle.HIGHEST_PROTOCOL)
+        header = HEADER.pack(len(payload), zlib.crc32(payload))
+
+        with self._lock:
+            self.__rotate()
+            self._file.write(header + payload)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def __rotate(self):
+        """日期变化时切换日志文件"""
+        today = datetime.now().strftime("%Y%m%d")
+        if today != self._date:
+            if self._file:
+                self._file.close()
+            self._file = open(get_journal_file(self.path, today), "ab")
+            self._date = today
+
+    def close(self):
+        """关闭日志文件"""
+        with self._lock:
+            if self._file:
+                self._file.close()
+            self._file = None
+            self._date = ""
+
+
+def get_journal_file(path: str, date: str):
+    """获取某日的日志文件路径"""
+    return os.path.join(path, f"{FILE_PREFIX}{date}{FILE_SUFFIX}")
+
+
+def read_journal(file_name: str):
+    """
+    按顺序读取日志文件中的事件
+    文件末尾不完整或校验失败的记录（写入过程中系统崩溃）将被忽略
+    :return: (时间戳, 事件)的生成器
+    """
+    with open(file_name, "rb") as f:
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+
+            length, crc = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+
+            timestamp, event_type, data = pickle.loads(payload)
+            yield timestamp, Event(event_type, data)
+
+
+def replay_journal(file_name: str, handlers: dict):
+    """
+    回放日志
+    将日志中的事件按原有顺序交给事件处理函数处理
+    :param file_name: 日志文件
+    :param handlers: 事件类型与处理函数的字典
+    :return: 回放的事件数量
+    """
+    count = 0
+    for timestamp, event in read_journal(file_name):
+        handler = handlers.get(event.type)
+        if handler:
+            handler(event)
+            count += 1
+
+    return count
+
+
+def main():
+    """
+    日志回放工具，将日志写入数据库以重建数据
+    python -m paper_trading.trade.journal 日志文件 [数据库地址] [数据库端口]
+    """
+    from paper_trading.event import EventEngine
+    from paper_trading.api.db import MongoDBService
+    from paper_trading.utility.constant import LoadDataMode
+    from paper_trading.trade.account_engine import AccountEngine
+
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        return
+
+    file_name = sys.argv[1]
+    host = sys.argv[2] if len(sys.argv) > 2 else SETTINGS.get("MONGO_HOST") or "localhost"
+    port = int(sys.argv[3]) if len(sys.argv) > 3 else SETTINGS.get("MONGO_PORT") or 27017
+
+    db = MongoDBService(host, port)
+    db.connect_db()
+
+    account_engine = AccountEngine(EventEngine(), True, LoadDataMode.TRADING, db)
+    count = account_engine.replay_journal(file_name)
+    print(f"日志回放完成，共计：{count}条")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,15 @@
 
 import copy
 import traceback
-from queue import Queue
-from time import sleep
+from threading import Lock
+from time import sleep, monotonic
 from logging import INFO
 from datetime import datetime, time
 from collections import OrderedDict
 
 from paper_trading.event import Event
+from paper_trading.api.quote_bus import QuoteBus
+from paper_trading.utility.setting import SETTINGS
 from paper_trading.utility.event import (
     EVENT_ERROR,
     EVENT_LOG,
@@ -38,6 +40,9 @@ class Exchange:
         # 行情源实例
         self.hq_client = hq_ser
 
+        # 共享内存行情总线
+        self.quote_bus = None
+
         self.exchange_symbols = []          # 交易市场标识
         self.turnover_mode = None           # 回转交易模式
         self.verification = OrderedDict()   # 订单验证清单
@@ -47,6 +52,13 @@ class Exchange:
         # 开启交易撮合开关
         self._active = True
 
+        # 开启共享内存行情总线
+        if SETTINGS.get("QUOTE_BUS_NAME") and not self.quote_bus:
+            self.quote_bus = QuoteBus(SETTINGS["QUOTE_BUS_NAME"],
+                                      create=True,
+                                      capacity=SETTINGS["QUOTE_BUS_CAPACITY"],
+                                      max_symbols=SETTINGS["QUOTE_BUS_SYMBOLS"])
+
         # 注册验证程序
         self.verification_register()
 
@@ -61,14 +73,19 @@ class Exchange:
         """订单到达"""
         pass
 
-    def on_orders_match(self, order: Order):
-        """订单撮合"""
+    def on_orders_match(self, order: Order, quote: dict = None):
+        """
+        订单撮合
+        :param quote: 订单证券的行情快照，为空时查询实时行情
+        """
         try:
-            hq = self.hq_client.get_realtime_data(order.pt_symbol)
+            if quote is None:
+                quote = self.hq_client.get_realtime_quotes([order.pt_symbol]).get(order.pt_symbol)
+                self.publish_quote(order.pt_symbol, quote)
 
-            if len(hq):
-                ask1 = float(hq.loc[0, "ask1"])
-                bid1 = float(hq.loc[0, 'bid1'])
+            if quote:
+                ask1 = float(quote["ask1"])
+                bid1 = float(quote["bid1"])
 
                 if order.order_type == OrderType.BUY.value:
                     # 涨停
@@ -108,6 +125,17 @@ class Exchange:
             self.write_log(traceback.format_exc())
             return False
 
+    def publish_quote(self, symbol: str, quote: dict):
+        """发布行情到共享内存行情总线"""
+        if self.quote_bus and quote:
+            self.quote_bus.publish(symbol,
+                                   float(quote["price"]),
+                                   float(quote["bid1"]),
+                                   float(quote["ask1"]),
+                                   int(quote["bid_vol1"]),
+                                   int(quote["ask_vol1"]),
+                                   int(quote["vol"]))
+
     def on_order_deal(self, order: Order):
         """订单成交"""
         order.traded = order.volume
@@ -169,6 +197,11 @@ class Exchange:
         # 关闭行情接口
         self.hq_client.close()
 
+        # 关闭共享内存行情总线
+        if self.quote_bus:
+            self.quote_bus.close(unlink=True)
+            self.quote_bus = None
+
         # 推送关闭事件
         event = Event(EVENT_MARKET_CLOSE, self.market_name)
         self.event_engine.put(event)
@@ -240,7 +273,7 @@ class BacktestMarket(Exchange):
     回测数据模拟交易市场
     1、即时按委托价格成交；
     2、接收清算订单后清算数据；
-    3、为保证数据准确，使用订单队列接收和处理订单
+    3、订单在接收线程中加锁依次撮合，不经过线程切换，保证数据准确及回测结果可复现
     """
 
     def __init__(self, event_engine, account_engine, hq_ser, param):
@@ -248,28 +281,12 @@ class BacktestMarket(Exchange):
 
         self.market_name = "backtest_market"            # 交易市场名称
         self.turnover_mode = TradeType.T_PLUS1.value    # 交收类型
-        self.orders_queue = Queue()                     # 使用订单队列
+        self._match_lock = Lock()                       # 订单撮合锁
 
     def on_match(self):
-        """交易撮合"""
+        """交易撮合，回测模式订单到达时即撮合"""
         self.write_log("{}：交易市场已开启".format(self.market_name))
 
-        try:
-            while self._active:
-                if self.orders_queue.empty():
-                    continue
-
-                order = self.orders_queue.get(block=True)
-
-                # 订单成交
-                # 回测使用委托价格作为成交价格
-                order.trade_price = order.order_price
-                self.on_order_deal(order)
-
-        except Exception as e:
-            event = Event(EVENT_ERROR, traceback.format_exc())
-            self.event_engine.put(event)
-
     def on_orders_arrived(self, order):
         """订单到达-回测模式"""
         # 过滤掉取消订单
@@ -280,8 +297,17 @@ class BacktestMarket(Exchange):
         if not self.on_back_verification(order):
             return False
 
-        # 订单推送到订单撮合引擎
-        self.orders_queue.put(order)
+        # 订单撮合
+        # 回测使用委托价格作为成交价格
+        try:
+            with self._match_lock:
+                order.trade_price = order.order_price
+                self.on_order_deal(order)
+            return True
+        except Exception:
+            event = Event(EVENT_ERROR, traceback.format_exc())
+            self.event_engine.put(event)
+            return False
 
 
 class ChinaAMarket(Exchange):
@@ -304,26 +330,50 @@ class ChinaAMarket(Exchange):
             # 加载数据
             self.load_data()
 
+            # 每个撮合周期的时间间隔
+            period = SETTINGS["PERIOD"]
+
             while self._active:
-                # 交易时间检验
-                if not self.time_verification():
-                    continue
+                start = monotonic()
 
-                if not self.orders_book:
-                    continue
+                # 交易时间检验
+                if self.time_verification() and self.orders_book:
+                    self.match_orders()
 
-                # 复制交易簿
-                orders = copy.copy(self.orders_book)
-                for order_id, order in orders.items():
-                    sleep(1)
-                    # 订单撮合
-                    if self.on_orders_match(order):
-                        del self.orders_book[order_id]
+                sleep(max(0., period - (monotonic() - start)))
 
         except Exception as e:
             event = Event(EVENT_ERROR, traceback.format_exc())
             self.event_engine.put(event)
 
+    def match_orders(self):
+        """
+        一个周期的订单撮合
+        批量获取订单簿中所有证券的行情快照，所有订单按同一快照撮合
+        """
+        # 复制交易簿
+        orders = copy.copy(self.orders_book)
+        symbols = [order.pt_symbol for order in orders.values()]
+
+        try:
+            quotes = self.hq_client.get_realtime_quotes(symbols)
+        except Exception:
+            self.write_log(traceback.format_exc())
+            return
+
+        for symbol, quote in quotes.items():
+            self.publish_quote(symbol, quote)
+
+        for order_id, order in orders.items():
+            quote = quotes.get(order.pt_symbol)
+            # 撮合期间已取消的订单不再撮合
+            if not quote or order_id not in self.orders_book:
+                continue
+
+            # 订单撮合
+            if self.on_orders_match(order, quote):
+                self.orders_book.pop(order_id, None)
+
     def on_orders_arrived(self, order):
         """订单到达-真实行情"""
         order_id = order.order_id
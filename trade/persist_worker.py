@@ -0,0 +1,198 @@
+import copy
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Condition
+
+from paper_trading.api.db import MongoDBService, AsyncMongoWriter
+from paper_trading.trade.db_layout import EntityLayoutDB
+from paper_trading.utility.model import DBData
+
+
+class OpRecorder():
+    """
+    记录数据库写入操作的数据服务，不访问数据库
+    db_model的写入函数在此服务上执行时只生成写入操作，写入的数据在记录时复制，
+    之后数据对象的变更不影响已记录的操作
+    """
+
+    def __init__(self):
+        self.ops = list()           # 写入操作：(方法名称, 数据)
+
+    def __getattr__(self, name):
+        if not name.startswith("on_"):
+            raise AttributeError(name)
+
+        def record(pt_db: DBData):
+            raw_data = dict(pt_db.raw_data)
+            data = raw_data.get('data')
+            if hasattr(data, '__dict__'):
+                raw_data['data'] = copy.copy(data)
+            self.ops.append((name, DBData(db_name=pt_db.db_name,
+                                          db_cl=pt_db.db_cl,
+                                          raw_data=raw_data)))
+            return True
+
+        return record
+
+
+class PersistWorker():
+    """
+    异步持久化
+    事件线程只生成写入操作并放入队列，不等待数据库写入，写入在后台的事件循环中执行。
+    同一账户同一集合的写入按提交顺序逐条执行，不同集合的写入同时进行，
+    同时执行的写入数量不超过concurrency。
+    已安装motor且使用MongoDB时直接使用异步驱动写入，否则在线程池中调用原数据服务写入。
+    写入失败时按retries重试，重试前的等待不占用写入数量，仍失败则通过on_error报告并继续执行后续写入。
+    """
+
+    def __init__(self, db, concurrency: int = 16, retries: int = 3, on_error=None):
+        """构造函数"""
+        self.db = db                                # 原数据服务
+        self.concurrency = max(1, concurrency)      # 同时执行的写入数量
+        self.retries = retries                      # 写入失败的重试次数
+        self.on_error = on_error                    # 写入失败的回调函数
+        self.retry_delay = 0.5                      # 重试等待时间（秒），随重试次数递增
+
+        # 按实体合并存储时，写入操作经过转换后再记录
+        if isinstance(db, EntityLayoutDB):
+            self._target = db.db
+        else:
+            self._target = db
+
+        self._writer = None
+        if isinstance(self._target, MongoDBService) and AsyncMongoWriter.available():
+            self._writer = AsyncMongoWriter(self._target.host, self._target.port)
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever, daemon=True)
+        self._executor = None if self._writer else ThreadPoolExecutor(self.concurrency)
+        self._semaphore = None
+        self._queues = dict()                       # 各集合待写入的操作，只在事件循环中访问
+        self._idle = Condition()
+        self._pending = 0                           # 未完成的写入数量
+        self._written = 0                           # 完成的写入数量
+        self._failed = 0                            # 失败的写入数量
+        self._active = False
+
+    @property
+    def driver(self):
+        """写入方式"""
+        return "motor" if self._writer else "executor"
+
+    def start(self):
+        """启动后台事件循环"""
+        if not self._active:
+            self._active = True
+            self._thread.start()
+            self._semaphore = asyncio.run_coroutine_threadsafe(self._creat_semaphore(),
+                                                               self._loop).result()
+        return self
+
+    async def _creat_semaphore(self):
+        """在事件循环中创建信号量"""
+        return asyncio.Semaphore(self.concurrency)
+
+    def submit(self, func, *args):
+        """
+        提交写入，在调用线程中生成写入操作后立即返回
+        :param func: db_model的写入函数，最后一个参数为数据服务
+        :param args: 写入函数除数据服务以外的参数
+        """
+        recorder = OpRecorder()
+        if isinstance(self.db, EntityLayoutDB):
+            func(*args, EntityLayoutDB(recorder))
+        else:
+            func(*args, recorder)
+
+        if recorder.ops:
+            with self._idle:
+                self._pending += len(recorder.ops)
+            self._loop.call_soon_threadsafe(self._enqueue, recorder.ops)
+
+    def get_key(self, pt_db: DBData):
+        """写入操作的顺序键：账户的集合，按实体合并存储时为实体集合中的账户"""
+        if self._target is not self.db:
+            flt = pt_db.raw_data.get('flt') or {}
+            account_id = flt.get('account_id') or getattr(pt_db.raw_data.get('data'), 'account_id', None)
+            return pt_db.db_name, pt_db.db_cl, account_id
+        return pt_db.db_name, pt_db.db_cl
+
+    def _enqueue(self, ops: list):
+        """写入操作放入所属集合的队列，队列为空时启动该集合的写入任务"""
+        for name, pt_db in ops:
+            key = self.get_key(pt_db)
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._loop.create_task(self._drain(key, queue))
+            queue.append((name, pt_db))
+
+    async def _drain(self, key: tuple, queue: deque):
+        """按顺序执行一个集合的所有写入操作"""
+        while queue:
+            name, pt_db = queue.popleft()
+            ok = await self._write(name, pt_db)
+
+            with self._idle:
+                self._pending -= 1
+                if ok:
+                    self._written += 1
+                else:
+                    self._failed += 1
+                if not self._pending:
+                    self._idle.notify_all()
+
+        del self._queues[key]
+
+    async def _write(self, name: str, pt_db: DBData):
+        """执行一条写入操作，失败时释放写入数量后等待重试"""
+        for i in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    if self._writer:
+                        await getattr(self._writer, name)(pt_db)
+                    else:
+                        await self._loop.run_in_executor(self._executor,
+                                                         getattr(self._target, name), pt_db)
+                return True
+            except Exception as e:
+                if i < self.retries:
+                    await asyncio.sleep(self.retry_delay * (i + 1))
+                elif self.on_error:
+                    self.on_error(f"异步持久化：{pt_db.db_name}.{pt_db.db_cl} {name}写入失败，{e}")
+        return False
+
+    def join(self, timeout: float = None):
+        """
+        等待已提交的写入全部完成
+        :return: 是否全部完成
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def get_stats(self):
+        """写入统计"""
+        with self._idle:
+            return {
+                'driver': self.driver,
+                'pending': self._pending,
+                'written': self._written,
+                'failed': self._failed,
+            }
+
+    def close(self, timeout: float = None):
+        """等待写入完成后关闭"""
+        if not self._active:
+            return
+
+        self.join(timeout)
+        self._active = False
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+        if self._writer:
+            self._writer.close()
+        if self._executor:
+            self._executor.shutdown()
+        self._loop.close()
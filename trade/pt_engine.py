@@ -6,8 +6,10 @@ from queue import Empty, Queue
 from threading import Thread
 from email.message import EmailMessage
 
-from paper_trading.event import EventEngine, Event
-from paper_trading.api.db import MongoDBService
+from paper_trading.event import AsyncEventEngine, EventEngine, Event, PutPolicy
+from paper_trading.api.db import MongoDBService, connection_manager
+from paper_trading.api.sqlite_db import SQLiteDBService
+from paper_trading.api.memory_db import MemoryDBService
 from paper_trading.api.pytdx_api import PYTDXService
 from paper_trading.utility.setting import SETTINGS
 from paper_trading.utility.model import LogData
@@ -16,9 +18,13 @@ from paper_trading.utility.event import (
     EVENT_ERROR,
     EVENT_MARKET_CLOSE
 )
-from paper_trading.utility.constant import PersistanceMode
+from paper_trading.utility.constant import PersistanceMode, DBBackend, DBLayout, LoadDataMode
 from paper_trading.trade.market import ChinaAMarket
-from paper_trading.trade.account_engine import AccountEngine
+from paper_trading.trade.account_engine import AccountEngine, account_partition_key
+from paper_trading.trade.journal import EventJournal
+from paper_trading.trade.db_layout import EntityLayoutDB
+from paper_trading.trade.archive import archive_all
+from paper_trading.trade.persist_worker import PersistWorker
 
 
 
@@ -30,25 +36,42 @@ class MainEngine():
             market = None,
             param: dict = None
     ):
+        self._settings = SETTINGS                   # 配置参数
+
+        # 更新参数
+        self._settings.update(param or {})
+
         # 绑定事件引擎
         if not event_engine:
-            self.event_engine = EventEngine()
+            if self._settings['EVENT_ASYNC']:
+                self.event_engine = AsyncEventEngine(
+                    workers=self._settings['EVENT_WORKERS'],
+                    partition_key=account_partition_key,
+                    batch_size=self._settings['EVENT_BATCH_SIZE'],
+                    executor_workers=self._settings['EVENT_EXECUTOR_WORKERS'] or None
+                )
+            else:
+                self.event_engine = EventEngine(
+                    workers=self._settings['EVENT_WORKERS'],
+                    partition_key=account_partition_key,
+                    batch_size=self._settings['EVENT_BATCH_SIZE'],
+                    maxsize=self._settings['EVENT_QUEUE_SIZE'],
+                    inline=self._settings['EVENT_INLINE'],
+                    stats=self._settings['EVENT_STATS']
+                )
         else:
             self.event_engine = event_engine
         self.event_engine.start()
 
-        self._settings = SETTINGS                   # 配置参数
         self.__active = False                       # 主引擎状态
         self.pst_active = None                      # 数据持久化开关
         self._market = market                       # 交易市场
         self.account_engine = None                  # 账户引擎
+        self.journal = None                         # 事件日志
+        self.memory_db = None                       # 内存数据库，各模块共享同一实例
         self.order_put = None                       # 订单回调函数
 
 
-        # 更新参数
-        self._settings.update(param)
-
-
         # 开启日志引擎
         log = LogEngine(self.event_engine)
         log.register_event()
@@ -80,6 +103,8 @@ class MainEngine():
         # 持久化配置
         if self._settings['PERSISTENCE_MODE'] == PersistanceMode.REALTIME:
             self.pst_active = True
+        elif self._settings['PERSISTENCE_MODE'] == PersistanceMode.TIMING:
+            self.pst_active = False
         elif self._settings['PERSISTENCE_MODE'] == PersistanceMode.MANUAL:
             self.pst_active = False
         else:
@@ -91,11 +116,17 @@ class MainEngine():
         # 连接行情
         hq_client = self.creat_hq_api()
 
+        # 开启事件日志
+        journal = self.creat_journal()
+
         # 账户引擎启动
         self.account_engine = AccountEngine(self.event_engine,
                                             self.pst_active,
                                             self._settings['LOAD_DATA_MODE'],
-                                            db)
+                                            db,
+                                            journal,
+                                            self.write_behind,
+                                            self.creat_persist_worker(db))
         self.account_engine.start()
 
         # 默认使用ChinaAMarket
@@ -129,6 +160,8 @@ class MainEngine():
         # 持久化配置
         if self._settings['PERSISTENCE_MODE'] == PersistanceMode.REALTIME:
             self.pst_active = True
+        elif self._settings['PERSISTENCE_MODE'] == PersistanceMode.TIMING:
+            self.pst_active = False
         elif self._settings['PERSISTENCE_MODE'] == PersistanceMode.MANUAL:
             self.pst_active = False
         else:
@@ -140,11 +173,17 @@ class MainEngine():
         # 连接行情
         hq_client = self.creat_hq_api()
 
+        # 开启事件日志
+        journal = self.creat_journal()
+
         # 账户引擎启动
         self.account_engine = AccountEngine(self.event_engine,
                                             self.pst_active,
                                             self._settings['LOAD_DATA_MODE'],
-                                            db)
+                                            db,
+                                            journal,
+                                            self.write_behind,
+                                            self.creat_persist_worker(db))
         self.account_engine.start()
 
         # 默认使用ChinaAMarket
@@ -179,6 +218,17 @@ class MainEngine():
         self._market._active = False
         self._thread.join()
 
+        # 关闭账户引擎，保存定时持久化的数据
+        self.account_engine.close()
+
+        # 关闭事件日志
+        if self.journal:
+            self.journal.close()
+
+        # 保存内存数据库
+        if self.memory_db:
+            self.memory_db.close()
+
         self.__active = False
 
         self.write_log("模拟交易主引擎：关闭")
@@ -188,6 +238,14 @@ class MainEngine():
         if not self._settings['PERSISTENCE_MODE']:
             raise ValueError("数据持久化参数未配置")
 
+        if self.write_behind and self._settings['P_TIMING'] <= 0:
+            raise ValueError("定时持久化时间间隔未配置")
+
+    @property
+    def write_behind(self):
+        """是否为定时持久化模式"""
+        return self._settings['PERSISTENCE_MODE'] == PersistanceMode.TIMING
+
     def on_orders_arrived(self, order):
         """订单到达处理"""
         if self.__active:
@@ -202,6 +260,40 @@ class MainEngine():
         self.write_log("{}: 交易市场闭市".format(market_name))
         self._close()
 
+    def query_event_overflow(self):
+        """查询事件队列溢出统计"""
+        return self.event_engine.get_overflow()
+
+    def query_event_stats(self):
+        """查询事件引擎运行统计：事件速率、队列深度、处理函数耗时"""
+        return self.event_engine.get_stats()
+
+    def archive(self):
+        """将超过保留天数的历史数据归档，回测模式下交易员在内存中保留全部历史数据，不归档"""
+        if self._settings.get('LOAD_DATA_MODE') == LoadDataMode.BACKTEST:
+            self.write_log("模拟交易主引擎：回测模式不归档历史数据")
+            return 0
+
+        db = self.creat_db()
+        try:
+            count = archive_all(db)
+        finally:
+            # 内存数据库各模块共享，在引擎关闭时关闭
+            if not self.memory_db:
+                db.close()
+        self.write_log(f"模拟交易主引擎：历史数据归档完毕，共计{count}条")
+        return count
+
+    def query_db_stats(self):
+        """
+        查询MongoDB连接池统计：获取连接次数、失败次数及等待时间
+        开启异步持久化时，persist为写入方式、未完成、完成及失败的写入数量
+        """
+        stats = connection_manager.get_stats()
+        if self.account_engine and self.account_engine.persist_worker:
+            stats['persist'] = self.account_engine.persist_worker.get_stats()
+        return stats
+
     def process_error_event(self, event):
         """系统错误处理"""
         msg = event.data
@@ -209,13 +301,56 @@ class MainEngine():
         # self.email.queue.put(msg)
 
     def creat_db(self):
-        """实例化数据库"""
-        host = self._settings.get('MONGO_HOST', "localhost")
-        port = self._settings.get('MONGO_PORT', 27017)
-        db = MongoDBService(host, port)
+        """实例化数据库，根据配置选择存储后端及存储结构"""
+        backend = DBBackend(self._settings.get('DB_BACKEND', DBBackend.MONGODB.value))
+        if backend == DBBackend.MEMORY:
+            if not self.memory_db:
+                self.memory_db = MemoryDBService(self._settings.get('MEMORY_DUMP_PATH', ""))
+                self.memory_db.connect_db()
+            db = self.memory_db
+        else:
+            if backend == DBBackend.SQLITE:
+                db = SQLiteDBService(self._settings['SQLITE_PATH'])
+            else:
+                host = self._settings.get('MONGO_HOST', "localhost")
+                port = self._settings.get('MONGO_PORT', 27017)
+                db = MongoDBService(host, port)
+            db.connect_db()
+
+        layout = DBLayout(self._settings.get('DB_LAYOUT', DBLayout.TOKEN.value))
+        if layout == DBLayout.ENTITY:
+            db = EntityLayoutDB(db)
+        return db
+
+    def creat_persist_worker(self, db):
+        """实例化异步持久化，只在实时持久化模式下开启"""
+        if not (self._settings.get('PERSIST_ASYNC') and self.pst_active):
+            return None
+
+        worker = PersistWorker(db,
+                               self._settings.get('PERSIST_CONCURRENCY', 16),
+                               self._settings.get('PERSIST_RETRIES', 3),
+                               lambda msg: self.write_log(msg, logging.ERROR))
+        self.write_log(f"模拟交易主引擎：开启异步持久化，写入方式：{worker.driver}")
+        return worker.start()
+
+    def creat_hq_db(self):
+        """实例化行情数据库，未配置地址时使用交易数据库"""
+        host = self._settings.get('HQ_DB_HOST')
+        if not host:
+            return self.creat_db()
+
+        db = MongoDBService(host, self._settings.get('HQ_DB_PORT', 27017))
         db.connect_db()
         return db
 
+    def creat_journal(self):
+        """实例化事件日志"""
+        if self._settings.get('JOURNAL_ACTIVE') and not self.journal:
+            self.journal = EventJournal(self._settings['JOURNAL_PATH'],
+                                        self._settings.get('JOURNAL_FSYNC', False))
+        return self.journal
+
     def creat_hq_api(self):
         """实例化行情源"""
         tdx = PYTDXService()
@@ -317,6 +452,9 @@ class LogEngine(BaseEngine):
         """"""
         self.event_engine.register(EVENT_LOG, self.process_log_event)
 
+        # 事件队列已满时优先丢弃日志
+        self.event_engine.set_policy(EVENT_LOG, PutPolicy.DROP_OLDEST)
+
     def process_log_event(self, event: Event):
         """
         Output log event data with logging function.
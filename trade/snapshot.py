@@ -0,0 +1,84 @@
+import os
+import mmap
+import zlib
+import pickle
+import struct
+from time import time
+from datetime import datetime
+
+# 快照文件标识
+MAGIC = b"PTSS"
+
+# 快照格式版本
+VERSION = 1
+
+# 头部：标识、版本、标志位、生成时间、数据长度、数据crc32
+HEADER = struct.Struct("<4sHHdQI")
+FLAGS_OFFSET = 6
+
+# 标志位：引擎正常关闭时生成的最终快照
+FLAG_FINAL = 1
+
+
+def write_snapshot(path: str, traders: dict, final: bool = False):
+    """
+    保存交易员快照
+    先写入临时文件并同步到磁盘，再替换原文件，保存过程中断不会损坏上一次的快照
+    :param path: 快照文件路径
+    :param traders: {账户token: 交易员数据}
+    :param final: 是否为引擎正常关闭时生成的最终快照
+    :return: 快照文件大小
+    """
+    payload = pickle.dumps(traders, protocol=pickle.HIGHEST_PROTOCOL)
+    header = HEADER.pack(MAGIC, VERSION, FLAG_FINAL if final else 0,
+                         time(), len(payload), zlib.crc32(payload))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+    return HEADER.size + len(payload)
+
+
+def read_snapshot(path: str):
+    """
+    读取交易员快照，通过内存映射读取文件
+    :return: (是否为最终快照, 生成时间, {账户token: 交易员数据})，文件不存在或损坏时返回None
+    """
+    if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+        return None
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, flags, created, length, crc = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or version != VERSION or len(mm) < HEADER.size + length:
+                return None
+
+            payload = memoryview(mm)[HEADER.size:HEADER.size + length]
+            try:
+                if zlib.crc32(payload) != crc:
+                    return None
+                traders = pickle.loads(payload)
+            finally:
+                payload.release()
+
+    return bool(flags & FLAG_FINAL), created, traders
+
+
+def get_snapshot_date(created: float):
+    """快照的生成日期，格式：20200101"""
+    return datetime.fromtimestamp(created).strftime("%Y%m%d")
+
+
+def clear_final(path: str):
+    """清除最终快照标志，快照被加载后不再作为最新数据"""
+    with open(path, "r+b") as f:
+        f.seek(FLAGS_OFFSET)
+        f.write(struct.pack("<H", 0))
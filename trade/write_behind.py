@@ -0,0 +1,184 @@
+
+import copy
+from threading import Lock
+
+from paper_trading.utility.setting import SETTINGS
+from paper_trading.trade.db_model import on_bulk_write, get_pos_record_flt
+
+
+class DirtyTracker():
+    """
+    数据变更跟踪器
+    记录交易员需要持久化的账户、持仓、订单、账户记录及持仓记录，同一数据多次变更只记录一次，
+    定时持久化时只写入这些数据的最新状态
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.account = False                # 账户是否变更
+        self.pos = set()                    # 变更的持仓：证券代码
+        self.orders = set()                 # 变更的订单：订单编号
+        self.account_records = set()        # 变更的账户记录：清算日期
+        self.pos_records = set()            # 变更的持仓记录：持仓记录编号，旧数据为(证券代码, 首次买入日期)
+
+    def mark_account(self):
+        """账户变更"""
+        with self._lock:
+            self.account = True
+
+    def mark_pos(self, symbol: str):
+        """持仓变更（包括删除）"""
+        with self._lock:
+            self.pos.add(symbol)
+
+    def mark_order(self, order_id: str):
+        """订单变更"""
+        with self._lock:
+            self.orders.add(order_id)
+
+    def mark_account_record(self, check_date: str):
+        """账户记录变更"""
+        with self._lock:
+            self.account_records.add(check_date)
+
+    def mark_pos_record(self, key):
+        """持仓记录变更，key由get_pos_record_key生成"""
+        with self._lock:
+            self.pos_records.add(key)
+
+    def swap(self):
+        """取出所有变更记录并清空"""
+        dirty = DirtyTracker()
+        with self._lock:
+            dirty.account, self.account = self.account, False
+            dirty.pos, self.pos = self.pos, set()
+            dirty.orders, self.orders = self.orders, set()
+            dirty.account_records, self.account_records = self.account_records, set()
+            dirty.pos_records, self.pos_records = self.pos_records, set()
+        return dirty
+
+    def restore(self, dirty):
+        """持久化失败时将变更记录放回，等待下次持久化"""
+        with self._lock:
+            self.account = self.account or dirty.account
+            self.pos |= dirty.pos
+            self.orders |= dirty.orders
+            self.account_records |= dirty.account_records
+            self.pos_records |= dirty.pos_records
+
+    def __bool__(self):
+        return bool(self.account or self.pos or self.orders
+                    or self.account_records or self.pos_records)
+
+
+def get_pos_record_key(pos_record: dict):
+    """持仓记录的变更键：持仓记录编号，没有编号的旧数据为(证券代码, 首次买入日期)"""
+    flt = get_pos_record_flt(pos_record)
+    return flt.get('pos_id') or (flt['pt_symbol'], flt['first_buy_date'])
+
+
+def mark_all(trader):
+    """将交易员的所有数据记为已变更，下次持久化时全部写入"""
+    dirty = trader.dirty
+    with trader.lock:
+        dirty.mark_account()
+        for symbol in trader.pos:
+            dirty.mark_pos(symbol)
+        for order_id in trader.orders:
+            dirty.mark_order(order_id)
+        if len(trader.account_record):
+            for check_date in trader.account_record['check_date']:
+                dirty.mark_account_record(check_date)
+        if len(trader.pos_record):
+            for pos_record in trader.pos_record.to_dict(orient='records'):
+                dirty.mark_pos_record(get_pos_record_key(pos_record))
+
+
+def make_flush_ops(trader, dirty: DirtyTracker):
+    """
+    根据变更记录生成交易员数据的批量写入操作
+    :return: {数据库名称: [(操作类型, 条件, 数据)]}
+    """
+    ops = dict()
+
+    # 账户
+    if dirty.account:
+        ops[SETTINGS['ACCOUNT_DB']] = [
+            ('replace', {'account_id': trader.token}, copy.copy(trader.account.__dict__))
+        ]
+
+    # 持仓，已不存在的持仓删除
+    pos_ops = list()
+    for symbol in dirty.pos:
+        pos = trader.pos.get(symbol)
+        if pos:
+            pos_ops.append(('replace', {'pt_symbol': symbol}, copy.copy(pos.__dict__)))
+        else:
+            pos_ops.append(('delete', {'pt_symbol': symbol}, None))
+    if pos_ops:
+        ops[SETTINGS['POSITION_DB']] = pos_ops
+
+    # 订单
+    order_ops = list()
+    for order_id in dirty.orders:
+        order = trader.orders.get(order_id)
+        if order:
+            order_ops.append(('replace', {'order_id': order_id}, copy.copy(order.__dict__)))
+    if order_ops:
+        ops[SETTINGS['TRADE_DB']] = order_ops
+
+    # 账户记录
+    df = trader.account_record
+    record_ops = list()
+    for check_date in dirty.account_records:
+        records = df.loc[df['check_date'] == check_date].to_dict(orient='records')
+        if records:
+            record_ops.append(('replace', {'check_date': check_date}, records[-1]))
+    if record_ops:
+        ops[SETTINGS['ACCOUNT_RECORD']] = record_ops
+
+    # 持仓记录，同一天清仓后再次建仓的持仓记录按编号分别写入
+    df = trader.pos_record
+    record_ops = list()
+    for key in dirty.pos_records:
+        if isinstance(key, tuple):
+            rows = (df['pt_symbol'] == key[0]) & (df['first_buy_date'] == key[1])
+            if 'pos_id' in df:
+                rows &= df['pos_id'].fillna("") == ""
+        else:
+            rows = df['pos_id'] == key
+        records = df.loc[rows].to_dict(orient='records')
+        if records:
+            record = records[-1]
+            if not isinstance(record.get('pos_id'), str):
+                record['pos_id'] = ""
+            record_ops.append(('replace', get_pos_record_flt(record), record))
+    if record_ops:
+        ops[SETTINGS['POS_RECORD']] = record_ops
+
+    return ops
+
+
+def flush_trader(trader, db):
+    """
+    持久化交易员变更过的数据
+    每个集合只执行一次批量写入，同一集合中每条数据只写入一次，因此使用无序写入；
+    取出变更记录及生成写入操作时持有交易员锁，与撮合、查询等线程对交易员数据的修改互斥，
+    数据库写入在锁外执行；写入失败时变更记录保留到下次持久化
+    :return: 写入的数据条数
+    """
+    with trader.lock:
+        dirty = trader.dirty.swap()
+        if not dirty:
+            return 0
+        flush_ops = make_flush_ops(trader, dirty)
+
+    try:
+        count = 0
+        for db_name, ops in flush_ops.items():
+            on_bulk_write(db_name, trader.token, ops, db, ordered=False)
+            count += len(ops)
+        return count
+    except Exception:
+        trader.dirty.restore(dirty)
+        raise
@@ -32,9 +32,22 @@ class LoadDataMode(Enum):
 class PersistanceMode(Enum):
     """数据持久化模式"""
     REALTIME = "realtime"       # 实时持久化
-    TIMING = "timing"           # 定时持久化, 暂未实现
+    TIMING = "timing"           # 定时持久化
     MANUAL = "manual"           # 手动持久化
 
+
+class DBBackend(Enum):
+    """数据存储后端"""
+    MONGODB = "mongodb"         # MongoDB数据库
+    SQLITE = "sqlite"           # SQLite嵌入式数据库
+    MEMORY = "memory"           # 内存数据库
+
+
+class DBLayout(Enum):
+    """账户数据存储结构"""
+    TOKEN = "token"             # 每个账户在各数据库中单独建立集合
+    ENTITY = "entity"           # 每个数据库只使用一个集合，通过account_id区分账户
+
 class Direction(Enum):
     """
     Direction of order/trade/position.
@@ -26,6 +26,7 @@ EVENT_POS_RECORD_INSERT = "e_p_r_i"             # 持仓记录修改事件
 EVENT_POS_RECORD_BUY = "e_p_r_b"                # 持仓记录修改事件
 EVENT_POS_RECORD_SELL = "e_p_r_s"               # 持仓记录修改事件
 EVENT_POS_RECORD_CLEAR = "e_p_r_c"              # 持仓记录清理事件
+EVENT_PERSISTANCE_FLUSH = "e_pst_flush"         # 定时持久化事件
 
 
 
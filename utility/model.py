@@ -87,6 +87,7 @@ class PosRecord(BaseData):
     sell_price_mean: float = 0      # 卖出均价
     profit: float = 0               # 收益
     is_clear: int = 0               # 是否清仓
+    pos_id: str = ""                # 持仓记录编号，为建仓订单的订单编号
 
     def __post_init__(self):
         """"""
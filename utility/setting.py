@@ -20,7 +20,7 @@ SETTINGS = {
     # 是否开启账户与持仓信息的验证
     "VERIFICATION": True,
 
-    # 引擎撮合速度（秒）
+    # 引擎撮合周期（秒），每个周期批量获取一次订单簿中所有证券的行情并撮合所有订单
     # 设置此参数时请参考行情的刷新速度
     "PERIOD": 3,
 
@@ -30,19 +30,116 @@ SETTINGS = {
     # 手动持久化，系统会在接收到命令时进行持久化操作，建议在回测时使用
     "PERSISTENCE_MODE": "",
 
-    # 数据持久化时间间隔
-    # TODO 暂时没有实现相关功能
+    # 是否使用asyncio事件引擎，同步的事件处理函数将在线程池中执行
+    "EVENT_ASYNC": False,
+
+    # 是否使用同步事件引擎，事件在推送线程中直接处理，不经过事件队列，建议在回测时使用
+    "EVENT_INLINE": False,
+
+    # 事件引擎工作线程数量
+    # 大于1时按账户token分配工作线程，同一账户的事件顺序处理，不同账户的事件并行处理
+    "EVENT_WORKERS": 1,
+
+    # asyncio事件引擎执行同步事件处理函数的线程池大小，0为线程池默认数量
+    "EVENT_EXECUTOR_WORKERS": 0,
+
+    # 事件引擎每批次处理的最大事件数量
+    # 同一批次中的持仓价格、账户资产更新事件只保存最新的一条
+    "EVENT_BATCH_SIZE": 100,
+
+    # 事件引擎每个工作线程的队列容量，0为不限制
+    # 队列满时日志事件被丢弃，行情驱动的更新事件合并，其余事件阻塞等待
+    "EVENT_QUEUE_SIZE": 0,
+
+    # 是否统计事件数量及处理耗时（/event_stats），关闭后事件处理不再加锁计数
+    # 为空时同步事件引擎（EVENT_INLINE）不统计，其余事件引擎统计
+    "EVENT_STATS": None,
+
+    # 是否开启事件日志，交易员产生的数据变更事件将追加写入本地二进制日志文件，按日期切换文件
+    # 日志可通过 python -m paper_trading.trade.journal 回放到数据库
+    "JOURNAL_ACTIVE": False,
+
+    # 事件日志文件目录
+    "JOURNAL_PATH": "journal",
+
+    # 事件日志每条记录是否同步写入磁盘，开启后更安全但会降低效率
+    "JOURNAL_FSYNC": False,
+
+    # 定时持久化时间间隔（秒）
+    # 定时持久化模式下，每个时间间隔将变更过的账户、持仓、订单及记录的最新数据批量写入数据库
     "P_TIMING": 0,
 
+    # 异步持久化，只在实时持久化模式下生效
+    # 开启后事件线程只将写入放入队列，由后台事件循环执行；同一账户同一集合的写入保持顺序
+    # 已安装motor且使用MongoDB时使用异步驱动，否则在线程池中写入
+    "PERSIST_ASYNC": False,
+
+    # 异步持久化同时执行的写入数量
+    "PERSIST_CONCURRENCY": 16,
+
+    # 异步持久化写入失败的重试次数
+    "PERSIST_RETRIES": 3,
+
+    # 数据存储后端：mongodb、sqlite、memory
+    # sqlite为嵌入式数据库，不需要数据库服务，适合单机部署及本地测试
+    # memory将所有数据保存在内存中，没有任何网络及磁盘读写，建议在回测时使用
+    "DB_BACKEND": "mongodb",
+
+    # sqlite数据库文件路径
+    "SQLITE_PATH": "paper_trading.db",
+
+    # 内存数据库的保存文件路径，为空时不保存
+    # 启动时读取文件中的数据，引擎关闭时将数据压缩保存到文件
+    "MEMORY_DUMP_PATH": "",
+
+    # 账户数据存储结构：token、entity
+    # token为每个账户在各数据库中单独建立以token命名的集合
+    # entity为每个数据库只使用一个集合，通过account_id区分账户，账户数量很多时使用
+    # 已有数据可通过 python -m paper_trading.trade.db_layout 迁移
+    "DB_LAYOUT": "token",
+
+    # 启动时并行加载账户的线程数量，请勿超过数据库连接池大小
+    "LOAD_WORKERS": 8,
+
+    # 账户加载失败时是否停止启动，False为跳过加载失败的账户
+    "LOAD_FAIL_FAST": False,
+
+    # 批量创建、删除账户时的并行线程数量
+    "BULK_WORKERS": 8,
+
+    # 历史数据归档目录，为空时不归档
+    # 超过保留天数的订单、账户记录及已清仓的持仓记录按账户按月压缩保存到归档目录，查询历史数据时自动合并
+    "ARCHIVE_PATH": "",
+
+    # 数据库中保留的天数
+    "ARCHIVE_DAYS": 90,
+
+    # 交易员快照文件路径，为空时不保存快照
+    # 快照为所有交易员数据（账户、持仓、订单及记录）的二进制文件，引擎关闭时保存最终快照，
+    # 重启时可直接从快照恢复交易员，不需要逐个账户查询数据库
+    "SNAPSHOT_PATH": "",
+
+    # 定时保存快照的时间间隔（秒），0为只在引擎关闭时保存
+    "SNAPSHOT_INTERVAL": 0,
+
     # mongoDB 参数
     "MONGO_HOST": "",
     "MONGO_PORT": 0,
+    "MONGO_POOL_SIZE": 100,             # 连接池最大连接数，交易引擎与web服务共享
+    "MONGO_MIN_POOL_SIZE": 0,           # 连接池最小连接数
+    "MONGO_WAIT_QUEUE_TIMEOUT": 0,      # 获取连接的最长等待时间（毫秒），0为不限制
+    "MONGO_WRITE_CONCERN": 1,           # 写入确认级别，0为不等待确认，"majority"为多数节点确认
+    "MONGO_COMPRESSORS": "",            # 网络传输压缩方式，如"zstd,snappy,zlib"，为空时不压缩
     "ACCOUNT_DB": "pt_account",
     "POSITION_DB": "pt_position",
     "TRADE_DB": "pt_trade",
     "ACCOUNT_RECORD": "pt_acc_record",
     "POS_RECORD": "pt_pos_record",
 
+    # 行情数据库参数（日线数据等），地址为空时使用交易数据库
+    "HQ_DB_HOST": "",
+    "HQ_DB_PORT": 27017,
+
     # tushare行情源参数(填写你自己的tushare token，可以前往https://tushare.pro/ 注册申请)
     "TUSHARE_TOKEN": "",
 
@@ -50,6 +147,12 @@ SETTINGS = {
     "TDX_HOST": "210.51.39.201",
     "TDX_PORT": 7709,
 
+    # 共享内存行情总线名称，为空时不开启
+    # 开启后交易市场获取的行情将写入共享内存，同一主机的其他进程可通过 api.quote_bus.QuoteBus 读取
+    "QUOTE_BUS_NAME": "",
+    "QUOTE_BUS_CAPACITY": 4096,     # 行情记录环形队列容量
+    "QUOTE_BUS_SYMBOLS": 8192,      # 最大证券数量
+
     # 账户初始参数
     "CAPITAL": 1000000.00,  # 初始资金
     "COST": 0.0003,         # 交易佣金